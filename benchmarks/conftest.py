@@ -0,0 +1,67 @@
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+# measure transfers: nothing is served from local caches
+os.environ["NAPARI_OMERO_METADATA_CACHE"] = "0"
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_server import FakeGateway, FakeServer
+
+from napari_omero.plugins.cache import get_chunk_cache, set_disk_cache
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("fake server")
+    group.addoption(
+        "--fake-latency",
+        type=float,
+        default=0.002,
+        help="round trip time of each call to the fake server, in seconds",
+    )
+    group.addoption(
+        "--fake-bandwidth",
+        type=float,
+        default=100.0,
+        help="transfer rate of the fake server, in MB/s",
+    )
+
+
+@pytest.fixture(autouse=True)
+def _no_caches():
+    set_disk_cache(None)
+    get_chunk_cache().clear()
+    yield
+    get_chunk_cache().clear()
+
+
+@pytest.fixture
+def server(request) -> FakeServer:
+    return FakeServer(
+        latency=request.config.getoption("--fake-latency"),
+        bandwidth=request.config.getoption("--fake-bandwidth") * 2**20,
+    )
+
+
+@pytest.fixture
+def conn(server) -> FakeGateway:
+    return FakeGateway(server)
+
+
+@pytest.fixture
+def peak_memory(benchmark):
+    """Call ``peak_memory(func)`` to record the peak memory of one call, in MB."""
+
+    def _measure(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory_MB"] = round(peak / 2**20, 1)
+
+    return _measure
@@ -0,0 +1,386 @@
+import threading
+import time
+from functools import lru_cache
+from itertools import count
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+
+import omero.model as om
+from napari_omero.plugins.metadata import IMAGE_QUERY, RDEF_QUERY
+from napari_omero.plugins.omero import SHAPES_QUERY
+from napari_omero.plugins.rois import COUNT_QUERY, SHAPE_FIELDS, SHAPE_QUERY
+from omero.gateway import ImageWrapper, ServiceOptsDict
+from omero.rtypes import rbool, rdouble, rint, rlong, rstring
+
+
+class FakeServer:
+    """In-process stand-in for an OMERO server, with a simple network model.
+
+    Every call sleeps for `latency` seconds, plus the time to transfer the
+    bytes it returns (or receives) at `bandwidth` bytes per second.  Sleeps
+    release the GIL, so concurrent calls overlap as they would over a real
+    connection.  Images hold a deterministic pattern rather than real data.
+
+    Parameters
+    ----------
+    latency : float
+        Round trip time of each call, in seconds.
+    bandwidth : float
+        Transfer rate, in bytes per second.
+    """
+
+    def __init__(self, latency: float = 0.002, bandwidth: float = 100 * 2**20):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.images: dict[int, om.ImageI] = {}
+        self.rdefs: dict[int, om.RenderingDefI] = {}
+        # pyramid levels (size_y, size_x) and tile size by pixels id
+        self.pyramids: dict[int, tuple[list[tuple[int, int]], tuple[int, int]]] = {}
+        self.rois: dict[int, list[om.RoiI]] = {}
+        self.saved: list = []
+        self.deleted: list = []
+        self.calls: dict[str, int] = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def call(self, name: str, nbytes: int = 0) -> None:
+        """Account for one call of `name`, transferring `nbytes`."""
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        time.sleep(self.latency + nbytes / self.bandwidth)
+
+    def new_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def _new(self, cls):
+        """A new loaded object of `cls`, owned by user 1."""
+        obj = cls(self.new_id(), True)
+        obj.getDetails().setOwner(om.ExperimenterI(1, False))
+        obj.getDetails().setUpdateEvent(om.EventI(1, False))
+        return obj
+
+    def add_image(
+        self,
+        size_x: int,
+        size_y: int,
+        size_z: int = 1,
+        size_c: int = 1,
+        size_t: int = 1,
+        pixels_type: str = "uint16",
+        levels: Optional[list[tuple[int, int]]] = None,
+        tile_size: tuple[int, int] = (512, 512),
+    ) -> int:
+        """Add an image and its rendering settings; return the image id.
+
+        `levels` are the (size_y, size_x) of the resolution levels of a
+        pyramidal image, full resolution first.
+        """
+        image = self._new(om.ImageI)
+        image.setName(rstring(f"image {image.id.val}"))
+        image.getDetails().setGroup(om.ExperimenterGroupI(1, False))
+        pixels = self._new(om.PixelsI)
+        pixels_id = pixels.id.val
+        pixels.setSizeX(rint(size_x))
+        pixels.setSizeY(rint(size_y))
+        pixels.setSizeZ(rint(size_z))
+        pixels.setSizeC(rint(size_c))
+        pixels.setSizeT(rint(size_t))
+        pixels.setPhysicalSizeX(om.LengthI(0.5, "MICROMETER"))
+        pixels.setPhysicalSizeY(om.LengthI(0.5, "MICROMETER"))
+        pixels_type_obj = om.PixelsTypeI()
+        pixels_type_obj.setValue(rstring(pixels_type))
+        pixels.setPixelsType(pixels_type_obj)
+
+        rdef = self._new(om.RenderingDefI)
+        rdef.setPixels(om.PixelsI(pixels_id, False))
+        rdef.setDefaultZ(rint(size_z // 2))
+        rdef.setDefaultT(rint(0))
+        for c in range(size_c):
+            logical = self._new(om.LogicalChannelI)
+            logical.setName(rstring(f"channel {c}"))
+            channel = self._new(om.ChannelI)
+            channel.setLogicalChannel(logical)
+            pixels.addChannel(channel)
+            binding = self._new(om.ChannelBindingI)
+            red, green, blue = _COLORS[c % len(_COLORS)]
+            binding.setRed(rint(red))
+            binding.setGreen(rint(green))
+            binding.setBlue(rint(blue))
+            binding.setAlpha(rint(255))
+            binding.setInputStart(rdouble(0))
+            binding.setInputEnd(rdouble(4095))
+            binding.setActive(rbool(True))
+            rdef.addChannelBinding(binding)
+        image.addPixels(pixels)
+
+        self.images[image.id.val] = image
+        self.rdefs[pixels_id] = rdef
+        if levels is not None:
+            self.pyramids[pixels_id] = (list(levels), tile_size)
+        return image.id.val
+
+    def add_rois(self, image_id: int, n_rois: int, size: int = 2048) -> None:
+        """Add `n_rois` ROIs of one shape each (cycling through shape types)."""
+        rng = np.random.default_rng(image_id)
+        rois = self.rois.setdefault(image_id, [])
+        for i in range(n_rois):
+            x, y = rng.uniform(0, size - 50, 2)
+            kind = i % 4
+            if kind == 0:
+                shape = self._new(om.RectangleI)
+                shape.setX(rdouble(x))
+                shape.setY(rdouble(y))
+                shape.setWidth(rdouble(40))
+                shape.setHeight(rdouble(30))
+            elif kind == 1:
+                shape = self._new(om.EllipseI)
+                shape.setX(rdouble(x))
+                shape.setY(rdouble(y))
+                shape.setRadiusX(rdouble(20))
+                shape.setRadiusY(rdouble(10))
+            elif kind == 2:
+                shape = self._new(om.PolygonI)
+                angles = np.linspace(0, 2 * np.pi, 12, endpoint=False)
+                points = " ".join(
+                    f"{x + 20 * np.cos(a):.1f},{y + 20 * np.sin(a):.1f}" for a in angles
+                )
+                shape.setPoints(rstring(points))
+            else:
+                shape = self._new(om.PointI)
+                shape.setX(rdouble(x))
+                shape.setY(rdouble(y))
+            shape.setTheZ(rint(0))
+            shape.setTheT(rint(0))
+            shape.setStrokeColor(rint(-16776961))
+            shape.setFillColor(rint(0))
+            shape.setTextValue(rstring(f"shape {i}"))
+            roi = self._new(om.RoiI)
+            roi.setImage(om.ImageI(image_id, False))
+            roi.addShape(shape)
+            rois.append(roi)
+
+    def image(self, image_id: int, conn: "FakeGateway") -> "FakeImageWrapper":
+        return FakeImageWrapper(conn, self.images[image_id])
+
+    def pixels(self, pixels_id: int) -> om.PixelsI:
+        for image in self.images.values():
+            if image.getPrimaryPixels().id.val == pixels_id:
+                return image.getPrimaryPixels()
+        raise KeyError(pixels_id)
+
+
+# channel colors, as in the default rendering settings
+_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 255)]
+
+
+@lru_cache(maxsize=64)
+def _pattern(n_pixels: int, dtype: str) -> bytes:
+    """`n_pixels` of a fixed pattern, big-endian as OMERO sends them."""
+    data = np.arange(n_pixels, dtype=np.uint32) % 251
+    return data.astype(np.dtype(dtype).newbyteorder(">")).tobytes()
+
+
+class FakeRawPixelsStore:
+    def __init__(self, server: FakeServer):
+        self.server = server
+        self.pixels: Optional[om.PixelsI] = None
+        self.level: Optional[int] = None
+
+    def setPixelsId(self, pixels_id: int, bypass: bool, ctx=None) -> None:
+        self.server.call("setPixelsId")
+        self.pixels = self.server.pixels(pixels_id)
+
+    def setResolutionLevel(self, level: int) -> None:
+        self.server.call("setResolutionLevel")
+        self.level = level
+
+    def _size_yx(self) -> tuple[int, int]:
+        pyramid = self.server.pyramids.get(self.pixels.id.val)
+        if pyramid is not None and self.level is not None:
+            levels, _ = pyramid
+            # stores number levels from the smallest one up
+            return levels[len(levels) - self.level - 1]
+        return self.pixels.getSizeY().val, self.pixels.getSizeX().val
+
+    def _send(self, name: str, n_pixels: int) -> bytes:
+        dtype = self.pixels.getPixelsType().getValue().val
+        buf = _pattern(n_pixels, dtype)
+        self.server.call(name, len(buf))
+        return buf
+
+    def getPlane(self, z: int, c: int, t: int) -> bytes:
+        size_y, size_x = self._size_yx()
+        return self._send("getPlane", size_y * size_x)
+
+    def getTile(self, z: int, c: int, t: int, x: int, y: int, w: int, h: int):
+        return self._send("getTile", w * h)
+
+    def getHypercube(self, offset: list, size: list, step: list) -> bytes:
+        n_pixels = 1
+        for n, s in zip(size, step):
+            n_pixels *= -(-n // s)
+        return self._send("getHypercube", n_pixels)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeRenderingEngine:
+    def __init__(self, server: FakeServer, pixels_id: int):
+        self.server = server
+        self.levels, self.tile_size = server.pyramids[pixels_id]
+
+    def getTileSize(self) -> list[int]:
+        self.server.call("getTileSize")
+        return list(self.tile_size)
+
+    def getResolutionDescriptions(self) -> list:
+        self.server.call("getResolutionDescriptions")
+        return [SimpleNamespace(sizeY=y, sizeX=x) for y, x in self.levels]
+
+
+class FakeImageWrapper(ImageWrapper):
+    """`ImageWrapper` of a fake image, with a fake rendering engine."""
+
+    def requiresPixelsPyramid(self) -> bool:
+        self._conn.server.call("requiresPixelsPyramid")
+        return self.getPixelsId() in self._conn.server.pyramids
+
+    def _prepareRenderingEngine(self) -> bool:
+        self._re = FakeRenderingEngine(self._conn.server, self.getPixelsId())
+        return True
+
+
+class FakeQueryService:
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def findAllByQuery(self, query: str, params, ctx=None) -> list:
+        ids = [i.val for i in params.map["ids"].val]
+        if query == IMAGE_QUERY:
+            found = [self.server.images[i] for i in ids if i in self.server.images]
+        elif query == RDEF_QUERY:
+            found = [self.server.rdefs[i] for i in ids if i in self.server.rdefs]
+        elif query == SHAPES_QUERY:
+            wanted = set(ids)
+            found = [
+                shape
+                for rois in self.server.rois.values()
+                for roi in rois
+                for shape in roi.copyShapes()
+                if shape.id.val in wanted
+            ]
+        else:
+            raise NotImplementedError(query)
+        self.server.call("findAllByQuery", 2000 * len(found))
+        return found
+
+    def projection(self, query: str, params, ctx=None) -> list:
+        image_id = params.map["id"].val
+        for table, fields in SHAPE_FIELDS.values():
+            if query == COUNT_QUERY.format(table=table):
+                self.server.call("projection")
+                return [[rlong(len(self._shapes(image_id, table)))]]
+            if query == SHAPE_QUERY.format(table=table, fields=fields):
+                break
+        else:
+            raise NotImplementedError(query)
+        names = ["theZ", "theT", "strokeColor", "fillColor", "textValue"]
+        names += [field.strip()[2:] for field in fields.split(",")]
+        rows = []
+        for roi, shape in self._shapes(image_id, table):
+            row = [shape.id, roi.id]
+            row += [getattr(shape, f"get{n[0].upper()}{n[1:]}")() for n in names]
+            rows.append(row)
+        page = params.theFilter
+        if page is not None and page.limit is not None:
+            rows = rows[page.offset.val : page.offset.val + page.limit.val]
+        self.server.call("projection", 100 * len(rows) * len(names))
+        return rows
+
+    def _shapes(self, image_id: int, table: str) -> list:
+        return [
+            (roi, shape)
+            for roi in self.server.rois.get(image_id, [])
+            for shape in roi.copyShapes()
+            if shape.__class__.__name__ == f"{table}I"
+        ]
+
+
+class FakeRoiService:
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def findByImage(self, image_id: int, options, ctx=None):
+        rois = self.server.rois.get(image_id, [])
+        self.server.call("findByImage", 500 * len(rois))
+        return SimpleNamespace(rois=rois)
+
+
+class FakeUpdateService:
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def _save(self, obj):
+        obj.setId(rlong(self.server.new_id()))
+        if isinstance(obj, om.RoiI):
+            for shape in obj.copyShapes():
+                shape.setId(rlong(self.server.new_id()))
+        self.server.saved.append(obj)
+        return obj
+
+    def saveAndReturnObject(self, obj, ctx=None):
+        self.server.call("saveAndReturnObject", 1000)
+        return self._save(obj)
+
+    def saveAndReturnArray(self, objs: list, ctx=None) -> list:
+        self.server.call("saveAndReturnArray", 1000 * len(objs))
+        return [self._save(obj) for obj in objs]
+
+    def saveArray(self, objs: list, ctx=None) -> None:
+        self.server.call("saveArray", 1000 * len(objs))
+        self.server.saved.extend(objs)
+
+
+class FakeGateway:
+    """Stand-in for a connected `BlitzGateway` to a `FakeServer`."""
+
+    def __init__(self, server: FakeServer):
+        self.server = server
+        self.SERVICE_OPTS = ServiceOptsDict()
+        self.c = SimpleNamespace(
+            getProperty={"omero.host": "fake", "omero.port": "4064"}.get,
+            sf=SimpleNamespace(createRawPixelsStore=self._create_store),
+        )
+
+    def _create_store(self) -> FakeRawPixelsStore:
+        self.server.call("createRawPixelsStore")
+        return FakeRawPixelsStore(self.server)
+
+    def keepAlive(self) -> bool:
+        self.server.call("keepAlive")
+        return True
+
+    def getUserId(self) -> int:
+        return 1
+
+    def getQueryService(self) -> FakeQueryService:
+        return FakeQueryService(self.server)
+
+    def getRoiService(self) -> FakeRoiService:
+        return FakeRoiService(self.server)
+
+    def deleteObjects(self, graph_spec: str, obj_ids: list, **kwargs) -> None:
+        self.server.call("deleteObjects", 100 * len(obj_ids))
+        self.server.deleted.extend(obj_ids)
+
+    def getUpdateService(self) -> FakeUpdateService:
+        return FakeUpdateService(self.server)
+
+    def getObject(self, obj_type: str, obj_id: int) -> Optional[FakeImageWrapper]:
+        if obj_type != "Image" or obj_id not in self.server.images:
+            return None
+        return self.server.image(obj_id, self)
@@ -0,0 +1,70 @@
+import pytest
+
+from napari_omero.plugins.cache import get_chunk_cache
+from napari_omero.plugins.loaders import (
+    get_data_lazy,
+    get_omero_metadata,
+    get_pyramid_lazy,
+)
+
+# a typical confocal stack: 4 channels of 100 Z-sections of 2k x 2k
+STACK = {"size_x": 2048, "size_y": 2048, "size_z": 100, "size_c": 4}
+# a whole slide scan, with a pyramid down to 625 pixels
+SLIDE_LEVELS = [(40000 // 2**i, 40000 // 2**i) for i in range(7)]
+
+
+@pytest.fixture
+def stack(server, conn):
+    return server.image(server.add_image(**STACK), conn)
+
+
+@pytest.fixture
+def slide(server, conn):
+    image_id = server.add_image(40000, 40000, size_c=3, levels=SLIDE_LEVELS)
+    return server.image(image_id, conn)
+
+
+def test_get_data_lazy_graph(benchmark, stack):
+    """Time to build the dask graph of a stack."""
+    data = benchmark(get_data_lazy, stack)
+    assert data.shape == (1, 4, 100, 2048, 2048)
+
+
+def test_get_data_lazy_first_plane(benchmark, stack):
+    """Time from an empty cache to the first plane on screen."""
+    data = get_data_lazy(stack)
+    plane = benchmark.pedantic(
+        lambda: data[0, 0, 50].compute(), setup=get_chunk_cache().clear, rounds=10
+    )
+    assert plane.shape == (2048, 2048)
+
+
+def test_get_data_lazy_throughput(benchmark, server, conn, peak_memory):
+    """Throughput and peak memory of reading a whole (smaller) stack."""
+    image = server.image(server.add_image(1024, 1024, size_z=32, size_c=2), conn)
+    data = get_data_lazy(image)
+    benchmark.pedantic(data.compute, setup=get_chunk_cache().clear, rounds=3)
+    benchmark.extra_info["MB_per_s"] = round(
+        data.nbytes / 2**20 / benchmark.stats.stats.mean, 1
+    )
+    get_chunk_cache().clear()
+    peak_memory(data.compute)
+
+
+def test_get_pyramid_lazy_graph(benchmark, slide):
+    """Time to build the dask graphs of all levels of a slide."""
+    levels = benchmark(get_pyramid_lazy, slide)
+    assert len(levels) == len(SLIDE_LEVELS)
+
+
+def test_get_pyramid_lazy_first_tile(benchmark, slide):
+    """Time from an empty cache to the overview of a slide."""
+    levels = get_pyramid_lazy(slide)
+    benchmark.pedantic(
+        lambda: levels[-1][0, :, 0].compute(), setup=get_chunk_cache().clear, rounds=10
+    )
+
+
+def test_get_omero_metadata(benchmark, stack):
+    metadata = benchmark(get_omero_metadata, stack)
+    assert len(metadata["name"]) == 4
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from napari.layers import Labels, Points, Shapes
+
+from napari_omero.plugins.loaders import load_rois
+from napari_omero.plugins.masks import save_labels
+from napari_omero.plugins.omero import save_rois, sync_rois
+from napari_omero.plugins.rois import iter_roi_layers, load_roi_layers, remember_shapes
+
+
+@pytest.fixture
+def image(server, conn):
+    return server.image(server.add_image(2048, 2048, size_z=10), conn)
+
+
+def test_load_rois(benchmark, server, conn, image):
+    server.add_rois(image.getId(), 5000)
+    coords, _, _ = benchmark(load_rois, conn, image, load_points=False)[0]
+    assert len(coords) == 3750
+
+
+def test_load_roi_layers(benchmark, server, conn, image):
+    """Points and shapes of an image with many annotations, in one pass."""
+    server.add_rois(image.getId(), 100_000)
+    layers = benchmark.pedantic(load_roi_layers, args=(conn, image), rounds=3)
+    assert [layer_type for _, _, layer_type in layers] == ["shapes", "points"]
+
+
+def test_iter_roi_layers_first_page(benchmark, server, conn, image):
+    """Time until the first page of ROIs can be shown."""
+    server.add_rois(image.getId(), 100_000)
+    benchmark(lambda: next(iter_roi_layers(conn, image)))
+
+
+def test_save_rois(benchmark, server, image):
+    rng = np.random.default_rng(0)
+    rectangles = []
+    for y, x in rng.uniform(0, 2000, (500, 2)):
+        corners = [(y, x), (y + 30, x), (y + 30, x + 40), (y, x + 40)]
+        rectangles.append([(0, 0, cy, cx) for cy, cx in corners])
+    viewer = SimpleNamespace(layers=[Shapes(rectangles, shape_type="rectangle")])
+    benchmark.pedantic(save_rois, args=(viewer, image), rounds=3)
+    assert server.calls["saveAndReturnArray"] == 3
+
+
+def test_sync_rois_after_edits(benchmark, server, conn, image):
+    """Saving a few edits to an image with many ROIs sends only the edits."""
+    server.add_rois(image.getId(), 10_000)
+    loaded = load_roi_layers(conn, image)
+    viewer = SimpleNamespace(layers=[])
+
+    def edit():
+        layers = {"shapes": Shapes, "points": Points}
+        viewer.layers = [layers[kind](data, **meta) for data, meta, kind in loaded]
+        for layer in viewer.layers:
+            remember_shapes(layer, image.getId())
+        shapes = viewer.layers[0]
+        shapes.selected_data = set(range(10))
+        shapes.current_edge_color = "red"
+        shapes.selected_data = set(range(10, 15))
+        shapes.remove_selected()
+        shapes.add_rectangles([[[0, 0, y, 0], [0, 0, y + 9, 9]] for y in range(5)])
+
+    summary = benchmark.pedantic(sync_rois, args=(viewer, image), setup=edit, rounds=3)
+    assert summary[:3] == (5, 10, 5)
+    assert server.calls["saveAndReturnArray"] == server.calls["saveArray"] == 3
+    assert server.calls["deleteObjects"] == 3
+    # and nothing is left to send
+    assert sync_rois(viewer, image)[:3] == (0, 0, 0)
+
+
+def test_save_labels(benchmark, image, peak_memory):
+    # 200 disks spread over 10 Z-sections
+    data = np.zeros((1, 10, 2048, 2048), np.uint16)
+    yy, xx = np.mgrid[-15:16, -15:16]
+    disk = yy**2 + xx**2 <= 15**2
+    rng = np.random.default_rng(0)
+    for label in range(1, 201):
+        z, y, x = rng.integers(0, 10), *rng.integers(0, 2048 - 31, 2)
+        data[0, z, y : y + 31, x : x + 31][disk] = label
+    layer = Labels(data)
+    rois = benchmark.pedantic(save_labels, args=(layer, image), rounds=3)
+    assert len(rois) == 200
+    peak_memory(save_labels, layer, image)
@@ -1,10 +1,22 @@
 from importlib.metadata import PackageNotFoundError, version
+from typing import TYPE_CHECKING, Any
 
 try:
     __version__ = version("napari-omero")
 except PackageNotFoundError:
     __version__ = "not-installed"
 
-from .widgets import OMEROWidget
+if TYPE_CHECKING:
+    from .widgets import OMEROWidget
 
 __all__ = ["OMEROWidget"]
+
+
+def __getattr__(name: str) -> Any:
+    # the widgets pull in Qt and omero: only import them when asked for, so
+    # that the reader plugin (see `plugins._napari`) can be imported quickly
+    if name == "OMEROWidget":
+        from .widgets import OMEROWidget
+
+        return OMEROWidget
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
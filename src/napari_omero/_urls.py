@@ -0,0 +1,28 @@
+import re
+from typing import Optional
+
+# kept free of omero (and Qt) imports: napari asks the reader plugin about
+# every path it opens, see `napari_omero.plugins._napari`
+
+omero_url_pattern = re.compile(
+    r"https?://(?P<host>[^/]+).*/webclient" r"/\?show=(?P<type>[a-z]+)-(?P<id>[0-9]+)"
+)
+
+omero_object_pattern = re.compile(
+    r"(?P<protocol>omero://)?(?P<type>(Image|Dataset|Project|Plate)):(?P<id>[0-9]+)"
+)
+
+
+def parse_omero_url(url: str) -> Optional[dict[str, str]]:
+    match = omero_url_pattern.search(url)
+    return match.groupdict() if match else None
+
+
+def parse_omero_object(path: str) -> Optional[tuple[str, int]]:
+    """If path ends with e.g. Image:ID return ("Image", ID)."""
+    if path.startswith("omero://"):
+        path = path[8:]
+    match = omero_object_pattern.search(path)
+    if match is None:
+        return None
+    return match["type"], int(match["id"])
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+import numpy as np
+
+# latencies kept per kind of call, for percentiles
+DEFAULT_MAX_SAMPLES = 2000
+
+
+class CallStats:
+    """Counters and recent latencies of one kind of call."""
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.nbytes = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.latencies: deque[float] = deque(maxlen=max_samples)
+
+    def summary(self) -> dict:
+        latencies = np.array(self.latencies) * 1000
+        p50, p90, p99 = (
+            np.percentile(latencies, [50, 90, 99]) if len(latencies) else (0, 0, 0)
+        )
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": 1000 * self.seconds / self.count if self.count else 0.0,
+            "p50_ms": float(p50),
+            "p90_ms": float(p90),
+            "p99_ms": float(p99),
+            "bytes": self.nbytes,
+            "MB_per_s": self.nbytes / self.seconds / 2**20 if self.seconds else 0.0,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+class Call:
+    """Handle of a call being tracked, to report the bytes it transferred."""
+
+    def __init__(self):
+        self.nbytes = 0
+
+    def add_bytes(self, nbytes: int) -> None:
+        self.nbytes += nbytes
+
+
+class MetricsRegistry:
+    """Thread-safe registry of call metrics, by kind of call.
+
+    Calls are tracked with `track`, which records their count, latency,
+    errors, bytes transferred and concurrency.  Other components (e.g. the
+    caches) can contribute their own statistics with `register_stats`.
+    """
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._calls: dict[str, CallStats] = {}
+        self._stats: dict[str, Callable[[], dict]] = {}
+
+    def _get(self, kind: str) -> CallStats:
+        stats = self._calls.get(kind)
+        if stats is None:
+            stats = self._calls[kind] = CallStats(self.max_samples)
+        return stats
+
+    @contextmanager
+    def track(self, kind: str) -> Iterator[Call]:
+        """Track one call of `kind` for the duration of the context."""
+        call = Call()
+        with self._lock:
+            stats = self._get(kind)
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield call
+        except BaseException:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats.in_flight -= 1
+                self._record(stats, elapsed, call.nbytes, error)
+
+    def record(
+        self, kind: str, seconds: float, nbytes: int = 0, error: bool = False
+    ) -> None:
+        """Record a call of `kind` that has already completed."""
+        with self._lock:
+            self._record(self._get(kind), seconds, nbytes, error)
+
+    def _record(self, stats: CallStats, seconds: float, nbytes: int, error: bool):
+        stats.count += 1
+        stats.errors += error
+        stats.seconds += seconds
+        stats.nbytes += nbytes
+        stats.latencies.append(seconds)
+
+    def register_stats(self, name: str, stats: Callable[[], dict]) -> None:
+        """Include `stats()` (e.g. cache hit rates) in `summary` as `name`."""
+        with self._lock:
+            self._stats[name] = stats
+
+    def summary(self) -> dict[str, dict]:
+        """Statistics of each kind of call, and of registered components."""
+        with self._lock:
+            calls = {kind: stats.summary() for kind, stats in self._calls.items()}
+            providers = dict(self._stats)
+        return {**calls, **{name: stats() for name, stats in providers.items()}}
+
+    def calls(self) -> dict[str, dict]:
+        """Statistics of each kind of call only."""
+        with self._lock:
+            return {kind: stats.summary() for kind, stats in self._calls.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._calls.clear()
+
+    def report(self) -> str:
+        """The call statistics as a text table."""
+        calls = self.calls()
+        columns = ["count", "errors", "p50_ms", "p90_ms", "p99_ms", "bytes"]
+        lines = [f"{'call':<16}" + "".join(f"{c:>12}" for c in columns)]
+        for kind, stats in sorted(calls.items()):
+            cells = "".join(
+                f"{stats[c]:>12.1f}" if c.endswith("_ms") else f"{stats[c]:>12}"
+                for c in columns
+            )
+            lines.append(f"{kind:<16}{cells}")
+        for name, stats in self.summary().items():
+            if name not in calls:
+                lines.append(f"{name}: {stats}")
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return self.report()
+
+
+_METRICS: Optional[MetricsRegistry] = None
+_METRICS_LOCK = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry."""
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is None:
+            _METRICS = MetricsRegistry()
+        return _METRICS
+
+
+def track(kind: str):
+    """Track a call of `kind` in the process-wide registry, see `MetricsRegistry`."""
+    return get_metrics().track(kind)
@@ -2,16 +2,29 @@ import os
 from functools import partial
 from typing import Callable, Optional, Union
 
-from napari_omero.utils import get_proxy_obj, parse_omero_url
-
-from .loaders import omero_proxy_reader, omero_url_reader
+# only the path patterns are imported here: napari calls `napari_get_reader`
+# for every path it opens, the omero/Ice stack is loaded once a reader runs
+from napari_omero._urls import parse_omero_object, parse_omero_url
 
 
 def napari_get_reader(path: Union[str, list[str]]) -> Optional[Callable]:
     if isinstance(path, str):
         if parse_omero_url(path):
-            return omero_url_reader
-        proxy_obj = get_proxy_obj(os.path.basename(path))
-        if proxy_obj:
-            return partial(omero_proxy_reader, proxy_obj=proxy_obj)
+            return _read_url
+        if parse_omero_object(os.path.basename(path)):
+            return partial(_read_proxy, proxy_path=os.path.basename(path))
     return None
+
+
+def _read_url(path: str) -> list:
+    from .loaders import omero_url_reader
+
+    return omero_url_reader(path)
+
+
+def _read_proxy(path: str, proxy_path: str) -> list:
+    from napari_omero.utils import get_proxy_obj
+
+    from .loaders import omero_proxy_reader
+
+    return omero_proxy_reader(path, proxy_obj=get_proxy_obj(proxy_path))
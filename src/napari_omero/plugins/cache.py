@@ -0,0 +1,309 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+from dask.utils import parse_bytes
+
+from napari_omero.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE_ENV = "NAPARI_OMERO_CACHE_SIZE"
+DEFAULT_CACHE_SIZE = "1GB"
+# opt-in: a directory, or "1" to use DEFAULT_DISK_CACHE_DIR
+DISK_CACHE_ENV = "NAPARI_OMERO_DISK_CACHE"
+DISK_CACHE_SIZE_ENV = "NAPARI_OMERO_DISK_CACHE_SIZE"
+DEFAULT_DISK_CACHE_DIR = (
+    Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "napari-omero"
+)
+DEFAULT_DISK_CACHE_SIZE = "10GB"
+
+# (level, z, c, t, x, y, w, h) of one plane or tile
+RegionKey = tuple[int, int, int, int, int, int, int, int]
+
+
+class ChunkCache:
+    """In-memory LRU cache of decoded planes and tiles, with a byte budget.
+
+    napari asks for the same planes and tiles over and over when scrubbing
+    through Z/T or panning, so recently read regions are kept in memory,
+    up to `max_bytes` in total.  Memory use is accounted per image, and the
+    entries of one image can be dropped with `drop_image`.
+
+    Parameters
+    ----------
+    max_bytes : int or str
+        Size budget of the cache, e.g. ``"1GB"``.  0 disables the cache.
+    """
+
+    def __init__(self, max_bytes: Union[int, str]):
+        self.max_bytes = parse_bytes(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._keys_by_image: defaultdict[tuple, set] = defaultdict(set)
+        self._nbytes_by_image: defaultdict[tuple, int] = defaultdict(int)
+        self.nbytes = 0
+
+    def get(self, server: str, image_id: int, key: RegionKey) -> Optional[np.ndarray]:
+        with self._lock:
+            data = self._data.get((server, image_id, key))
+            if data is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((server, image_id, key))
+            self.hits += 1
+            return data
+
+    def put(self, server: str, image_id: int, key: RegionKey, data: np.ndarray):
+        if data.nbytes > self.max_bytes:
+            return
+        # a private copy: callers may modify (or hold a larger base of) `data`
+        data = np.array(data)
+        data.flags.writeable = False
+        full_key = (server, image_id, key)
+        with self._lock:
+            if full_key in self._data:
+                return
+            self._data[full_key] = data
+            self._keys_by_image[(server, image_id)].add(key)
+            self._nbytes_by_image[(server, image_id)] += data.nbytes
+            self.nbytes += data.nbytes
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, full_key: tuple) -> None:
+        server, image_id, key = full_key
+        nbytes = self._data.pop(full_key).nbytes
+        self.nbytes -= nbytes
+        image = (server, image_id)
+        self._keys_by_image[image].discard(key)
+        self._nbytes_by_image[image] -= nbytes
+        if not self._keys_by_image[image]:
+            del self._keys_by_image[image]
+            del self._nbytes_by_image[image]
+
+    def drop_image(self, image_id: int, server: Optional[str] = None) -> None:
+        """Drop all entries of `image_id` (on any server, if not given)."""
+        with self._lock:
+            for srv, img in list(self._keys_by_image):
+                if img == image_id and server in (None, srv):
+                    for key in list(self._keys_by_image[(srv, img)]):
+                        self._pop((srv, img, key))
+
+    def image_nbytes(self) -> dict[tuple[str, int], int]:
+        """Bytes held for each (server, image id)."""
+        with self._lock:
+            return dict(self._nbytes_by_image)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "entries": len(self._data),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._keys_by_image.clear()
+            self._nbytes_by_image.clear()
+            self.nbytes = 0
+
+
+_CHUNK_CACHE: Optional[ChunkCache] = None
+
+
+def get_chunk_cache() -> ChunkCache:
+    """Return the in-memory chunk cache.
+
+    Its budget is read from ``NAPARI_OMERO_CACHE_SIZE`` (default 1GB) and
+    can be changed with `set_chunk_cache_size`.
+    """
+    global _CHUNK_CACHE
+    if _CHUNK_CACHE is None:
+        _CHUNK_CACHE = ChunkCache(os.getenv(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE))
+    return _CHUNK_CACHE
+
+
+def set_chunk_cache_size(max_bytes: Union[int, str]) -> ChunkCache:
+    """Set the byte budget of the chunk cache, evicting entries as needed."""
+    cache = get_chunk_cache()
+    with cache._lock:
+        cache.max_bytes = parse_bytes(max_bytes)
+        while cache.nbytes > cache.max_bytes:
+            cache._pop(next(iter(cache._data)))
+    return cache
+
+
+class DiskCache:
+    """Persistent cache of planes and tiles, shared by all napari processes.
+
+    Pixel data in OMERO cannot change once it has been imported, so a region
+    read once never has to be fetched from the server again.  Every region is
+    stored as one ``.npy`` file, written atomically (write to a temporary file,
+    then rename) so that concurrent processes never see partial files, and
+    read back memory-mapped.  Once the cache grows beyond `max_bytes`, the
+    least recently used files are deleted.
+
+    Parameters
+    ----------
+    path : str or Path
+        Root directory of the cache.
+    max_bytes : int or str
+        Size budget of the cache, e.g. ``"10GB"``.
+    """
+
+    def __init__(self, path: Union[str, Path], max_bytes: Union[int, str]):
+        self.path = Path(path)
+        self.max_bytes = parse_bytes(max_bytes)
+        self._lock = threading.Lock()
+        self._nbytes: Optional[int] = None  # lazily counted
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, server: str, pixels_id: int, key: RegionKey) -> Path:
+        server_dir = hashlib.sha1(server.encode()).hexdigest()[:16]
+        level, *zct_region = key
+        name = "_".join(str(k) for k in zct_region) + ".npy"
+        return self.path / server_dir / str(pixels_id) / str(level) / name
+
+    def get(self, server: str, pixels_id: int, key: RegionKey) -> Optional[np.ndarray]:
+        file = self._file(server, pixels_id, key)
+        try:
+            data = np.load(file, mmap_mode="r")
+            # bump mtime so that eviction removes least recently used first
+            os.utime(file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug(f"Ignoring unreadable cache file {file}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, server: str, pixels_id: int, key: RegionKey, data: np.ndarray):
+        file = self._file(server, pixels_id, key)
+        tmp = file.with_name(f".{file.name}.{uuid.uuid4().hex}")
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(data))
+            # e.g. rewritten because it was unreadable: only count the change
+            try:
+                replaced = file.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp, file)
+        except OSError as e:
+            logger.debug(f"Failed to write cache file {file}: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._nbytes is None:
+                self._nbytes = sum(f.stat().st_size for f in self._files())
+            else:
+                self._nbytes += file.stat().st_size - replaced
+            over_budget = self._nbytes > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _files(self) -> Iterator[Path]:
+        return (f for f in self.path.rglob("*.npy") if not f.name.startswith("."))
+
+    def evict(self, target: float = 0.9) -> None:
+        """Delete least recently used files until below `target` of the budget."""
+        entries = []
+        for f in self._files():
+            try:
+                st = f.stat()
+            except FileNotFoundError:  # deleted by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+        entries.sort()
+        nbytes = sum(size for _, size, _ in entries)
+        limit = self.max_bytes * target
+        for _, size, f in entries:
+            if nbytes <= limit:
+                break
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:  # e.g. still memory-mapped on Windows
+                continue
+            nbytes -= size
+        with self._lock:
+            self._nbytes = nbytes
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self) -> None:
+        for f in self._files():
+            f.unlink(missing_ok=True)
+        with self._lock:
+            self._nbytes = 0
+
+
+_DISK_CACHE: Optional[DiskCache] = None
+_DISK_CACHE_CONFIGURED = False
+
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """Return the disk cache, or None if it is not enabled.
+
+    The cache is enabled by setting ``NAPARI_OMERO_DISK_CACHE`` to a directory
+    (or to ``1`` for the default location), or by calling `set_disk_cache`.
+    """
+    global _DISK_CACHE, _DISK_CACHE_CONFIGURED
+    if not _DISK_CACHE_CONFIGURED:
+        _DISK_CACHE_CONFIGURED = True
+        path = os.getenv(DISK_CACHE_ENV, "")
+        if path and path.lower() not in ("0", "false", "no"):
+            if path.lower() in ("1", "true", "yes"):
+                path = str(DEFAULT_DISK_CACHE_DIR)
+            size = os.getenv(DISK_CACHE_SIZE_ENV, DEFAULT_DISK_CACHE_SIZE)
+            _DISK_CACHE = DiskCache(path, size)
+    return _DISK_CACHE
+
+
+def set_disk_cache(
+    path: Union[str, Path, None] = DEFAULT_DISK_CACHE_DIR,
+    max_bytes: Union[int, str] = DEFAULT_DISK_CACHE_SIZE,
+) -> Optional[DiskCache]:
+    """Enable the disk cache at `path`, or disable it if `path` is None."""
+    global _DISK_CACHE, _DISK_CACHE_CONFIGURED
+    _DISK_CACHE_CONFIGURED = True
+    _DISK_CACHE = DiskCache(path, max_bytes) if path is not None else None
+    return _DISK_CACHE
+
+
+def _disk_cache_stats() -> dict:
+    disk_cache = get_disk_cache()
+    return disk_cache.stats() if disk_cache is not None else {}
+
+
+get_metrics().register_stats("chunk_cache", lambda: get_chunk_cache().stats())
+get_metrics().register_stats("disk_cache", _disk_cache_stats)
@@ -1,21 +1,37 @@
-from contextlib import contextmanager
-from math import ceil
-from typing import Optional
+import os
+import weakref
+from typing import Optional, Union
 
 import dask.array as da
+import napari
 import numpy as np
-from dask.delayed import delayed
+import psutil
+from dask.utils import parse_bytes
 from napari.types import LayerData
+from napari.utils import progress
 from napari.utils.colormaps import ensure_colormap
 from napari.utils.notifications import show_warning
-from omero_marshal import get_encoder
 
-from napari_omero.utils import PIXEL_TYPES, lookup_obj, parse_omero_url, timer
-from napari_omero.widgets import QGateWay
-from omero.cli import ProxyStringType
+from napari_omero.metrics import get_metrics
+from napari_omero.utils import parse_omero_url
+from napari_omero.widgets.gateway import QGateWay
 from omero.gateway import BlitzGateway, ImageWrapper
 from omero.model import IObject
 
+from .cache import get_chunk_cache
+from .metadata import (
+    ImageInfo,
+    LazyJSON,
+    container_image_ids,
+    get_image_info,
+    get_images_info,
+)
+from .mirror import open_mirror
+from .pixels import ChunkPolicy, PixelsReader
+from .plates import PlateReader
+from .rendering import RENDER_ENV, RenderedReader
+from .rois import load_shape_table, roi_layer_data
+
 
 # @timer
 def get_gateway(
@@ -45,26 +61,18 @@ def get_gateway(
     return form.gateway.conn
 
 
-@contextmanager
-def raw_pixels_store(image):
-    pix = image._conn.c.sf.createRawPixelsStore()
-    try:
-        yield pix
-    finally:
-        pix.close()
-
-
 def omero_url_reader(path: str) -> list[LayerData]:
     match = parse_omero_url(path)
     if not match:
         return []
     gateway = get_gateway(path, match.get("host"))
-    if match.get("type", "").lower() == "image":
-        wrapper = lookup_obj(
-            gateway, ProxyStringType("Image")(f"Image:{match.get('id')}")
-        )
-        if isinstance(wrapper, ImageWrapper):
-            return load_image_wrapper(wrapper)
+    type_ = match.get("type", "").lower()
+    if type_ == "image":
+        return load_image(gateway, int(match["id"]))
+    if type_ in ("dataset", "project"):
+        return load_container(gateway, type_.capitalize(), int(match["id"]))
+    if type_ == "plate":
+        return load_plate(gateway, int(match["id"]))
     return []
 
 
@@ -74,29 +82,316 @@ def omero_proxy_reader(
 ) -> list[LayerData]:
     gateway = get_gateway(path)
 
-    if proxy_obj.__class__.__name__.startswith("Image"):
-        try:
-            wrapper = lookup_obj(gateway, proxy_obj)
-        except Exception:
-            gateway = get_gateway(path, force_reconnect=True)
-            if not gateway:
-                return []
-            wrapper = lookup_obj(gateway, proxy_obj)
-        if isinstance(wrapper, ImageWrapper):
-            return load_image_wrapper(wrapper)
-    return []
+    type_ = proxy_obj.__class__.__name__.rstrip("I")
+    if type_ not in ("Image", "Dataset", "Project", "Plate"):
+        return []
+    # metadata may come from the local cache, so check the session first
+    try:
+        alive = gateway.keepAlive()
+    except Exception:
+        alive = False
+    if not alive:
+        gateway = get_gateway(path, force_reconnect=True)
+        if not gateway:
+            return []
+    if type_ == "Image":
+        return load_image(gateway, proxy_obj.id.val)
+    if type_ == "Plate":
+        return load_plate(gateway, proxy_obj.id.val)
+    return load_container(gateway, type_, proxy_obj.id.val)
+
+
+# "1" to load whole images into memory instead of lazily
+EAGER_ENV = "NAPARI_OMERO_EAGER"
+# memory budget of eager loading, default: half of the available memory
+EAGER_MAX_BYTES_ENV = "NAPARI_OMERO_EAGER_MAX_BYTES"
+
+
+def load_image_wrapper(
+    image: ImageWrapper,
+    chunks: Union[ChunkPolicy, str, None] = None,
+    eager: Optional[bool] = None,
+    rendered: Optional[bool] = None,
+) -> list[LayerData]:
+    """Load `image` as napari layer data, see `load_image`."""
+    return load_image(image._conn, image.getId(), chunks, eager, rendered)
 
 
-def load_image_wrapper(image: ImageWrapper) -> list[LayerData]:
-    meta = get_omero_metadata(image)
+def load_image(
+    conn: BlitzGateway,
+    image_id: int,
+    chunks: Union[ChunkPolicy, str, None] = None,
+    eager: Optional[bool] = None,
+    rendered: Optional[bool] = None,
+) -> list[LayerData]:
+    """Load image `image_id` as napari layer data.
+
+    Metadata comes from the local metadata cache when possible, see
+    `get_image_info`.  With `eager` (default: ``NAPARI_OMERO_EAGER``), the
+    full resolution image is read into memory right away; images that do not
+    fit the eager memory budget are loaded lazily instead.  Images mirrored
+    locally (see `mirror_image`) are read from the mirror.  With `rendered`
+    (default: ``NAPARI_OMERO_RENDER``), the image is shown as rendered by the
+    server, as one 8-bit RGB layer, see `RenderedReader`.
+    """
+    viewer = napari.current_viewer()
+    if viewer is not None:
+        connect_viewer(viewer)
+    info = get_image_info(conn, image_id)
+    return [_image_layer(conn, info, chunks, eager, rendered)]
+
+
+def _image_layer(
+    conn: BlitzGateway,
+    info: ImageInfo,
+    chunks: Union[ChunkPolicy, str, None] = None,
+    eager: Optional[bool] = None,
+    rendered: Optional[bool] = None,
+) -> LayerData:
+    if rendered is None:
+        rendered = os.getenv(RENDER_ENV, "").lower() in ("1", "true", "yes")
+    if rendered:
+        return _rendered_layer(conn, info)
+    meta = _layer_metadata(conn, info)
+    if (mirrored := open_mirror(conn, info)) is not None:
+        # read from the local OME-Zarr mirror, see `mirror_image`
+        return (mirrored if len(mirrored) > 1 else mirrored[0], meta, "image")
     # contrast limits range ... not accessible from plugin interface
     # win_min = channel.getWindowMin()
     # win_max = channel.getWindowMax()
-    if image.requiresPixelsPyramid():
-        data = get_pyramid_lazy(image)
-    else:
-        data = get_data_lazy(image)
-    return [(data, meta, "image")]
+    reader = _READERS[info.image_id] = PixelsReader.from_info(conn, info)
+    if eager is None:
+        eager = os.getenv(EAGER_ENV, "").lower() in ("1", "true", "yes")
+    data = _read_eager(reader) if eager else None
+    if data is None:
+        if reader.is_pyramid:
+            data = reader.lazy_pyramid()
+        elif reader.add_synthetic_levels():
+            # napari paints the coarsest level first; meanwhile, fetch the
+            # full resolution of the plane it starts on
+            data = reader.lazy_pyramid(chunks)
+            reader.prefetch_plane(info.default_z, info.default_t)
+        else:
+            data = reader.lazy_level(0, chunks)
+    return (data, meta, "image")
+
+
+def _rendered_layer(conn: BlitzGateway, info: ImageInfo) -> LayerData:
+    pyramid = RenderedReader.from_info(conn, info).lazy_pyramid()
+    size_x, size_y, size_z = (size or 1 for size in info.pixel_sizes)
+    meta = {
+        "rgb": True,
+        "name": f"{info.image_id}: {info.name}",
+        "scale": [1, size_z, size_y, size_x],
+        "metadata": {"omero": LazyJSON.of_image(conn, info)},
+        "axis_labels": ("t", "z", "y", "x"),
+    }
+    return (pyramid if len(pyramid) > 1 else pyramid[0], meta, "image")
+
+
+def load_container(
+    conn: BlitzGateway,
+    obj_type: str,
+    obj_id: int,
+    chunks: Union[ChunkPolicy, str, None] = None,
+) -> list[LayerData]:
+    """Load the images of Dataset or Project `obj_id` as napari layer data.
+
+    The metadata of all images is fetched in bulk (see `get_images_info`), so
+    opening a dataset of hundreds of images takes a handful of queries rather
+    than several round trips per image.  Images with the same pixel type,
+    sizes and resolution levels are stacked into one lazy layer, along an
+    extra leading "image" axis; the others are loaded as separate layers.
+    Images are always loaded lazily.
+    """
+    viewer = napari.current_viewer()
+    if viewer is not None:
+        connect_viewer(viewer)
+    infos = get_images_info(conn, container_image_ids(conn, obj_type, obj_id))
+    groups: dict[tuple, list[ImageInfo]] = {}
+    for info in infos:
+        key = (
+            info.pixels_type,
+            tuple(info.size_tcz),
+            tuple(map(tuple, info.levels)),
+            info.tile_size,
+        )
+        groups.setdefault(key, []).append(info)
+
+    layers = []
+    for group in groups.values():
+        if len(group) == 1:
+            layers.append(_image_layer(conn, group[0], chunks, eager=False))
+        else:
+            layers.append(_stacked_layer(conn, group, f"{obj_type}:{obj_id}", chunks))
+    return layers
+
+
+def _stacked_layer(
+    conn: BlitzGateway,
+    infos: list[ImageInfo],
+    name: str,
+    chunks: Union[ChunkPolicy, str, None] = None,
+) -> LayerData:
+    readers = [PixelsReader.from_info(conn, info) for info in infos]
+    for reader in readers:
+        _READERS[reader.image_id] = reader
+        if not reader.is_pyramid:
+            reader.add_synthetic_levels()
+    first = readers[0]
+    if not first.is_pyramid:
+        # resolved once for all images, e.g. "auto" measures the latency
+        chunks = first.resolve_policy(chunks)
+    pyramid = [
+        da.stack([reader.lazy_level(level, chunks) for reader in readers])
+        for level in range(len(first.levels))
+    ]
+    if first.factors[-1] > 1:
+        # as in `_image_layer`, for the image napari starts on
+        first.prefetch_plane(infos[0].default_z, infos[0].default_t)
+
+    meta = _stacked_metadata(conn, infos[0], "image", name)
+    meta["metadata"] = {
+        "omero_images": [LazyJSON.of_image(conn, info) for info in infos]
+    }
+    return (pyramid if len(pyramid) > 1 else pyramid[0], meta, "image")
+
+
+def load_plate(conn: BlitzGateway, plate_id: int) -> list[LayerData]:
+    """Load plate `plate_id` as a lazy well-grid mosaic, see `PlateReader`.
+
+    The layer is (field, t, z, y, x) once channels are split.  Only the plate
+    layout (one query) and the metadata of one field image with the most
+    channels are loaded before the layer is shown; display settings of that
+    image apply to all wells.
+    """
+    viewer = napari.current_viewer()
+    if viewer is not None:
+        connect_viewer(viewer)
+    reader = _PLATES[plate_id] = PlateReader.from_plate(conn, plate_id)
+    info = get_image_info(conn, reader.metadata_image_id)
+    meta = _stacked_metadata(conn, info, "field", reader.name)
+    meta["metadata"] = {"omero_plate": LazyJSON(plate_id, lambda: reader.plate)}
+    pyramid = reader.lazy_pyramid()
+    return [(pyramid if len(pyramid) > 1 else pyramid[0], meta, "image")]
+
+
+def _stacked_metadata(
+    conn: BlitzGateway, info: ImageInfo, axis_label: str, name: str
+) -> dict:
+    """Layer metadata of images stacked along a leading `axis_label` axis."""
+    # display settings of `info` apply to the whole stack
+    meta = _layer_metadata(conn, info)
+    meta["channel_axis"] = 2
+    meta["scale"] = [1, *meta["scale"]]
+    meta["name"] = [f"{name}: {ch.label}" for ch in info.channels]
+    meta["axis_labels"] = (axis_label, *meta["axis_labels"])
+    # no "omero" key: the layer is not one image (e.g. for the ROI widget)
+    del meta["metadata"]
+    return meta
+
+
+def eager_max_bytes() -> int:
+    """Memory budget of eager loading, in bytes."""
+    if max_bytes := os.getenv(EAGER_MAX_BYTES_ENV):
+        return parse_bytes(max_bytes)
+    return psutil.virtual_memory().available // 2
+
+
+def _read_eager(
+    reader: PixelsReader, max_bytes: Optional[int] = None
+) -> Optional[np.ndarray]:
+    if max_bytes is None:
+        max_bytes = eager_max_bytes()
+    nbytes = np.prod(reader.shape(0), dtype=np.int64) * reader.dtype.itemsize
+    if nbytes > max_bytes:
+        show_warning(
+            f"Image {reader.image_id} ({nbytes / 2**30:.1f} GiB) does not fit the "
+            f"eager loading budget of {max_bytes / 2**30:.1f} GiB, "
+            "loading it lazily instead."
+        )
+        return None
+
+    with progress(desc=f"Loading image {reader.image_id}") as pbar:
+
+        def _update(done: int, total: int) -> None:
+            pbar.total = total
+            pbar.update(1)
+
+        return reader.read_parallel(0, progress=_update)
+
+
+_CONNECTED_VIEWERS: "weakref.WeakSet[napari.Viewer]" = weakref.WeakSet()
+# readers of the images currently open, by image id
+_READERS: "weakref.WeakValueDictionary[int, PixelsReader]" = (
+    weakref.WeakValueDictionary()
+)
+# readers of the plates currently open, by plate id
+_PLATES: "weakref.WeakValueDictionary[int, PlateReader]" = weakref.WeakValueDictionary()
+
+
+def connect_viewer(viewer: "napari.Viewer") -> None:
+    """Connect the plugin to events of `viewer` (only once per viewer)."""
+    if viewer in _CONNECTED_VIEWERS:
+        return
+    _CONNECTED_VIEWERS.add(viewer)
+    viewer.update_console({"omero_metrics": get_metrics()})
+    viewer.layers.events.removed.connect(_on_layer_removed)
+
+    viewer_ref = weakref.ref(viewer)
+
+    def _on_dims_change(event) -> None:
+        viewer = viewer_ref()
+        if viewer is not None and viewer.dims.ndisplay == 3:
+            prefetch_volumes(viewer)
+
+    # connect first, so that transfers are under way before napari slices
+    viewer.dims.events.ndisplay.connect(_on_dims_change, position="first")
+    viewer.dims.events.current_step.connect(_on_dims_change, position="first")
+
+
+def prefetch_volumes(viewer: "napari.Viewer") -> None:
+    """Fetch the Z-stacks of visible OMERO images in bulk, for 3D rendering."""
+    # layers are ([image,] t, z, y, x), aligned to the last axes of the viewer
+    step = (0,) * 5 + tuple(viewer.dims.current_step)
+    stacks = set()
+    for layer in viewer.layers:
+        if layer.visible:
+            # in 3D napari renders the coarsest level of multiscale layers
+            level = len(layer.data) - 1 if getattr(layer, "multiscale", False) else 0
+            for image_id in _omero_image_ids(layer, image=step[-5]):
+                stacks.add((image_id, level))
+    for image_id, level in stacks:
+        reader = _READERS.get(image_id)
+        if reader is not None:
+            reader.prefetch_stack(step[-4], level)
+
+
+def _omero_image_ids(layer, image: Optional[int] = None) -> list[int]:
+    """Ids of the OMERO images shown by `layer` (only `image` of a stack)."""
+    # not `if omero`: that would encode a LazyJSON
+    if (omero := layer.metadata.get("omero")) is not None:
+        return [omero.get("@id")]
+    if (plate := layer.metadata.get("omero_plate")) is not None:
+        # wells are small 2D fields, not worth prefetching as volumes
+        reader = _PLATES.get(plate.get("@id"))
+        return reader.image_ids if reader is not None and image is None else []
+    stack = layer.metadata.get("omero_images") or []
+    if image is not None:
+        stack = stack[image : image + 1]
+    return [omero.get("@id") for omero in stack]
+
+
+def _on_layer_removed(event) -> None:
+    """Free cached planes of images once their last layer is removed."""
+    image_ids = set(_omero_image_ids(event.value))
+    if not image_ids:
+        return
+    # e.g. other channels of the same image
+    for layer in event.source:
+        image_ids.difference_update(_omero_image_ids(layer))
+    for image_id in image_ids:
+        get_chunk_cache().drop_image(image_id)
 
 
 BASIC_COLORMAPS = {
@@ -113,34 +408,33 @@ BASIC_COLORMAPS = {
 
 def get_omero_metadata(image: ImageWrapper) -> dict:
     """Get metadata from OMERO as a Dict to pass to napari."""
-    channels = image.getChannels()
+    return _layer_metadata(image._conn, get_image_info(image._conn, image.getId()))
+
+
+def _layer_metadata(conn: BlitzGateway, info: ImageInfo) -> dict:
+    channels = info.channels
 
     colors = []
     for ch in channels:
         # use current rendering settings from OMERO
-        color = ch.getColor()
         # ensure the basics work regardless of napari version
-        if color.getHtml() in BASIC_COLORMAPS:
-            colors.append(ensure_colormap(BASIC_COLORMAPS[color.getHtml()]))
+        if ch.color in BASIC_COLORMAPS:
+            colors.append(ensure_colormap(BASIC_COLORMAPS[ch.color]))
         else:
-            colors.append(ensure_colormap("#" + color.getHtml()))
+            colors.append(ensure_colormap("#" + ch.color))
 
-    contrast_limits = [[ch.getWindowStart(), ch.getWindowEnd()] for ch in channels]
+    contrast_limits = [list(ch.window) for ch in channels]
 
-    visibles = [ch.isActive() for ch in channels]
-    names = [f"{image.getId()}: {ch.getLabel()}" for ch in channels]
+    visibles = [ch.active for ch in channels]
+    names = [f"{info.image_id}: {ch.label}" for ch in channels]
 
-    size_x = image.getPixelSizeX() or 1
-    size_y = image.getPixelSizeY() or 1
-    size_z = image.getPixelSizeZ() or 1
+    size_x, size_y, size_z = (size or 1 for size in info.pixel_sizes)
     # data is TCZYX, but C is passed to channel_axis and split
     # so we only need scale to have 4 elements
     scale = [1, size_z, size_y, size_x]
 
-    # get json metadata from omero
-    img_obj = image._obj
-    encoder = get_encoder(img_obj.__class__)
-    metadata = {"omero": encoder.encode(img_obj)}
+    # json metadata from omero, encoded only if something reads it
+    metadata = {"omero": LazyJSON.of_image(conn, info)}
 
     return {
         "channel_axis": 1,
@@ -154,281 +448,30 @@ def get_omero_metadata(image: ImageWrapper) -> dict:
     }
 
 
-# @timer
-def get_data_lazy(image: ImageWrapper) -> da.Array:
-    """Get 5D dask array, with delayed reading from OMERO image."""
-    nt, nc, nz, ny, nx = (getattr(image, f"getSize{x}")() for x in "TCZYX")
-    pixels = image.getPrimaryPixels()
-    dtype = PIXEL_TYPES.get(pixels.getPixelsType().value, None)
-    get_plane = delayed(timer(lambda idx: pixels.getPlane(*idx)))
-
-    def get_lazy_plane(zct: tuple[int, ...]):
-        return da.from_delayed(get_plane(zct), shape=(ny, nx), dtype=dtype)
-
-    # 5D stack: TCZXY
-    t_stacks = []
-    for t in range(nt):
-        c_stacks = []
-        for c in range(nc):
-            z_stack = []
-            for z in range(nz):
-                z_stack.append(get_lazy_plane((z, c, t)))
-            c_stacks.append(da.stack(z_stack))
-        t_stacks.append(da.stack(c_stacks))
-    return da.stack(t_stacks)
+def get_data_lazy(
+    image: ImageWrapper, chunks: Union[ChunkPolicy, str, None] = None
+) -> da.Array:
+    """Get 5D dask array, with delayed reading from OMERO image.
+
+    `chunks` is a `ChunkPolicy` (or its string form, e.g. "zblock:8"),
+    by default taken from the ``NAPARI_OMERO_CHUNKS`` environment variable.
+    """
+    return PixelsReader.from_image(image).lazy_level(0, chunks)
 
 
 def get_pyramid_lazy(image: ImageWrapper) -> list[da.Array]:
-    """Get a pyramid of rgb dask arrays, loading tiles from OMERO."""
-    size_z = image.getSizeZ()
-    size_t = image.getSizeT()
-    size_c = image.getSizeC()
-    pixels = image.getPrimaryPixels()
-    dtype = PIXEL_TYPES.get(pixels.getPixelsType().value, None)
-
-    image._prepareRenderingEngine()
-    tile_w, tile_h = image._re.getTileSize()
-
-    def get_tile(tile_name):
-        """tile_name is 'level,z,t,x,y,w,h'."""
-        level, z, c, t, x, y, w, h = (int(n) for n in tile_name.split(","))
-        pix_id = image.getPixelsId()
-        with raw_pixels_store(image) as pix:
-            pix.setPixelsId(pix_id, False, {"omero.group": "-1"})
-            pix.setResolutionLevel(level)
-            tile = pix.getTile(z, c, t, x, y, w, h)
-            tile = np.frombuffer(tile, dtype=np.uint8)
-            tile = tile.reshape((h, w))
-            return tile
-
-    lazy_reader = delayed(get_tile)
-
-    def get_lazy_big_plane(level_id, level_desc, z, c, t):
-        size_x = level_desc.sizeX
-        size_y = level_desc.sizeY
-        cols = ceil(size_x / tile_w)
-        rows = ceil(size_y / tile_h)
-        lazy_rows = []
-        for row in range(rows):
-            lazy_row = []
-            for col in range(cols):
-                x = col * tile_w
-                y = row * tile_h
-                w = min(tile_w, size_x - x)
-                h = min(tile_h, size_y - y)
-                tile_name = f"{level_id},{z},{c},{t},{x},{y},{w},{h}"
-                lazy_tile = da.from_delayed(
-                    lazy_reader(tile_name), shape=(h, w), dtype=dtype
-                )
-                lazy_row.append(lazy_tile)
-            lazy_row = da.concatenate(lazy_row, axis=1)
-            lazy_rows.append(lazy_row)
-        return da.concatenate(lazy_rows, axis=0)
-
-    pyramid = []
-    levels_desc = image._re.getResolutionDescriptions()
-    for level, level_desc in enumerate(levels_desc):
-        level_id = len(levels_desc) - level - 1
-        # 5D stack: TCZXY
-        t_stacks = []
-        for t in range(size_t):
-            c_stacks = []
-            for c in range(size_c):
-                z_stack = []
-                for z in range(size_z):
-                    z_stack.append(get_lazy_big_plane(level_id, level_desc, z, c, t))
-                c_stacks.append(da.stack(z_stack))
-            t_stacks.append(da.stack(c_stacks))
-        pyramid.append(da.stack(t_stacks))
-
-    return pyramid
+    """Get a pyramid of 5D dask arrays, loading tiles from OMERO."""
+    return PixelsReader.from_image(image).lazy_pyramid()
 
 
 def load_rois(
     conn: BlitzGateway, image: ImageWrapper, load_points: bool
 ) -> list[LayerData]:
-    """Load ROIs from an OMERO image and formats their coordinates and metadata."""
-    roi_service = conn.getRoiService()
-    result = roi_service.findByImage(image.getId(), None)
-    img_id = image.getId()
-
-    # Lists to store properties for all shapes
-    all_coords = []
-    all_shape_types = []
-    all_comments = []
-    all_roi_ids = []
-    all_shape_ids = []
-    all_edge_colors = []
-    all_face_colors = []
-
-    # Get Z and T dimension ranges for the image
-    size_z = range(image.getSizeZ())
-    size_t = range(image.getSizeT())
-
-    # Get physical pixel sizes; default to 1 if not defined
-    size_x = image.getPixelSizeX() or 1
-    size_y = image.getPixelSizeY() or 1
-    pixel_size_z = image.getPixelSizeZ() or 1
-
-    # Loop through all ROIs
-    for roi in result.rois:
-        roi_id = roi.getId().getValue()
-        # Loop through all shapes in each ROI
-        for shape in roi.copyShapes():
-            if shape is None:
-                show_warning("Encountered an empty (None) shape, skipping.")
-                continue
-            sh_type = shape.__class__.__name__
-            if (sh_type != "PointI" and load_points) or (
-                sh_type == "PointI" and not load_points
-            ):
-                continue
-
-            shape_id = shape.getId().getValue()
-            labels = shape.getTextValue()
-            comment = labels.getValue() if labels else ""
-
-            # Use shape's Z/T if set, else apply to all slices (T, Z)
-            theZ = shape.getTheZ()
-            z_values = [theZ.getValue()] if theZ else list(size_z)
-            theT = shape.getTheT()
-            t_values = [theT.getValue()] if theT else list(size_t)
-
-            # Make meshgrid of (t, z)
-            T, Z = np.meshgrid(t_values, z_values, indexing="ij")  # (T, Z)
-            tz = np.stack([T.ravel(), Z.ravel()], axis=1)  # (T*Z, 2)
-            count = len(tz)
-
-            edge_color = shape.getStrokeColor()
-            fill_color = shape.getFillColor()
-            if not load_points:
-                # Parse shape to Napari-compatible format
-                parsed = parse_omero_shape(shape)
-                if parsed is None:
-                    show_warning(f"Unsupported OMERO shape skipped: {sh_type}")
-                    continue
-                coords_2d, meta, _ = parsed
-
-                tz_repeated = np.repeat(tz, len(coords_2d), axis=0)  # (T*Z*N, 2)
-                coords_tiled = np.tile(coords_2d, (count, 1))  # (T*Z*N, 2)
-                full_coords = np.hstack([tz_repeated, coords_tiled])  # (T*Z*N, 4)
-
-                # Reshape into list of shape instances (1 per tz)
-                repeated_coords = full_coords.reshape(count, len(coords_2d), 4)
-                all_coords.extend(repeated_coords)
-                all_shape_types.extend([meta["shape_type"]] * count)
-            else:
-                x = float(shape.getX().getValue())
-                y = float(shape.getY().getValue())
-                coords_2d = np.array([[y, x]])  # (1, 2)
-                coords_tiled = np.tile(coords_2d, (count, 1))  # (T*Z, 2)
-                full_coords = np.hstack([tz, coords_tiled])  # (T*Z, 4)
-                all_coords.extend(full_coords)
-
-            # Extend metadata
-            all_comments.extend([comment] * count)
-            all_roi_ids.extend([roi_id] * count)
-            all_shape_ids.extend([shape_id] * count)
-            all_edge_colors.extend([omero_color_to_hex(edge_color)] * count)
-            all_face_colors.extend([omero_color_to_hex(fill_color)] * count)
-
-    roi_layer_meta = None
-    if all_coords:
-        # generic metadata for points and shapes
-        roi_layer_meta = {
-            "face_color": all_face_colors,
-            "scale": (1, pixel_size_z, size_y, size_x),
-            "text": {
-                "string": "{comment}",
-                "size": 7,
-            },
-            "features": {
-                "comment": np.array(all_comments, dtype=object),
-                "roi_id": np.array(all_roi_ids, dtype=object),
-                "shape_id": np.array(all_shape_ids, dtype=object),
-                "image_id": np.full(len(all_coords), img_id, dtype=int),
-            },
-        }
-
-        if not load_points:  # specific metadata for shapes
-            roi_layer_meta["name"] = f"OMERO ROIs {img_id}"
-            roi_layer_meta["shape_type"] = all_shape_types
-            roi_layer_meta["edge_width"] = [1] * len(all_coords)
-            roi_layer_meta["edge_color"] = all_edge_colors
-        else:  # specific metadata for points
-            roi_layer_meta["name"] = f"OMERO Points {img_id}"
-            roi_layer_meta["symbol"] = "o"
-            roi_layer_meta["border_color"] = all_edge_colors
-            roi_layer_meta["size"] = [5] * len(all_coords)
-
-    if load_points:
-        return [(all_coords, roi_layer_meta, "points")]
-    else:
-        return [(all_coords, roi_layer_meta, "shapes")]
-
-
-def omero_color_to_hex(color_val) -> str:
-    """Convert OMERO ARGB int to hex color string for Napari."""
-    if color_val is None:
-        return "white"
-
-    if hasattr(color_val, "getValue"):
-        color_val = color_val.getValue()
-
-    # Convert signed to unsigned 32-bit
-    val = color_val & 0xFFFFFFFF
-
-    # Extract RGBA
-    r = (val >> 24) & 0xFF
-    g = (val >> 16) & 0xFF
-    b = (val >> 8) & 0xFF
-
-    hexa_decimal = f"#{r:02X}{g:02X}{b:02X}"
-
-    return hexa_decimal
-
-
-def parse_omero_shape(shape) -> Optional[LayerData]:
-    """Convert an OMERO shape into a Napari-compatible format."""
-    shape_type = shape.__class__.__name__
-    if shape_type == "RectangleI":
-        # Get position and size
-        x = float(shape.getX().getValue())
-        y = float(shape.getY().getValue())
-        w = float(shape.getWidth().getValue())
-        h = float(shape.getHeight().getValue())
-
-        # Coordinates for the rectangle corners in (y, x)
-        coords = np.array([[y, x], [y, x + w], [y + h, x + w], [y + h, x]])
-        meta = {"shape_type": "rectangle", "name": "ROI_Rectangle"}
-        return coords, meta, "shapes"
-
-    elif shape_type == "PolygonI":
-        points = shape.getPoints().getValue()
-        coords = np.array(
-            [
-                [float(y), float(x)]
-                for x, y, *_ in (p.split(",") for p in points.split(" "))
-            ]
-        )
-        meta = {"shape_type": "polygon", "name": "ROI_Polygon"}
-        return coords, meta, "shapes"
-
-    elif shape_type == "EllipseI":
-        cx = float(shape.getX().getValue())
-        cy = float(shape.getY().getValue())
-        rx = float(shape.getRadiusX().getValue())
-        ry = float(shape.getRadiusY().getValue())
-
-        # Compute four corner points of the bounding box
-        top_left = [cy - ry, cx - rx]
-        top_right = [cy - ry, cx + rx]
-        bottom_right = [cy + ry, cx + rx]
-        bottom_left = [cy + ry, cx - rx]
-
-        coords = np.array([top_left, top_right, bottom_right, bottom_left])
-        meta = {"shape_type": "ellipse", "name": "ROI_Ellipse"}
-        return coords, meta, "shapes"
-
-    # Return None if shape type not supported
-    return None
+    """Load the points (or other shapes) of an OMERO image as napari layer data.
+
+    See `load_roi_layers`, which loads both at once, and `roi_layer_data`
+    for the layers made.  Without ROIs, the layer metadata is None.
+    """
+    table = load_shape_table(conn, image.getId())
+    layers = roi_layer_data(table, image, load_points)
+    return layers or [([], None, "points" if load_points else "shapes")]
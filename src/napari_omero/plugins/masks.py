@@ -1,8 +1,14 @@
 import numpy as np
 from omero_rois import mask_from_binary_image
+from scipy import ndimage
 
-from omero.gateway import ImageWrapper
-from omero.model import RoiI
+from napari_omero.metrics import track
+from omero.gateway import BlitzGateway, ImageWrapper
+from omero.model import IObject, RoiI
+from omero.rtypes import rdouble
+
+# ROIs per saveAndReturnArray call when saving ROIs and labels
+ROI_BATCH_SIZE = 500
 
 
 def create_roi(image: ImageWrapper, shapes) -> RoiI:
@@ -13,42 +19,157 @@ def create_roi(image: ImageWrapper, shapes) -> RoiI:
     for shape in shapes:
         roi.addShape(shape)
     # Save the ROI (saves any linked shapes too)
-    return updateService.saveAndReturnObject(roi, image._conn.SERVICE_OPTS)
+    with track("save"):
+        return updateService.saveAndReturnObject(roi, image._conn.SERVICE_OPTS)
+
+
+def save_roi_batches(
+    conn: BlitzGateway, objects: list[IObject], batch_size: int = ROI_BATCH_SIZE
+) -> list[IObject]:
+    """Save new ROIs (with their shapes) or shapes, `batch_size` at a time."""
+    update_service = conn.getUpdateService()
+    saved = []
+    for start in range(0, len(objects), batch_size):
+        batch = objects[start : start + batch_size]
+        with track("save"):
+            saved.extend(update_service.saveAndReturnArray(batch, conn.SERVICE_OPTS))
+    return saved
 
 
-def save_labels(layer, image: ImageWrapper) -> list[RoiI]:
+def save_labels(
+    layer, image: ImageWrapper, batch_size: int = ROI_BATCH_SIZE
+) -> list[RoiI]:
     """
     Saves masks from a 5D image (no C dimension).
 
     Each non-zero value in the labels data
     is used to create an ROI in OMERO with a
     Shape Mask created for each Z/T plane of
-    the mask.
+    the mask.  The labels and their bounding boxes are found in one pass
+    over the data, and only the box of each label is read to make its
+    masks.  ROIs are saved `batch_size` at a time.
+    """
+    masks_4d = np.asarray(layer.data)
+    rois = [
+        _label_roi(image, masks_4d[box] == value, box, _label_rgba(layer, value))
+        for value, box in label_boxes(masks_4d)
+    ]
+    return save_roi_batches(image._conn, rois, batch_size)
+
+
+def sync_labels(
+    layer, image: ImageWrapper, batch_size: int = ROI_BATCH_SIZE
+) -> tuple[int, int, int]:
+    """Save the labels of `layer` that changed since they were last synced.
+
+    Like `save_labels`, but each label is remembered in
+    ``layer.metadata["omero_labels"]`` with a hash of its mask and color and
+    the ID of its ROI.  Only new labels get a ROI; the ROI of a changed
+    label is replaced, and the ROI of a label that is gone is deleted, so
+    syncing twice in a row sends nothing the second time.  Layers synced
+    with another image are left alone.
+
+    Returns
+    -------
+    tuple[int, int, int]
+        The number of label ROIs created, replaced and deleted.
     """
-    # for each label value, check if we have any masks
+    synced = layer.metadata.setdefault(
+        "omero_labels", {"image_id": image.id, "labels": {}, "deleting": []}
+    )
+    if synced["image_id"] != image.id:
+        return 0, 0, 0
+    known = synced["labels"]
+
     masks_4d = np.asarray(layer.data)
-    rois = []
-    for v in range(1, masks_4d.max() + 1):
-        hits = masks_4d.flatten() == v
-        if np.any(hits):
-            rgba = layer.get_color(v)
-            rgba = [round(r * 255) for r in rgba]
-            rgba[3] = layer.opacity * 256
-            rois.append(save_label(masks_4d == v, image, rgba))
-    return rois
+    rois, values, hashes = [], [], []
+    present = set()
+    for value, box in label_boxes(masks_4d):
+        present.add(value)
+        bool_4d = masks_4d[box] == value
+        rgba = _label_rgba(layer, value)
+        bounds = tuple((s.start, s.stop) for s in box)
+        label_hash = hash((bounds, bool_4d.tobytes(), tuple(rgba)))
+        if value in known and known[value][0] == label_hash:
+            continue
+        rois.append(_label_roi(image, bool_4d, box, rgba))
+        values.append(value)
+        hashes.append(label_hash)
+
+    # remembered as soon as saved, see `sync_rois`
+    saved = save_roi_batches(image._conn, rois, batch_size)
+    replaced = 0
+    for value, label_hash, roi in zip(values, hashes, saved):
+        if value in known:
+            replaced += 1
+            synced["deleting"].append(known[value][1])
+        known[value] = (label_hash, roi.id.val)
+    removed = [value for value in known if value not in present]
+    for value in removed:
+        synced["deleting"].append(known.pop(value)[1])
+
+    # failed deletions are retried by the next sync
+    deleting = synced["deleting"]
+    while deleting:
+        with track("save"):
+            image._conn.deleteObjects("Roi", deleting[:batch_size], wait=True)
+        del deleting[:batch_size]
+    return len(saved) - replaced, replaced, len(removed)
+
+
+def _label_rgba(layer, value: int) -> list:
+    rgba = layer.get_color(value)
+    rgba = [round(r * 255) for r in rgba]
+    rgba[3] = layer.opacity * 256
+    return rgba
+
+
+def _label_roi(image: ImageWrapper, bool_4d: np.ndarray, box, rgba) -> RoiI:
+    """A new ROI of a label, with a mask per plane (see `label_masks`)."""
+    roi = RoiI()
+    roi.setImage(image._obj)
+    for shape in label_masks(bool_4d, box, rgba):
+        roi.addShape(shape)
+    return roi
+
+
+def label_boxes(labels: np.ndarray) -> list[tuple[int, tuple[slice, ...]]]:
+    """Each label (> 0) present in `labels`, with its bounding box."""
+    if labels.dtype == bool:
+        labels = labels.view(np.uint8)
+    max_label = labels.max(initial=0)
+    if max_label <= 0:
+        return []
+    if max_label <= labels.size:
+        boxes = ndimage.find_objects(labels)
+        return [(i + 1, box) for i, box in enumerate(boxes) if box is not None]
+    # few labels with huge values: number them from 1 first
+    values, dense = np.unique(np.maximum(labels, 0), return_inverse=True)
+    shift = int(values[0] > 0)
+    boxes = ndimage.find_objects(dense.reshape(labels.shape) + shift)
+    return [
+        (int(values[i + 1 - shift]), box)
+        for i, box in enumerate(boxes)
+        if box is not None
+    ]
+
+
+def label_masks(bool_4d: np.ndarray, box: tuple[slice, ...], rgba) -> list:
+    """Mask shapes of each plane of a (t, z, y, x) mask cut out at `box`."""
+    t0, z0, y0, x0 = (s.start for s in box)
+    shapes = []
+    for t, z in zip(*np.nonzero(bool_4d.any(axis=(2, 3)))):
+        mask = mask_from_binary_image(
+            bool_4d[t, z], rgba=rgba, z=int(z0 + z), t=int(t0 + t)
+        )
+        # mask_from_binary_image places masks in the cut-out plane
+        mask.x = rdouble(mask.x.val + x0)
+        mask.y = rdouble(mask.y.val + y0)
+        shapes.append(mask)
+    return shapes
 
 
 def save_label(bool_4d: np.ndarray, image: ImageWrapper, rgba) -> RoiI:
     """Turns a boolean array of shape (t, z, y, x) into OMERO Roi."""
-    size_t = bool_4d.shape[0]
-    size_z = bool_4d.shape[1]
-    # Create an ROI with a shape for each Z/T that has some mask
-    mask_shapes = []
-    for z in range(0, size_z):
-        for t in range(0, size_t):
-            masks_2d = bool_4d[t][z]
-            if np.any(masks_2d.flatten()):
-                mask = mask_from_binary_image(masks_2d, rgba=rgba, z=z, t=t)
-                mask_shapes.append(mask)
-
-    return create_roi(image, mask_shapes)
+    box = tuple(slice(0, size) for size in bool_4d.shape)
+    return create_roi(image, label_masks(bool_4d, box, rgba))
@@ -0,0 +1,505 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, Optional, Union
+
+from omero_marshal import get_encoder
+
+from napari_omero.metrics import track
+from napari_omero.utils import server_id
+from omero.gateway import BlitzGateway, ImageWrapper
+from omero.model import IObject
+from omero.sys import ParametersI
+
+from .cache import DEFAULT_DISK_CACHE_DIR
+from .pixels import pyramid_layout
+
+logger = logging.getLogger(__name__)
+
+# path of the SQLite metadata cache; "0" disables it
+METADATA_CACHE_ENV = "NAPARI_OMERO_METADATA_CACHE"
+DEFAULT_METADATA_CACHE = DEFAULT_DISK_CACHE_DIR / "metadata.sqlite"
+
+# images with their pixels and channels
+IMAGE_QUERY = """
+    select distinct i from Image i
+    join fetch i.details.owner
+    join fetch i.pixels p
+    join fetch p.pixelsType
+    left outer join fetch p.channels ch
+    left outer join fetch ch.logicalChannel
+    where i.id in (:ids)
+"""
+# all rendering settings of pixels, with their channel bindings
+RDEF_QUERY = """
+    select distinct r from RenderingDef r
+    join fetch r.details.owner
+    left outer join fetch r.waveRendering
+    where r.pixels.id in (:ids)
+"""
+# last update of each object an `ImageInfo` is made from
+VERSION_QUERY = """
+    select i.id, i.details.updateEvent.id, p.details.updateEvent.id,
+           lc.details.updateEvent.id, r.details.updateEvent.id,
+           cb.details.updateEvent.id
+    from Image i
+    join i.pixels p
+    left outer join p.channels ch
+    left outer join ch.logicalChannel lc
+    left outer join p.settings r
+    left outer join r.waveRendering cb
+    where i.id in (:ids)
+"""
+# images of a Dataset or Project, in the order of the webclient
+CONTAINER_QUERIES = {
+    "Dataset": """
+        select i.id, lower(i.name) from Image i
+        join i.datasetLinks dl
+        where dl.parent.id = :id
+        order by lower(i.name), i.id
+    """,
+    "Project": """
+        select distinct i.id, lower(i.name) from Image i
+        join i.datasetLinks dl
+        join dl.parent d
+        join d.projectLinks pl
+        where pl.parent.id = :id
+        order by lower(i.name), i.id
+    """,
+}
+# ids per query, to keep "in (:ids)" lists reasonable
+QUERY_BATCH_SIZE = 500
+_ALL_GROUPS = {"omero.group": "-1"}
+
+
+class ChannelInfo(NamedTuple):
+    label: str
+    # "RRGGBB", as in the webclient
+    color: str
+    window: tuple[float, float]
+    active: bool
+
+
+class ImageInfo(NamedTuple):
+    """What napari needs to know about an image, loaded in bulk.
+
+    Everything but `obj` is plain data, so that it can be cached locally.
+    """
+
+    image_id: int
+    pixels_id: int
+    name: str
+    # e.g. "uint16"
+    pixels_type: str
+    size_tcz: tuple[int, int, int]
+    # (size_y, size_x) of each resolution level, full resolution first
+    levels: list[tuple[int, int]]
+    # (width, height) of the server-side tiles, for pyramidal images
+    tile_size: Optional[tuple[int, int]]
+    # physical pixel sizes (x, y, z), None if not set
+    pixel_sizes: tuple[Optional[float], Optional[float], Optional[float]]
+    channels: list[ChannelInfo]
+    default_z: int
+    default_t: int
+    # update events of the image, pixels, channels and rendering settings
+    version: str
+    # the loaded ``ImageI`` graph, None if read from the cache
+    obj: Optional[IObject] = None
+
+    def to_json(self) -> str:
+        return json.dumps(self[:-1])
+
+    @classmethod
+    def from_json(cls, text: str) -> "ImageInfo":
+        data = dict(zip(cls._fields, json.loads(text)))
+        data["size_tcz"] = tuple(data["size_tcz"])
+        data["levels"] = [tuple(level) for level in data["levels"]]
+        if data["tile_size"] is not None:
+            data["tile_size"] = tuple(data["tile_size"])
+        data["pixel_sizes"] = tuple(data["pixel_sizes"])
+        data["channels"] = [
+            ChannelInfo(label, color, tuple(window), active)
+            for label, color, window, active in data["channels"]
+        ]
+        return cls(**data)
+
+
+def _val(rtype, default=None):
+    return rtype.getValue() if rtype is not None else default
+
+
+def _version(event_ids) -> str:
+    return ",".join(str(i) for i in sorted({i for i in event_ids if i is not None}))
+
+
+def _batches(ids: list[int]) -> Iterator[list[int]]:
+    for start in range(0, len(ids), QUERY_BATCH_SIZE):
+        yield ids[start : start + QUERY_BATCH_SIZE]
+
+
+def _find_all(conn: BlitzGateway, query: str, ids: list[int]) -> list:
+    qs = conn.getQueryService()
+    found = []
+    for batch in _batches(ids):
+        params = ParametersI()
+        params.addIds(batch)
+        with track("metadata"):
+            found.extend(qs.findAllByQuery(query, params, _ALL_GROUPS))
+    return found
+
+
+def load_image_object(conn: BlitzGateway, image_id: int) -> IObject:
+    """Load an image with its pixels and channels in one query."""
+    found = _find_all(conn, IMAGE_QUERY, [image_id])
+    if not found:
+        raise NameError(f"No such Image: {image_id}")
+    return found[0]
+
+
+def load_images_info(conn: BlitzGateway, image_ids: list[int]) -> dict[int, ImageInfo]:
+    """Load images, pixels, channels and rendering settings in two queries.
+
+    Going through the gateway wrappers (``getChannels``, ``getColor``,
+    ``getWindowStart``, ...) costs several round trips per channel, as most
+    of them are calls to a rendering engine.  Here, all images (and then all
+    their rendering settings) are loaded in one query each, in batches of
+    ``QUERY_BATCH_SIZE``.  The rendering settings of the current user are
+    used, else those of the image owner, as in the webclient.
+
+    Images that have never been rendered have no settings; theirs are then
+    created through a rendering engine, the slow way.  Pyramidal images also
+    need a rendering engine for their levels.  Missing images are left out.
+    """
+    objs = {obj.id.val: obj for obj in _find_all(conn, IMAGE_QUERY, image_ids)}
+    pixels_ids = [obj.getPrimaryPixels().id.val for obj in objs.values()]
+    rdefs: dict[int, dict[int, IObject]] = defaultdict(dict)
+    for rdef in _find_all(conn, RDEF_QUERY, pixels_ids):
+        rdefs[rdef.pixels.id.val][rdef.details.owner.id.val] = rdef
+    user_id = conn.getUserId()
+    return {
+        image_id: _image_info(conn, obj, rdefs[obj.getPrimaryPixels().id.val], user_id)
+        for image_id, obj in objs.items()
+    }
+
+
+def load_image_info(conn: BlitzGateway, image_id: int) -> ImageInfo:
+    """`ImageInfo` of one image, see `load_images_info`."""
+    info = load_images_info(conn, [image_id]).get(image_id)
+    if info is None:
+        raise NameError(f"No such Image: {image_id}")
+    return info
+
+
+def _image_info(
+    conn: BlitzGateway, obj: IObject, rdefs: dict[int, IObject], user_id: int
+) -> ImageInfo:
+    image = ImageWrapper(conn, obj)
+    pixels = obj.getPrimaryPixels()
+    rdef = rdefs.get(user_id) or rdefs.get(obj.details.owner.id.val)
+    if rdef is None and rdefs:
+        rdef = next(iter(rdefs.values()))
+
+    # the same objects as VERSION_QUERY looks at
+    updated = [obj, pixels]
+    updated += [ch.getLogicalChannel() for ch in pixels.copyChannels()]
+    for r in rdefs.values():
+        updated += [r, *r.copyWaveRendering()]
+    version = _version(o.details.updateEvent.id.val for o in updated)
+
+    if rdef is not None:
+        channels = []
+        for i, (ch, cb) in enumerate(
+            zip(pixels.copyChannels(), rdef.copyWaveRendering())
+        ):
+            lc = ch.getLogicalChannel()
+            label = _val(lc.getName())
+            if not label:
+                wave = _val(lc.getEmissionWave())
+                label = f"{wave:g}" if wave is not None else str(i)
+            rgb = (_val(cb.getRed()), _val(cb.getGreen()), _val(cb.getBlue()))
+            channels.append(
+                ChannelInfo(
+                    label=label,
+                    color="{:02X}{:02X}{:02X}".format(*rgb),
+                    window=(_val(cb.getInputStart()), _val(cb.getInputEnd())),
+                    active=_val(cb.getActive()),
+                )
+            )
+        default_z = _val(rdef.getDefaultZ(), 0)
+        default_t = _val(rdef.getDefaultT(), 0)
+    else:
+        channels = [
+            ChannelInfo(
+                ch.getLabel(),
+                ch.getColor().getHtml(),
+                (ch.getWindowStart(), ch.getWindowEnd()),
+                ch.isActive(),
+            )
+            for ch in image.getChannels()
+        ]
+        default_z = image.getDefaultZ()
+        default_t = image.getDefaultT()
+
+    levels, tile_size = pyramid_layout(image)
+    pixel_sizes = tuple(
+        _val(size)
+        for size in (
+            pixels.getPhysicalSizeX(),
+            pixels.getPhysicalSizeY(),
+            pixels.getPhysicalSizeZ(),
+        )
+    )
+    return ImageInfo(
+        image_id=obj.id.val,
+        pixels_id=pixels.getId().getValue(),
+        name=_val(obj.getName(), ""),
+        pixels_type=pixels.getPixelsType().getValue().getValue(),
+        size_tcz=(
+            _val(pixels.getSizeT()),
+            _val(pixels.getSizeC()),
+            _val(pixels.getSizeZ()),
+        ),
+        levels=levels,
+        tile_size=tile_size,
+        pixel_sizes=pixel_sizes,
+        channels=channels,
+        default_z=default_z,
+        default_t=default_t,
+        version=version,
+        obj=obj,
+    )
+
+
+def image_versions(conn: BlitzGateway, image_ids: list[int]) -> dict[int, str]:
+    """Current `ImageInfo.version` of images, in one small query per batch."""
+    qs = conn.getQueryService()
+    events: dict[int, list] = defaultdict(list)
+    for batch in _batches(image_ids):
+        params = ParametersI()
+        params.addIds(batch)
+        with track("metadata"):
+            rows = qs.projection(VERSION_QUERY, params, _ALL_GROUPS)
+        for image_id, *row in rows:
+            events[image_id.val].extend(_val(v) for v in row)
+    return {image_id: _version(ids) for image_id, ids in events.items()}
+
+
+def container_image_ids(conn: BlitzGateway, obj_type: str, obj_id: int) -> list[int]:
+    """Ids of the images in a Dataset or Project, in one query."""
+    params = ParametersI()
+    params.addId(obj_id)
+    qs = conn.getQueryService()
+    with track("metadata"):
+        rows = qs.projection(CONTAINER_QUERIES[obj_type], params, _ALL_GROUPS)
+    return [row[0].val for row in rows]
+
+
+class MetadataCache:
+    """Local SQLite cache of `ImageInfo`, shared by all napari processes.
+
+    Entries are keyed by server, user (whose rendering settings they hold)
+    and image id, and are stored with the `ImageInfo.version` they were
+    loaded at, so that they can be checked with `image_versions`.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path of the database file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " server TEXT, user_id INTEGER, image_id INTEGER, info TEXT,"
+                " PRIMARY KEY (server, user_id, image_id))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # one connection per use: cheap, and safe across threads
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:  # commits, or rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def get(self, server: str, user_id: int, image_id: int) -> Optional[ImageInfo]:
+        return self.get_many(server, user_id, [image_id]).get(image_id)
+
+    def get_many(
+        self, server: str, user_id: int, image_ids: list[int]
+    ) -> dict[int, ImageInfo]:
+        """Cached entries of `image_ids`, by image id, read in one connection."""
+        found = {}
+        try:
+            with self._connect() as db:
+                # batched to stay below SQLite's limit on query parameters
+                for batch in _batches(image_ids):
+                    rows = db.execute(
+                        "SELECT image_id, info FROM images"
+                        " WHERE server = ? AND user_id = ?"
+                        f" AND image_id IN ({', '.join('?' * len(batch))})",
+                        (server, user_id, *batch),
+                    ).fetchall()
+                    for image_id, text in rows:
+                        try:
+                            found[image_id] = ImageInfo.from_json(text)
+                        except (ValueError, TypeError) as e:
+                            logger.debug(
+                                f"Ignoring metadata cache entry of image {image_id}:"
+                                f" {e}"
+                            )
+        except sqlite3.Error as e:
+            logger.debug(f"Ignoring metadata cache: {e}")
+        return found
+
+    def put(self, server: str, user_id: int, info: ImageInfo) -> None:
+        self.put_many(server, user_id, [info])
+
+    def put_many(self, server: str, user_id: int, infos: list[ImageInfo]) -> None:
+        """Cache `infos` in a single transaction."""
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                    [(server, user_id, i.image_id, i.to_json()) for i in infos],
+                )
+        except sqlite3.Error as e:
+            ids = [info.image_id for info in infos]
+            logger.debug(f"Failed to cache metadata of images {ids}: {e}")
+
+    def clear(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM images")
+
+
+_METADATA_CACHE: Optional[MetadataCache] = None
+_METADATA_CACHE_CONFIGURED = False
+# checks of cached entries against the server
+_CHECK_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="omero")
+
+
+def get_metadata_cache() -> Optional[MetadataCache]:
+    """Return the metadata cache, or None if it is disabled.
+
+    It lives next to the disk cache of pixel data, unless
+    ``NAPARI_OMERO_METADATA_CACHE`` is set to another path (or ``0``).
+    """
+    global _METADATA_CACHE, _METADATA_CACHE_CONFIGURED
+    if not _METADATA_CACHE_CONFIGURED:
+        _METADATA_CACHE_CONFIGURED = True
+        path = os.getenv(METADATA_CACHE_ENV, str(DEFAULT_METADATA_CACHE))
+        if path.lower() not in ("", "0", "false", "no"):
+            try:
+                _METADATA_CACHE = MetadataCache(path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Metadata cache disabled: {e}")
+    return _METADATA_CACHE
+
+
+def get_images_info(conn: BlitzGateway, image_ids: list[int]) -> list[ImageInfo]:
+    """`ImageInfo` of images, from the metadata cache where possible.
+
+    Images missing from the cache are loaded in bulk, see `load_images_info`.
+    Cached entries are returned right away and checked against the server in
+    the background; entries of images (or rendering settings) changed
+    meanwhile are reloaded, for the next time they are opened.  Missing
+    images are left out.
+    """
+    cache = get_metadata_cache()
+    if cache is None:
+        loaded = load_images_info(conn, image_ids)
+        return [loaded[i] for i in image_ids if i in loaded]
+    key = (server_id(conn), conn.getUserId())
+    cached = cache.get_many(*key, image_ids)
+    missing = [i for i in image_ids if i not in cached]
+    loaded = load_images_info(conn, missing) if missing else {}
+    if loaded:
+        cache.put_many(*key, list(loaded.values()))
+    if cached:
+        _CHECK_EXECUTOR.submit(_refresh, cache, key, conn, list(cached.values()))
+    return [
+        cached[i] if i in cached else loaded[i]
+        for i in image_ids
+        if i in cached or i in loaded
+    ]
+
+
+def get_image_info(conn: BlitzGateway, image_id: int) -> ImageInfo:
+    """`ImageInfo` of one image, see `get_images_info`."""
+    found = get_images_info(conn, [image_id])
+    if not found:
+        raise NameError(f"No such Image: {image_id}")
+    return found[0]
+
+
+def _refresh(
+    cache: MetadataCache,
+    key: tuple[str, int],
+    conn: BlitzGateway,
+    infos: list[ImageInfo],
+) -> None:
+    try:
+        versions = image_versions(conn, [info.image_id for info in infos])
+        changed = [i.image_id for i in infos if versions.get(i.image_id) != i.version]
+        if changed:
+            logger.info(f"Metadata of images {changed} changed, reloading it")
+            cache.put_many(*key, list(load_images_info(conn, changed).values()))
+    except Exception as e:
+        logger.debug(f"Failed to check cached image metadata: {e}")
+
+
+class LazyJSON(Mapping):
+    """The omero_marshal JSON of an OMERO object, encoded on first access.
+
+    Encoding a whole image graph is slow and the result is rarely looked at,
+    so it is only done when an item other than ``"@id"`` is read.  `load`
+    returns the object to encode (and may load it from the server).
+    """
+
+    def __init__(self, obj_id: int, load: Callable[[], IObject]):
+        self._id = obj_id
+        self._load = load
+        self._data: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of_image(cls, conn: BlitzGateway, info: ImageInfo) -> "LazyJSON":
+        if info.obj is not None:
+            return cls(info.image_id, lambda: info.obj)
+        return cls(info.image_id, partial(load_image_object, conn, info.image_id))
+
+    def _encoded(self) -> dict:
+        with self._lock:
+            if self._data is None:
+                obj = self._load()
+                self._data = get_encoder(obj.__class__).encode(obj)
+            return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "@id":
+            return self._id
+        return self._encoded()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._encoded())
+
+    def __len__(self) -> int:
+        return len(self._encoded())
+
+    def __repr__(self) -> str:
+        if self._data is None:
+            return f"<{type(self).__name__} of object {self._id}>"
+        return repr(self._data)
@@ -0,0 +1,265 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import accumulate, product
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import dask.array as da
+import numpy as np
+
+from napari_omero.utils import server_id
+from omero.gateway import BlitzGateway
+
+from .metadata import ImageInfo, container_image_ids, get_image_info, get_images_info
+from .pixels import (
+    DEFAULT_TILE_SIZE,
+    DEFAULT_WORKERS,
+    MAX_PLANE_BYTES,
+    Location,
+    PixelsReader,
+    _bin2,
+    _split,
+)
+
+try:
+    import zarr
+except ImportError:  # optional, see the "mirror" extra
+    zarr = None
+
+logger = logging.getLogger(__name__)
+
+MIRROR_DIR_ENV = "NAPARI_OMERO_MIRROR_DIR"
+DEFAULT_MIRROR_DIR = (
+    Path(os.getenv("XDG_DATA_HOME", Path.home() / ".local" / "share"))
+    / "napari-omero"
+    / "mirror"
+)
+# non-pyramidal images get downsampled levels down to this size
+MIN_LEVEL_SIZE = DEFAULT_TILE_SIZE
+
+Progress = Callable[[int, int], None]
+
+
+def mirror_path(
+    conn: BlitzGateway, image_id: int, root: Union[str, Path, None] = None
+) -> Path:
+    """Path of the OME-Zarr mirror of `image_id` (whether it exists or not)."""
+    if root is None:
+        root = os.getenv(MIRROR_DIR_ENV) or DEFAULT_MIRROR_DIR
+    server_dir = server_id(conn).replace(":", "_")
+    return Path(root) / server_dir / f"{image_id}.zarr"
+
+
+def open_mirror(
+    conn: BlitzGateway, info: ImageInfo, root: Union[str, Path, None] = None
+) -> Optional[list[da.Array]]:
+    """Levels of the local mirror of an image, or None if there is none.
+
+    Pixel data cannot change once imported, so a complete mirror of the
+    same pixels is current; display settings still come from `info`.
+    """
+    path = mirror_path(conn, info.image_id, root)
+    if zarr is None or not path.exists():
+        return None
+    try:
+        group = zarr.open_group(str(path), mode="r")
+        state = group.attrs.get("napari_omero", {})
+        if not state.get("complete") or state.get("pixels_id") != info.pixels_id:
+            return None
+        datasets = group.attrs["multiscales"][0]["datasets"]
+        return [da.from_zarr(group[ds["path"]]) for ds in datasets]
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable mirror {path}: {e}")
+        return None
+
+
+def mirror_image(
+    conn: BlitzGateway,
+    image_id: int,
+    root: Union[str, Path, None] = None,
+    progress: Optional[Progress] = None,
+    max_workers: int = DEFAULT_WORKERS,
+) -> Path:
+    """Mirror image `image_id` into a local OME-Zarr store, and return its path.
+
+    Chunks are transferred in parallel and written as soon as they arrive,
+    so an interrupted mirror resumes where it stopped: chunks already on
+    disk are skipped.  Pyramidal images are mirrored level by level, as on
+    the server.  Non-pyramidal images get downsampled levels (2 x 2 binning)
+    computed locally from the mirrored full resolution, down to about
+    ``MIN_LEVEL_SIZE`` pixels.  `progress` is called with the number of
+    chunks done and the total.
+    """
+    if zarr is None:
+        raise ImportError(
+            "Mirroring images requires zarr: pip install 'napari-omero[mirror]'"
+        )
+    info = get_image_info(conn, image_id)
+    reader = PixelsReader.from_info(conn, info)
+    path = mirror_path(conn, image_id, root)
+    group = zarr.open_group(str(path), mode="a")
+    state = group.attrs.get("napari_omero", {})
+    if state.get("pixels_id") != info.pixels_id:
+        # not a (partial) mirror of these pixels: start over
+        group = zarr.open_group(str(path), mode="w")
+    elif state.get("complete"):
+        return path
+
+    shapes = _level_shapes(reader)
+    arrays = []
+    for level, (size_y, size_x) in enumerate(shapes):
+        arrays.append(
+            group.require_dataset(
+                str(level),
+                shape=(*reader.size_tcz, size_y, size_x),
+                chunks=(1, 1, 1, *_chunk_yx(reader, size_y, size_x)),
+                dtype=reader.dtype,
+                dimension_separator="/",
+                # so that every chunk written is on disk when resuming
+                write_empty_chunks=True,
+            )
+        )
+    group.attrs.update(_ome_attrs(info, shapes))
+    group.attrs["napari_omero"] = {
+        "server": server_id(conn),
+        "pixels_id": info.pixels_id,
+        "complete": False,
+    }
+
+    total = sum(arr.nchunks for arr in arrays)
+    done = 0
+
+    def _done(n: int = 1) -> None:
+        nonlocal done
+        done += n
+        if progress is not None:
+            progress(done, total)
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="omero") as pool:
+        for level, arr in enumerate(arrays):
+            if reader.is_pyramid or level == 0:
+                source = _server_source(reader, level)
+            else:
+                source = _binned_source(arrays[level - 1])
+            todo = [loc for loc in _chunk_locations(arr) if not _has_chunk(arr, loc)]
+            _done(arr.nchunks - len(todo))
+            # levels are written in order: binned levels read the one above
+            for _ in pool.map(partial(_copy, source, arr), todo):
+                _done()
+
+    group.attrs["napari_omero"] = {**group.attrs["napari_omero"], "complete": True}
+    return path
+
+
+def mirror_container(
+    conn: BlitzGateway,
+    obj_type: str,
+    obj_id: int,
+    root: Union[str, Path, None] = None,
+    progress: Optional[Progress] = None,
+) -> list[Path]:
+    """Mirror all images of a Dataset or Project, see `mirror_image`."""
+    image_ids = container_image_ids(conn, obj_type, obj_id)
+    # load the metadata of all images at once, see `get_images_info`
+    get_images_info(conn, image_ids)
+    return [mirror_image(conn, i, root, progress) for i in image_ids]
+
+
+def _level_shapes(reader: PixelsReader) -> list[tuple[int, int]]:
+    if reader.is_pyramid:
+        return list(reader.levels)
+    size_y, size_x = reader.levels[0]
+    shapes, factor = [(size_y, size_x)], 2
+    while max(size_y, size_x) // factor >= MIN_LEVEL_SIZE:
+        shapes.append((-(-size_y // factor), -(-size_x // factor)))
+        factor *= 2
+    return shapes
+
+
+def _chunk_yx(reader: PixelsReader, size_y: int, size_x: int) -> tuple[int, int]:
+    """Chunk size along Y and X: server tiles, or planes unless they are huge."""
+    if reader.is_pyramid:
+        tile_w, tile_h = reader.tile_size  # type: ignore [misc]
+        return min(tile_h, size_y), min(tile_w, size_x)
+    if size_y * size_x * reader.dtype.itemsize > MAX_PLANE_BYTES:
+        return min(DEFAULT_TILE_SIZE, size_y), min(DEFAULT_TILE_SIZE, size_x)
+    return size_y, size_x
+
+
+def _ome_attrs(info: ImageInfo, shapes: list[tuple[int, int]]) -> dict:
+    """OME-NGFF (0.4) metadata of the mirror of `info`."""
+    size_x, size_y, size_z = (size or 1 for size in info.pixel_sizes)
+    full_y, full_x = shapes[0]
+    datasets = [
+        {
+            "path": str(level),
+            "coordinateTransformations": [
+                {
+                    "type": "scale",
+                    "scale": [1, 1, size_z, size_y * full_y / y, size_x * full_x / x],
+                }
+            ],
+        }
+        for level, (y, x) in enumerate(shapes)
+    ]
+    axes = [
+        {"name": "t", "type": "time"},
+        {"name": "c", "type": "channel"},
+        *({"name": name, "type": "space"} for name in "zyx"),
+    ]
+    channels = [
+        {
+            "label": ch.label,
+            "color": ch.color,
+            "active": ch.active,
+            "window": {"start": ch.window[0], "end": ch.window[1]},
+        }
+        for ch in info.channels
+    ]
+    return {
+        "multiscales": [
+            {"version": "0.4", "name": info.name, "axes": axes, "datasets": datasets}
+        ],
+        "omero": {
+            "id": info.image_id,
+            "name": info.name,
+            "channels": channels,
+            "rdefs": {"defaultZ": info.default_z, "defaultT": info.default_t},
+        },
+    }
+
+
+def _chunk_locations(arr) -> list[Location]:
+    ranges = []
+    for size, step in zip(arr.shape, arr.chunks):
+        offsets = list(accumulate(_split(size, step), initial=0))
+        ranges.append(list(zip(offsets[:-1], offsets[1:])))
+    return list(product(*ranges))
+
+
+def _has_chunk(arr, loc: Location) -> bool:
+    index = (str(start // step) for (start, _), step in zip(loc, arr.chunks))
+    return f"{arr.path}/{'/'.join(index)}" in arr.store
+
+
+def _copy(source: Callable[[Location], np.ndarray], arr, loc: Location) -> None:
+    arr[tuple(slice(start, stop) for start, stop in loc)] = source(loc)
+
+
+def _server_source(reader: PixelsReader, level: int) -> Callable:
+    """Read regions of `level` from the server."""
+    return lambda loc: reader.read(level, loc, memory_cache=False)
+
+
+def _binned_source(parent) -> Callable:
+    """Compute regions of a level by binning the (mirrored) level above."""
+
+    def _bin(loc: Location):
+        *tcz, (y0, y1), (x0, x1) = loc
+        region = (*(slice(a, b) for a, b in tcz), slice(2 * y0, 2 * y1))
+        block = parent[(*region, slice(2 * x0, 2 * x1))]
+        return _bin2(block)[..., : y1 - y0, : x1 - x0]
+
+    return _bin
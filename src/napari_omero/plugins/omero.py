@@ -1,14 +1,18 @@
 import sys
 from functools import wraps
+from typing import NamedTuple
 
 import napari
-import numpy
+import pandas as pd
 from napari.layers.labels.labels import Labels as labels_layer
 from napari.layers.points.points import Points as points_layer
 from napari.layers.shapes.shapes import Shapes as shapes_layer
+from napari.utils import progress
+from napari.utils.notifications import show_info
 from qtpy.QtWidgets import QPushButton
 
 import omero.clients
+from napari_omero.metrics import track
 from napari_omero.utils import lookup_obj, obj_to_proxy_string
 from omero.cli import CLI, BaseControl, ProxyStringType
 from omero.gateway import BlitzGateway, PixelsWrapper
@@ -23,13 +27,48 @@ from omero.model import (
     RoiI,
 )
 from omero.rtypes import rdouble, rint, rstring
+from omero.sys import ParametersI
 
-from .masks import save_labels
+from .masks import ROI_BATCH_SIZE, save_labels, save_roi_batches, sync_labels
+from .mirror import mirror_container, mirror_image
+from .pixels import PixelsReader
+from .rois import remember_shapes, rgba_to_color, row_hashes, shape_ids
 
 HELP = "Connect OMERO to the napari image viewer"
 
+# the shapes `sync_rois` updates, loaded whole so that only edits change
+SHAPES_QUERY = "select s from Shape s where s.id in (:ids)"
+# fields of each shape class drawn from a napari shape
+GEOMETRY_FIELDS = {
+    "RectangleI": ("x", "y", "width", "height"),
+    "EllipseI": ("x", "y", "radiusX", "radiusY"),
+    "PolygonI": ("points",),
+    "PolylineI": ("points",),
+    "LineI": ("x1", "y1", "x2", "y2"),
+    "PointI": ("x", "y"),
+}
+# fields napari does not show, kept when a shape is replaced by another class
+STYLE_FIELDS = (
+    "theC",
+    "strokeWidth",
+    "strokeDashArray",
+    "fontFamily",
+    "fontSize",
+    "fontStyle",
+    "locked",
+)
+
 VIEW_HELP = "Usage: omero napari view Image:1"
 
+MIRROR_HELP = """Mirror images into local OME-Zarr stores
+
+Images mirrored this way are opened from local disk by napari. Interrupted
+mirrors resume where they stopped.
+
+Usage: omero napari mirror Image:1
+       omero napari mirror Dataset:2
+"""
+
 
 def gateway_required(func):
     """Decorator which initializes a client and BlitzGateway.
@@ -68,10 +107,30 @@ class NapariControl(BaseControl):
             "--eager",
             action="store_true",
             help=(
-                "Use eager loading to load all planes immediately instead"
+                "Use eager loading to load all planes immediately instead "
                 "of lazy-loading each plane when needed"
             ),
         )
+        view.add_argument(
+            "--rendered",
+            action="store_true",
+            help=(
+                "Show the image as rendered by the server (8-bit RGB, with its "
+                "current rendering settings), which transfers much less data"
+            ),
+        )
+
+        mirror = parser.add(sub, self.mirror, MIRROR_HELP)
+        mirror.add_argument(
+            "object", type=obj_type, help="Image, Dataset or Project to mirror"
+        )
+        mirror.add_argument(
+            "--dir",
+            help=(
+                "Root directory of the mirrors (default: NAPARI_OMERO_MIRROR_DIR "
+                "or ~/.local/share/napari-omero/mirror)"
+            ),
+        )
 
     @gateway_required
     def view(self, args):
@@ -87,10 +146,20 @@ class NapariControl(BaseControl):
 
             add_buttons(viewer, img)
 
-            viewer.open(
-                f"omero://{obj_to_proxy_string(args.object)}",
-                plugin="napari-omero",
-            )
+            if args.eager or args.rendered:
+                # loaders imports the widgets, which import this module
+                from .loaders import load_image_wrapper
+
+                layers = load_image_wrapper(
+                    img, eager=args.eager, rendered=args.rendered
+                )
+                for data, meta, layer_type in layers:
+                    getattr(viewer, f"add_{layer_type}")(data, **meta)
+            else:
+                viewer.open(
+                    f"omero://{obj_to_proxy_string(args.object)}",
+                    plugin="napari-omero",
+                )
             set_dims_defaults(viewer, img)
             set_dims_labels(viewer, img)
 
@@ -98,12 +167,38 @@ class NapariControl(BaseControl):
             viewer.update_console({"conn": self.gateway, "omero_image": img})
             napari.run()  # type: ignore
 
+    @gateway_required
+    def mirror(self, args):
+        type_ = args.object.__class__.__name__.rstrip("I")
+        obj_id = args.object.id.val
+        with progress(desc=f"Mirroring {type_}:{obj_id}") as pbar:
+
+            def _update(done: int, total: int) -> None:
+                pbar.total = total
+                pbar.n = done
+                pbar.refresh()
+
+            try:
+                if type_ == "Image":
+                    paths = [mirror_image(self.gateway, obj_id, args.dir, _update)]
+                elif type_ in ("Dataset", "Project"):
+                    paths = mirror_container(
+                        self.gateway, type_, obj_id, args.dir, _update
+                    )
+                else:
+                    self.ctx.die(111, f"Cannot mirror {type_} objects")
+            except NameError as e:
+                self.ctx.die(110, str(e))
+        for path in paths:
+            self.ctx.out(f"Mirrored to {path}")
+
 
 def add_buttons(viewer, img):
     """Add custom buttons to the viewer UI."""
 
     def handle_save_rois():
-        save_rois(viewer, img)
+        summary = save_rois(viewer, img)
+        show_info(f"{summary} to OMERO image id {img.getId()}: {img.getName()}")
 
     button = QPushButton("Save ROIs to OMERO")
     button.clicked.connect(handle_save_rois)
@@ -117,18 +212,10 @@ def get_data(img, c=0):
     :param  img:        omero.gateway.ImageWrapper
     :c      int:        Channel index
     """
-    size_z = img.getSizeZ()
-    size_t = img.getSizeT()
-    # get all planes we need in a single generator
-    zct_list = [(z, c, t) for t in range(size_t) for z in range(size_z)]
-    pixels = img.getPrimaryPixels()
-    plane_gen = pixels.getPlanes(zct_list)
-
-    t_stacks = []
-    for _ in range(size_t):
-        z_stack = [next(plane_gen) for _ in range(size_z)]
-        t_stacks.append(numpy.array(z_stack))
-    return numpy.array(t_stacks)
+    reader = PixelsReader.from_image(img)
+    size_t, _, size_z, size_y, size_x = reader.shape(0)
+    loc = [(0, size_t), (c, c + 1), (0, size_z), (0, size_y), (0, size_x)]
+    return reader.read_parallel(0, loc)[:, 0]
 
 
 def set_dims_labels(viewer, image):
@@ -160,9 +247,38 @@ def set_dims_defaults(viewer, image):
         viewer.dims.set_point(1, image.getDefaultZ())
 
 
-def save_rois(viewer, image):
+class RoiSaveSummary(NamedTuple):
+    """What `save_rois` saved."""
+
+    rois: int
+    shapes: int
+    # shapes napari has but OMERO cannot store (e.g. rotated ellipses)
+    skipped: int
+    # ROIs of masks, from Labels layers
+    label_rois: int
+
+    def __str__(self) -> str:
+        text = f"Saved {self.rois} ROIs with {self.shapes} shapes"
+        if self.label_rois:
+            text += f", and {self.label_rois} ROIs of labels"
+        if self.skipped:
+            text += f" ({self.skipped} unsupported shapes skipped)"
+        return text
+
+
+def save_rois(
+    viewer,
+    image,
+    batch_size: int = ROI_BATCH_SIZE,
+    group_by_roi: bool = False,
+) -> RoiSaveSummary:
     """Save napari ROIs to OMERO.
 
+    Points and shapes are saved in batches of `batch_size` ROIs, one
+    ``saveAndReturnArray`` call per batch.  Each point or shape becomes a
+    ROI of its own, unless `group_by_roi` is True: then shapes of a layer
+    that share a ``roi_id`` feature are saved in one ROI.
+
     Usage: In napari, open console...
     >>> from napari_omero import *
     >>> save_rois(viewer, omero_image).
@@ -171,26 +287,326 @@ def save_rois(viewer, image):
     group_id = image.getDetails().getGroup().getId()
     conn.SERVICE_OPTS.setOmeroGroup(group_id)
 
+    rois = []
+    skipped = label_rois = 0
     for layer in viewer.layers:
         if type(layer) is points_layer:
-            for p in layer.data:
-                point = create_omero_point(p)
-                roi = create_roi(conn, image.id, [point])
-                print(f"Created ROI: {roi.id.val}")
+            shapes = [create_omero_point(p) for p in layer.data]
         elif type(layer) is shapes_layer:
             if len(layer.data) == 0 or len(layer.shape_type) == 0:
                 continue
             shape_types = layer.shape_type
             if isinstance(shape_types, str):
                 shape_types = [layer.shape_type for _ in range(len(layer.data))]
-            for shape_type, data in zip(shape_types, layer.data):
-                shape = create_omero_shape(shape_type, data)
-                if shape is not None:
-                    roi = create_roi(conn, image.id, [shape])
-                    print(f"Created ROI: {roi.id.val}")
+            shapes = [
+                create_omero_shape(shape_type, data)
+                for shape_type, data in zip(shape_types, layer.data)
+            ]
         elif type(layer) is labels_layer:
-            print("Saving Labels...")
-            save_labels(layer, image)
+            label_rois += len(save_labels(layer, image, batch_size))
+            continue
+        else:
+            continue
+        roi_ids = layer.features.get("roi_id") if group_by_roi else None
+        rois.extend(group_shapes(image.id, shapes, roi_ids))
+        skipped += sum(shape is None for shape in shapes)
+
+    saved = save_roi_batches(conn, rois, batch_size)
+    n_shapes = sum(len(roi.copyShapes()) for roi in saved)
+    return RoiSaveSummary(len(saved), n_shapes, skipped, label_rois)
+
+
+def group_shapes(image_id: int, shapes: list, roi_ids=None) -> list[RoiI]:
+    """New (unsaved) ROIs of `shapes`: one per shape, or per `roi_ids` value.
+
+    Shapes that are None are left out; so are their ids.  Shapes with a
+    missing (NaN or None) id get a ROI of their own.
+    """
+    rois: list[RoiI] = []
+    by_id: dict = {}
+    ids = roi_ids if roi_ids is not None else [None] * len(shapes)
+    for shape, roi_id in zip(shapes, ids):
+        if shape is None:
+            continue
+        if pd.isna(roi_id):
+            roi = None
+        else:
+            roi = by_id.get(roi_id)
+        if roi is None:
+            roi = RoiI()
+            roi.setImage(ImageI(image_id, False))
+            rois.append(roi)
+            if not pd.isna(roi_id):
+                by_id[roi_id] = roi
+        roi.addShape(shape)
+    return rois
+
+
+class RoiSyncSummary(NamedTuple):
+    """What `sync_rois` changed."""
+
+    created: int
+    updated: int
+    deleted: int
+    # shapes napari has but OMERO cannot store (e.g. rotated ellipses)
+    skipped: int
+    # ROIs of masks from Labels layers, one per label, created or replaced
+    label_rois: int
+    label_rois_deleted: int
+
+    def __str__(self) -> str:
+        text = (
+            f"Created {self.created}, updated {self.updated} and deleted "
+            f"{self.deleted} shapes"
+        )
+        if self.label_rois or self.label_rois_deleted:
+            text += (
+                f", saved {self.label_rois} and deleted "
+                f"{self.label_rois_deleted} ROIs of labels"
+            )
+        if self.skipped:
+            text += f" ({self.skipped} unsupported shapes skipped)"
+        return text
+
+
+def sync_rois(viewer, image, batch_size: int = ROI_BATCH_SIZE) -> RoiSyncSummary:
+    """Save the changes made in napari to the ROIs of an OMERO image.
+
+    Unlike `save_rois`, which saves every shape as a new ROI, this compares
+    points and shapes layers with the shapes they were loaded with (see
+    `remember_shapes`) and only sends the difference, `batch_size` objects
+    per call:
+
+    - shapes without a ``shape_id`` feature are created, each in a new ROI,
+    - shapes whose geometry, colors or comment changed are loaded and
+      only those fields are updated, or the shape is replaced in its ROI,
+      keeping its other fields, when it needs another OMERO class (e.g. a
+      rotated rectangle, saved as a polygon),
+    - loaded shapes that are not in their layer any more are deleted.
+
+    The IDs of new shapes are written to the layer features and the layers
+    remembered again, so saving twice in a row sends nothing the second
+    time.  New shapes are remembered as soon as they are saved: if an update
+    or a deletion fails, the next sync retries it without creating them
+    again.  Layers loaded from another image are left alone.  Labels layers
+    are synced label by label with `sync_labels`.
+    """
+    conn = image._conn
+    conn.SERVICE_OPTS.setOmeroGroup(image.getDetails().getGroup().getId())
+
+    # what to save, with the (layer, rows) each saved shape is shown on
+    creates: list = []
+    created_rows: list = []
+    # (shape ID, shape from the layer, whether it has no Z, layer, rows)
+    edits: list = []
+    updates: list = []
+    deletes: list[int] = []
+    skipped = replaced = label_rois = label_rois_deleted = 0
+    for layer in viewer.layers:
+        if type(layer) is labels_layer:
+            created, changed, removed = sync_labels(layer, image, batch_size)
+            label_rois += created + changed
+            label_rois_deleted += removed
+            continue
+        if type(layer) not in (points_layer, shapes_layer):
+            continue
+        synced = layer.metadata.get("omero_rois", {"image_id": image.id, "shapes": {}})
+        if synced["image_id"] != image.id:
+            continue
+        known = synced["shapes"]
+        ids = shape_ids(layer)
+        hashes = row_hashes(layer)
+
+        # rows of each known shape; copies made while drawing count as new
+        rows_of: dict[int, list[int]] = {}
+        new_rows = []
+        for row, shape_id in enumerate(ids):
+            rows = rows_of.setdefault(shape_id, [])
+            if shape_id in known and len(rows) < len(known[shape_id]):
+                rows.append(row)
+            else:
+                new_rows.append(row)
+
+        for shape_id, old_hashes in known.items():
+            rows = rows_of.get(shape_id)
+            if not rows:
+                deletes.append(int(shape_id))
+                continue
+            new_hashes = tuple(hashes[row] for row in rows)
+            if new_hashes == old_hashes:
+                continue
+            edited = [r for r, h in zip(rows, new_hashes) if h not in old_hashes]
+            shape = _layer_shape(layer, (edited or rows)[0])
+            if shape is None:
+                skipped += 1
+                continue
+            # shapes shown on several Z-sections are not bound to one in OMERO
+            edits.append((int(shape_id), shape, len(old_hashes) > 1, layer, rows))
+
+        for row in new_rows:
+            shape = _layer_shape(layer, row)
+            if shape is None:
+                skipped += 1
+                continue
+            roi = RoiI()
+            roi.setImage(ImageI(image.id, False))
+            roi.addShape(shape)
+            creates.append(roi)
+            created_rows.append((layer, [row]))
+
+    loaded = _load_shapes(conn, [edit[0] for edit in edits], batch_size)
+    for shape_id, shape, no_z, layer, rows in edits:
+        old = loaded.get(shape_id)
+        if old is None:
+            # deleted in OMERO since it was loaded
+            skipped += 1
+            continue
+        edited = _edited_shape(old, shape, no_z)
+        if edited is old:
+            updates.append(old)
+        else:
+            replaced += 1
+            edited.roi = RoiI(old.roi.id.val, False)
+            deletes.append(shape_id)
+            creates.append(edited)
+            created_rows.append((layer, rows))
+
+    saved = save_roi_batches(conn, creates, batch_size)
+    # before anything else can fail, or the next sync would create them again
+    _set_saved_ids(saved, created_rows, image.id)
+    update_service = conn.getUpdateService()
+    for start in range(0, len(updates), batch_size):
+        with track("save"):
+            update_service.saveArray(
+                updates[start : start + batch_size], conn.SERVICE_OPTS
+            )
+    for start in range(0, len(deletes), batch_size):
+        with track("save"):
+            conn.deleteObjects("Shape", deletes[start : start + batch_size], wait=True)
+
+    for layer in viewer.layers:
+        if type(layer) in (points_layer, shapes_layer):
+            synced = layer.metadata.get("omero_rois")
+            if synced is None or synced["image_id"] == image.id:
+                remember_shapes(layer, image.id)
+    return RoiSyncSummary(
+        len(creates) - replaced,
+        len(updates) + replaced,
+        len(deletes) - replaced,
+        skipped,
+        label_rois,
+        label_rois_deleted,
+    )
+
+
+def _layer_shape(layer, row: int):
+    """A new OMERO shape of row `row` of a points or shapes layer."""
+    if type(layer) is points_layer:
+        shape = create_omero_point(layer.data[row])
+        stroke = layer.border_color[row]
+    else:
+        shape = create_omero_shape(layer.shape_type[row], layer.data[row])
+        stroke = layer.edge_color[row]
+    if shape is None:
+        return None
+    colors = {"strokeColor": rgba_to_color(stroke)}
+    colors["fillColor"] = rgba_to_color(layer.face_color[row])
+    for name, color in colors.items():
+        if color is not None:
+            setattr(shape, name, rint(color))
+    if "comment" in layer.features:
+        comment = layer.features["comment"].iloc[row]
+        if isinstance(comment, str) and comment:
+            shape.textValue = rstring(comment)
+    return shape
+
+
+def _load_shapes(conn: BlitzGateway, ids: list[int], batch_size: int) -> dict:
+    """The shapes with `ids`, by ID."""
+    query_service = conn.getQueryService()
+    shapes = {}
+    for start in range(0, len(ids), batch_size):
+        params = ParametersI()
+        params.addIds(ids[start : start + batch_size])
+        with track("roi"):
+            found = query_service.findAllByQuery(
+                SHAPES_QUERY, params, conn.SERVICE_OPTS
+            )
+        shapes.update((shape.id.val, shape) for shape in found)
+    return shapes
+
+
+def _edited_shape(old, new, no_z: bool):
+    """`old` (a loaded shape) with the geometry, colors and comment of `new`.
+
+    `new` is made from a layer (see `_layer_shape`).  When it is of another
+    class, `new` is returned instead, with the other fields of `old`.  Colors
+    napari shows the same (it drops the alpha) are left as they are.
+    """
+    if type(old) is type(new):
+        shape = old
+        for name in GEOMETRY_FIELDS[type(new).__name__]:
+            setattr(shape, name, getattr(new, name))
+    else:
+        shape = new
+        for name in STYLE_FIELDS:
+            setattr(shape, name, getattr(old, name))
+    shape.theZ = old.theZ if no_z else new.theZ
+    shape.theT = new.theT
+    for name in ("strokeColor", "fillColor"):
+        setattr(shape, name, _edited_color(getattr(old, name), getattr(new, name)))
+    if (_val(old.textValue) or "") != (_val(new.textValue) or ""):
+        shape.textValue = new.textValue
+    else:
+        shape.textValue = old.textValue
+    return shape
+
+
+def _val(rtype):
+    return None if rtype is None else rtype.val
+
+
+def _edited_color(old, new):
+    """`old` if it looks like `new` in napari, else `new` with the alpha of `old`."""
+    old_val, new_val = _val(old), _val(new)
+
+    def rgb(val):
+        return 0xFFFFFF if val is None else (val & 0xFFFFFFFF) >> 8
+
+    if rgb(old_val) == rgb(new_val):
+        return old
+    if old_val is None or new_val is None:
+        return new
+    val = (new_val & 0xFFFFFF00) | (old_val & 0xFF)
+    return rint(val - (1 << 32) if val >= 1 << 31 else val)
+
+
+def _set_saved_ids(saved: list, created_rows: list, image_id: int) -> None:
+    """Write the IDs of saved ROIs or shapes to the features of their rows.
+
+    The saved shapes are also remembered (see `remember_shapes`) as they
+    are now, without the other changes to their layers.
+    """
+    by_layer: dict = {}
+    for obj, (layer, rows) in zip(saved, created_rows):
+        if isinstance(obj, RoiI):
+            shape_id, roi_id = obj.copyShapes()[0].id.val, obj.id.val
+        else:
+            shape_id, roi_id = obj.id.val, obj.roi.id.val
+        by_layer.setdefault(id(layer), (layer, []))[1].append((rows, shape_id, roi_id))
+    for layer, saved_rows in by_layer.values():
+        ids, roi_ids = shape_ids(layer), shape_ids(layer, "roi_id")
+        for rows, shape_id, roi_id in saved_rows:
+            ids[rows], roi_ids[rows] = shape_id, roi_id
+        features = layer.features.copy()
+        features["shape_id"], features["roi_id"] = ids, roi_ids
+        layer.features = features
+        synced = layer.metadata.setdefault(
+            "omero_rois", {"image_id": image_id, "shapes": {}}
+        )
+        hashes = row_hashes(layer)
+        for rows, shape_id, _ in saved_rows:
+            synced["shapes"][shape_id] = tuple(hashes[row] for row in rows)
 
 
 def get_x(coordinate):
@@ -202,22 +618,29 @@ def get_y(coordinate):
 
 
 def get_t(coordinate):
-    return coordinate[0]
+    # None for (z, y, x) and (y, x) layers, whose shapes are on all timepoints
+    return coordinate[-4] if len(coordinate) >= 4 else None
 
 
 def get_z(coordinate):
-    return coordinate[1]
+    return coordinate[-3] if len(coordinate) >= 3 else None
 
 
 def create_omero_point(data):
     point = PointI()
     point.x = rdouble(get_x(data))
     point.y = rdouble(get_y(data))
-    point.theZ = rint(get_z(data))
-    point.theT = rint(get_t(data))
+    _set_plane(point, get_z(data), get_t(data))
     return point
 
 
+def _set_plane(shape, z_index, t_index) -> None:
+    if z_index is not None:
+        shape.theZ = rint(z_index)
+    if t_index is not None:
+        shape.theT = rint(t_index)
+
+
 def create_omero_shape(shape_type, data):
     # "line", "path", "polygon", "rectangle", "ellipse"
     # NB: assume all points on same plane.
@@ -273,8 +696,7 @@ def create_omero_shape(shape_type, data):
                 print("Rotated Ellipse not yet supported!")
 
     if shape is not None:
-        shape.theZ = rint(z_index)
-        shape.theT = rint(t_index)
+        _set_plane(shape, z_index, t_index)
     return shape
 
 
@@ -284,7 +706,8 @@ def create_roi(conn, img_id, shapes):
     roi.setImage(ImageI(img_id, False))
     for shape in shapes:
         roi.addShape(shape)
-    return updateService.saveAndReturnObject(roi, conn.SERVICE_OPTS)
+    with track("save"):
+        return updateService.saveAndReturnObject(roi, conn.SERVICE_OPTS)
 
 
 class NonCachedPixelsWrapper(PixelsWrapper):
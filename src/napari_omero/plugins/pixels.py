@@ -0,0 +1,643 @@
+import os
+import threading
+import time
+import weakref
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import accumulate, product
+from typing import TYPE_CHECKING, Callable, NamedTuple, Optional, Union
+from uuid import uuid4
+
+import dask.array as da
+import numpy as np
+
+from napari_omero.metrics import track
+from napari_omero.utils import PIXEL_TYPES, server_id, timer
+from omero.gateway import BlitzGateway, ImageWrapper
+
+from .cache import RegionKey, get_chunk_cache, get_disk_cache
+from .stores import get_store_pool, read_connection
+
+if TYPE_CHECKING:
+    from .metadata import ImageInfo
+
+# (start, stop) for each of the T, C, Z, Y, X axes
+Location = Sequence[tuple[int, int]]
+
+# size of the blocks read by `PixelsReader.prefetch_stack`
+HYPERCUBE_BYTES = 64 * 2**20
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="omero")
+
+# number of concurrent transfers of `PixelsReader.read_parallel`
+DEFAULT_WORKERS = 8
+
+# chunking of non-pyramidal images, e.g. "auto", "plane", "zblock:8", "tiles:512"
+CHUNKS_ENV = "NAPARI_OMERO_CHUNKS"
+DEFAULT_TILE_SIZE = 1024
+# planes larger than this are read as tiles by the "auto" policy
+MAX_PLANE_BYTES = 64 * 2**20
+# throughput assumed by the "auto" policy to weigh latency against transfer time
+ASSUMED_BANDWIDTH = 50 * 2**20
+# minimum size (in pixels, along Y or X) of the preview level of large
+# non-pyramidal images; 0 disables the preview level
+PREVIEW_SIZE_ENV = "NAPARI_OMERO_PREVIEW_SIZE"
+DEFAULT_PREVIEW_SIZE = 2048
+# servers build pyramids for planes larger than omero.pixeldata.max_plane_width
+# and max_plane_height (3192 by default); planes up to this size (in pixels,
+# along Y and X) are assumed flat without asking, 0 always asks the server
+NO_PYRAMID_SIZE_ENV = "NAPARI_OMERO_NO_PYRAMID_SIZE"
+DEFAULT_NO_PYRAMID_SIZE = 2048
+
+
+class ChunkPolicy(NamedTuple):
+    """How a non-pyramidal image is split into chunks.
+
+    `kind` is one of:
+
+    - "plane": one chunk per plane.
+    - "zblock": `size` Z-sections per chunk.
+    - "channels": all channels of one (z, t) per chunk.
+    - "tiles": XY tiles of `size` x `size` pixels, read with ``getTile``.
+    - "auto": one of the above, see `auto_chunk_policy`.
+    """
+
+    kind: str = "auto"
+    size: int = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "ChunkPolicy":
+        """Parse e.g. "zblock:8" or "tiles".
+
+        Sizes must be positive integers; "zblock" without a size is the
+        whole Z-stack.
+        """
+        kind, _, size = spec.strip().lower().partition(":")
+        if kind not in ("auto", "plane", "zblock", "channels", "tiles"):
+            raise ValueError(f"Unknown chunk policy: {spec!r}")
+        if kind == "tiles" and not size:
+            size = str(DEFAULT_TILE_SIZE)
+        if size and not size.isdecimal():
+            raise ValueError(f"Invalid chunk policy: {spec!r}")
+        if kind in ("zblock", "tiles") and size and int(size) < 1:
+            raise ValueError(f"Invalid chunk policy: {spec!r}")
+        return cls(kind, int(size or 0))
+
+
+PolicyLike = Union[ChunkPolicy, str, None]
+
+_LATENCIES: "weakref.WeakKeyDictionary[BlitzGateway, float]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def measure_latency(conn: BlitzGateway) -> float:
+    """Round trip time to the server of `conn`, in seconds (measured once)."""
+    if conn not in _LATENCIES:
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            conn.keepAlive()
+            timings.append(time.perf_counter() - start)
+        _LATENCIES[conn] = min(timings)
+    return _LATENCIES[conn]
+
+
+def auto_chunk_policy(
+    plane_nbytes: int, size_c: int, size_z: int, latency: float
+) -> ChunkPolicy:
+    """Pick a chunk policy from the plane size, stack depth and latency.
+
+    Huge planes are split in tiles so that rendering can start before the
+    whole plane has arrived.  Small planes on high-latency links are grouped
+    until transferring a chunk takes a few round trips, so that latency does
+    not dominate.
+    """
+    if plane_nbytes > MAX_PLANE_BYTES:
+        return ChunkPolicy("tiles", DEFAULT_TILE_SIZE)
+    target = min(4 * latency * ASSUMED_BANDWIDTH, HYPERCUBE_BYTES)
+    n_planes = int(target // plane_nbytes)
+    if n_planes >= 2 and size_z > 1:
+        return ChunkPolicy("zblock", min(n_planes, size_z))
+    if n_planes >= size_c > 1:
+        return ChunkPolicy("channels")
+    return ChunkPolicy("plane")
+
+
+def _split(size: int, step: int) -> tuple[int, ...]:
+    """Split `size` into chunks of `step`, with a smaller trailing chunk."""
+    full, rest = divmod(size, step)
+    return (step,) * full + ((rest,) if rest else ())
+
+
+def _bin2(data: np.ndarray) -> np.ndarray:
+    """Downsample the last two axes of `data` by 2, averaging 2 x 2 blocks.
+
+    Odd sizes are padded by repeating the last row/column.
+    """
+    *tcz, h, w = data.shape
+    pad = [(0, 0)] * len(tcz) + [(0, h % 2), (0, w % 2)]
+    data = np.pad(data, pad, mode="edge")
+    binned = data.reshape(*tcz, -(-h // 2), 2, -(-w // 2), 2).mean(axis=(-3, -1))
+    if np.issubdtype(data.dtype, np.integer):
+        binned = np.rint(binned)
+    return binned.astype(data.dtype)
+
+
+def lazy_array(
+    read: Callable[[Location], np.ndarray],
+    chunks: tuple[tuple[int, ...], ...],
+    dtype: np.dtype,
+    name: str = "omero-pixels",
+) -> da.Array:
+    """Dask array whose chunks are loaded by `read(location)`.
+
+    This uses ``block_id`` rather than ``block_info``: dask computes the latter
+    eagerly for every block, which makes building the graph O(n_chunks).
+    """
+    offsets = [list(accumulate(c, initial=0)) for c in chunks]
+
+    def _read_block(block_id=None):
+        return read([(off[i], off[i + 1]) for off, i in zip(offsets, block_id)])
+
+    return da.map_blocks(
+        _read_block,
+        chunks=chunks,
+        dtype=dtype,
+        meta=np.empty((0,) * len(chunks), dtype=dtype),
+        # an explicit name avoids tokenizing the (unpicklable) closure
+        name=f"{name}-{uuid4().hex}",
+    )
+
+
+def pyramid_layout(
+    image: ImageWrapper, no_pyramid_size: Optional[int] = None
+) -> tuple[list[tuple[int, int]], Optional[tuple[int, int]]]:
+    """(size_y, size_x) of each resolution level, and the tile size if pyramidal.
+
+    Only pyramidal images have more than one level on the server.  Asking
+    the server costs a round trip per image, so planes of up to
+    `no_pyramid_size` pixels along Y and X (default:
+    ``NAPARI_OMERO_NO_PYRAMID_SIZE``, 2048) are assumed flat.  Servers whose
+    ``omero.pixeldata.max_plane_width`` or ``max_plane_height`` is below that
+    need a lower value; 0 always asks the server.
+    """
+    if no_pyramid_size is None:
+        no_pyramid_size = int(os.getenv(NO_PYRAMID_SIZE_ENV, DEFAULT_NO_PYRAMID_SIZE))
+    size_y, size_x = image.getSizeY(), image.getSizeX()
+    if max(size_y, size_x) <= no_pyramid_size or not image.requiresPixelsPyramid():
+        return [(size_y, size_x)], None
+    image._prepareRenderingEngine()
+    tile_size = tuple(image._re.getTileSize())
+    levels = [
+        (desc.sizeY, desc.sizeX) for desc in image._re.getResolutionDescriptions()
+    ]
+    return levels, tile_size
+
+
+class PixelsReader:
+    """Read TCZYX regions of a single OMERO image into numpy arrays.
+
+    Parameters
+    ----------
+    conn : BlitzGateway
+        Connection used to create the RawPixelsStores.
+    image_id : int
+        ID of the image.
+    pixels_id : int
+        ID of the primary pixels of the image.
+    dtype : np.dtype
+        Native dtype of the pixel data.
+    size_tcz : tuple[int, int, int]
+        Number of timepoints, channels and Z-sections.
+    levels : list[tuple[int, int]]
+        (size_y, size_x) of each resolution level, full resolution first.
+        See `add_synthetic_levels` for the levels of non-pyramidal images.
+    tile_size : tuple[int, int], optional
+        (width, height) of the server-side tiles, for pyramidal images.
+    """
+
+    def __init__(
+        self,
+        conn: BlitzGateway,
+        image_id: int,
+        pixels_id: int,
+        dtype: np.dtype,
+        size_tcz: tuple[int, int, int],
+        levels: list[tuple[int, int]],
+        tile_size: Optional[tuple[int, int]] = None,
+    ):
+        self.conn = conn
+        self.image_id = image_id
+        self.pixels_id = pixels_id
+        self.dtype = np.dtype(dtype)
+        self.size_tcz = size_tcz
+        self.levels = list(levels)
+        self.tile_size = tile_size
+        # downsampling factor of each level of non-pyramidal images
+        self.factors = [1]
+        self.server = server_id(conn)
+        self.policy = ChunkPolicy("plane")
+        # regions being fetched by a prefetch, and the event set once they are
+        self._inflight: dict[RegionKey, threading.Event] = {}
+        self._inflight_lock = threading.Lock()
+        # OMERO sends pixel data in network (big-endian) byte order
+        self._wire_dtype = self.dtype.newbyteorder(">")
+
+    @classmethod
+    def from_image(cls, image: ImageWrapper) -> "PixelsReader":
+        pixels = image.getPrimaryPixels()
+        dtype = PIXEL_TYPES.get(pixels.getPixelsType().value, None)
+        size_tcz = (image.getSizeT(), image.getSizeC(), image.getSizeZ())
+        levels, tile_size = pyramid_layout(image)
+        return cls(
+            image._conn,
+            image.getId(),
+            image.getPixelsId(),
+            dtype,
+            size_tcz,
+            levels,
+            tile_size,
+        )
+
+    @classmethod
+    def from_info(cls, conn: BlitzGateway, info: "ImageInfo") -> "PixelsReader":
+        """Create a reader from (possibly cached) image metadata."""
+        return cls(
+            conn,
+            info.image_id,
+            info.pixels_id,
+            PIXEL_TYPES[info.pixels_type],
+            info.size_tcz,
+            info.levels,
+            info.tile_size,
+        )
+
+    @property
+    def is_pyramid(self) -> bool:
+        return self.tile_size is not None
+
+    def shape(self, level: int = 0) -> tuple[int, ...]:
+        return (*self.size_tcz, *self.levels[level])
+
+    def add_synthetic_levels(
+        self, min_size: Optional[int] = None, factors: Optional[list[int]] = None
+    ) -> bool:
+        """Add downsampled levels to a large non-pyramidal image.
+
+        The server only builds pyramids for very large planes, so e.g. an
+        8k x 8k plane would be downloaded in full for every zoomed-out view.
+        Instead, this adds levels downsampled by 2, 4, 8, ... down to at least
+        `min_size` pixels (default: ``NAPARI_OMERO_PREVIEW_SIZE``) along the
+        longest side, so that the coarsest level still covers the canvas.
+
+        The coarsest level is a preview read with a strided ``getHypercube``:
+        the server only sends every n-th pixel along Y and X, so napari can
+        show the whole image from a few small transfers.  Intermediate levels
+        are computed from the level above (2 x 2 binning) and cached like
+        fetched data, so each of them is computed once.  Returns whether any
+        level was added.  Alternatively, the downsampling `factors` of the
+        added levels can be given, e.g. to share levels between images.
+        """
+        if self.is_pyramid or len(self.levels) > 1:
+            return False
+        size_y, size_x = self.levels[0]
+        if factors is None:
+            if min_size is None:
+                min_size = int(os.getenv(PREVIEW_SIZE_ENV, DEFAULT_PREVIEW_SIZE))
+            factors, factor = [], 2
+            while min_size > 0 and max(size_y, size_x) // factor >= min_size:
+                factors.append(factor)
+                factor *= 2
+        for factor in factors:
+            self.factors.append(factor)
+            self.levels.append((-(-size_y // factor), -(-size_x // factor)))
+        return len(self.levels) > 1
+
+    def raw_pixels_store(self, level: int = 0):
+        """Borrow a RawPixelsStore set up for this image and resolution `level`."""
+        # the store numbers levels from the smallest one up
+        store_level = len(self.levels) - level - 1 if self.is_pyramid else None
+        conn = read_connection(self.conn)
+        return get_store_pool(conn).store(self.pixels_id, store_level)
+
+    @timer
+    def read(
+        self,
+        level: int,
+        loc: Location,
+        out: Optional[np.ndarray] = None,
+        memory_cache: bool = True,
+    ) -> np.ndarray:
+        """Read the region `loc` of resolution `level`.
+
+        Planes and tiles are looked up in the in-memory chunk cache, then in
+        the disk cache (if enabled), and only fetched from the server if
+        neither has them.  The region is written to `out` if given.  With
+        `memory_cache=False`, fetched regions are not added to the in-memory
+        cache (e.g. when the caller keeps the whole image in memory anyway).
+        """
+        (t0, t1), (c0, c1), (z0, z1), (y0, y1), (x0, x1) = loc
+        h, w = y1 - y0, x1 - x0
+        if out is None:
+            out = np.empty((t1 - t0, c1 - c0, z1 - z0, h, w), self.dtype)
+        missing = []
+        for t, c, z in product(range(t0, t1), range(c0, c1), range(z0, z1)):
+            key = (level, z, c, t, x0, y0, w, h)
+            cached = self._cached(key, memory_cache)
+            if cached is None and (transfer := self._inflight.get(key)) is not None:
+                # being fetched by `prefetch_stack`: wait rather than refetch
+                transfer.wait()
+                cached = self._cached(key, memory_cache)
+            if cached is None:
+                missing.append((t, c, z))
+            else:
+                out[t - t0, c - c0, z - z0] = cached
+        if not missing:
+            return out
+
+        block = None
+        if not self.is_pyramid and 0 < level < len(self.levels) - 1:
+            # a synthetic level: bin the corresponding region of the level above
+            parent = [*loc[:3], *((2 * a, 2 * b) for a, b in loc[3:])]
+            block = _bin2(self._read_chunks(level - 1, parent, memory_cache))
+            block = block[..., :h, :w]
+        elif not self.is_pyramid and (level or len(missing) > 1):
+            # the preview level, or a multi-plane chunk: read it in one transfer
+            with self.raw_pixels_store(level) as store:
+                block = self._read_hypercube(store, level, loc)
+        if block is not None:
+            for t, c, z in missing:
+                plane = out[t - t0, c - c0, z - z0]
+                plane[:] = block[t - t0, c - c0, z - z0]
+                self._cache((level, z, c, t, x0, y0, w, h), plane, memory_cache)
+            return out
+
+        full_plane = (h, w) == self.levels[level] and not self.is_pyramid
+        with self.raw_pixels_store(level) as store:
+            for t, c, z in missing:
+                with track("plane" if full_plane else "tile") as call:
+                    if full_plane:
+                        buf = store.getPlane(z, c, t)
+                    else:
+                        buf = store.getTile(z, c, t, x0, y0, w, h)
+                    call.add_bytes(len(buf))
+                plane = out[t - t0, c - c0, z - z0]
+                plane[:] = self._decode(buf, (h, w))
+                self._cache((level, z, c, t, x0, y0, w, h), plane, memory_cache)
+        return out
+
+    def _read_hypercube(self, store, level: int, loc: Location) -> np.ndarray:
+        """Read `loc` of a non-pyramidal `level` with one ``getHypercube``."""
+        (t0, t1), (c0, c1), (z0, z1), (y0, y1), (x0, x1) = loc
+        size_y, size_x = self.levels[0]
+        # the server subsamples by `step`, e.g. for the preview level
+        step = self.factors[level]
+        offset = [x0 * step, y0 * step, z0, c0, t0]  # XYZCT order
+        size = [
+            min(x1 * step, size_x) - x0 * step,
+            min(y1 * step, size_y) - y0 * step,
+            z1 - z0,
+            c1 - c0,
+            t1 - t0,
+        ]
+        with track("hypercube") as call:
+            buf = store.getHypercube(offset, size, [step, step, 1, 1, 1])
+            call.add_bytes(len(buf))
+        return self._decode(buf, [stop - start for start, stop in loc])
+
+    def _chunk_locations(self, level: int, loc: Location) -> list[Location]:
+        """Locations of the chunks of `level` that overlap `loc`."""
+        spans = []
+        for axis_chunks, (start, stop) in zip(self.chunks(level, self.policy), loc):
+            offsets = list(accumulate(axis_chunks, initial=0))
+            spans.append(
+                [(a, b) for a, b in zip(offsets, offsets[1:]) if a < stop and b > start]
+            )
+        return list(product(*spans))
+
+    def _read_chunks(
+        self, level: int, loc: Location, memory_cache: bool = True
+    ) -> np.ndarray:
+        """Read `loc` of `level` as whole chunks, so that reads hit the cache.
+
+        `loc` is clipped to the shape of `level`.
+        """
+        loc = [
+            (start, min(stop, n)) for (start, stop), n in zip(loc, self.shape(level))
+        ]
+        out = np.empty([stop - start for start, stop in loc], self.dtype)
+        for chunk in self._chunk_locations(level, loc):
+            data = self.read(level, chunk, memory_cache=memory_cache)
+            inter = [(max(a, s), min(b, e)) for (a, b), (s, e) in zip(chunk, loc)]
+            src = tuple(slice(a - c, b - c) for (a, b), (c, _) in zip(inter, chunk))
+            dest = tuple(slice(a - o, b - o) for (a, b), (o, _) in zip(inter, loc))
+            out[dest] = data[src]
+        return out
+
+    def read_parallel(
+        self,
+        level: int = 0,
+        loc: Optional[Location] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        max_workers: int = DEFAULT_WORKERS,
+    ) -> np.ndarray:
+        """Read the region `loc` (default: all) of `level` in parallel transfers.
+
+        The region is split in blocks of up to ``HYPERCUBE_BYTES`` (whole
+        Z-blocks, or tiles for huge planes) which are read concurrently into
+        one preallocated array.  `progress` is called with the number of
+        blocks done and the total after each block.
+        """
+        if loc is None:
+            loc = [(0, n) for n in self.shape(level)]
+        *_, (y0, y1), (x0, x1) = loc
+        out = np.empty([stop - start for start, stop in loc], self.dtype)
+        plane_nbytes = (y1 - y0) * (x1 - x0) * self.dtype.itemsize
+        if self.is_pyramid or plane_nbytes > HYPERCUBE_BYTES:
+            tile_w, tile_h = self.tile_size or (DEFAULT_TILE_SIZE,) * 2
+            z_step, y_step, x_step = 1, tile_h, tile_w
+        else:
+            z_step = max(1, HYPERCUBE_BYTES // plane_nbytes)
+            y_step, x_step = y1 - y0, x1 - x0
+        steps = (1, 1, z_step, y_step, x_step)
+        ranges = [
+            [(i, min(i + step, stop)) for i in range(start, stop, step)]
+            for (start, stop), step in zip(loc, steps)
+        ]
+        blocks = list(product(*ranges))
+
+        def _read_block(block: Location) -> None:
+            dest = out[tuple(slice(a - o, b - o) for (a, b), (o, _) in zip(block, loc))]
+            self.read(level, block, out=dest, memory_cache=False)
+
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="omero") as pool:
+            for n, _ in enumerate(pool.map(_read_block, blocks), start=1):
+                if progress is not None:
+                    progress(n, len(blocks))
+        return out
+
+    def _cached(
+        self, key: RegionKey, memory_cache: bool = True
+    ) -> Optional[np.ndarray]:
+        data = get_chunk_cache().get(self.server, self.image_id, key)
+        if data is None and (disk_cache := get_disk_cache()) is not None:
+            data = disk_cache.get(self.server, self.pixels_id, key)
+            if data is not None and memory_cache:
+                get_chunk_cache().put(self.server, self.image_id, key, data)
+        return data
+
+    def _cache(self, key: RegionKey, data: np.ndarray, memory_cache: bool = True):
+        if memory_cache:
+            get_chunk_cache().put(self.server, self.image_id, key, data)
+        if (disk_cache := get_disk_cache()) is not None:
+            disk_cache.put(self.server, self.pixels_id, key, data)
+
+    def _decode(self, buf: bytes, shape: tuple[int, ...]) -> np.ndarray:
+        return np.frombuffer(buf, dtype=self._wire_dtype).reshape(shape)
+
+    def prefetch_stack(self, t: int, level: int = 0) -> Optional[Future]:
+        """Start fetching all Z-sections of timepoint `t` in a few transfers.
+
+        Volume rendering asks for every plane of the stack at once, which
+        would otherwise mean one ``getPlane`` per plane.  Instead, blocks of
+        up to ``HYPERCUBE_BYTES`` are read with ``getHypercube`` and put in
+        the chunk cache.  Planes are marked as in flight before this returns,
+        so reads issued meanwhile wait for the transfer instead of fetching
+        them again.  `level` is the level being rendered: level 0 or the
+        preview level of non-pyramidal images (intermediate levels are binned
+        from the level above, see `add_synthetic_levels`).  Returns None if
+        there is nothing to fetch.
+        """
+        if self.is_pyramid or self.policy.kind == "tiles":
+            return None
+        if 0 < level < len(self.levels) - 1:
+            return None
+        _, n_c, n_z = self.size_tcz
+        size_y, size_x = self.levels[level]
+        plane_nbytes = size_y * size_x * self.dtype.itemsize
+        if plane_nbytes * n_c * n_z > get_chunk_cache().max_bytes // 2:
+            return None  # the stack would just evict itself from the cache
+
+        keys = {
+            (c, z): (level, z, c, t, 0, 0, size_x, size_y)
+            for c, z in product(range(n_c), range(n_z))
+        }
+        todo = {cz for cz, key in keys.items() if self._cached(key) is None}
+        with self._inflight_lock:
+            todo = {cz for cz in todo if keys[cz] not in self._inflight}
+            transfers = {cz: threading.Event() for cz in todo}
+            for cz, transfer in transfers.items():
+                self._inflight[keys[cz]] = transfer
+        if not transfers:
+            return None
+
+        def _fetch() -> None:
+            n_block = max(1, HYPERCUBE_BYTES // plane_nbytes)
+            try:
+                with self.raw_pixels_store(level) as store:
+                    for c in range(n_c):
+                        zs = [z for z in range(n_z) if (c, z) in transfers]
+                        while zs:
+                            z0, z1 = zs[0], min(zs[0] + n_block, zs[-1] + 1)
+                            loc = [(t, t + 1), (c, c + 1), (z0, z1)]
+                            loc += [(0, size_y), (0, size_x)]
+                            stack = self._read_hypercube(store, level, loc)[0, 0]
+                            for z in range(z0, z1):
+                                if (c, z) in transfers:
+                                    self._cache(keys[(c, z)], stack[z - z0])
+                                    self._end_transfer(keys[(c, z)])
+                            zs = [z for z in zs if z >= z1]
+            finally:
+                for cz in transfers:
+                    self._end_transfer(keys[cz])
+
+        return _PREFETCH_EXECUTOR.submit(_fetch)
+
+    def prefetch_plane(self, z: int, t: int) -> list[Future]:
+        """Start fetching all channels of plane (`z`, `t`) at full resolution.
+
+        Called when an image is first shown from its preview level, so that
+        the full resolution data is in the chunk cache by the time the user
+        zooms in.  The level 0 chunks holding the plane are read whole, so
+        that the reads napari makes later are cache hits.
+        """
+        _, size_c, _, size_y, size_x = self.shape(0)
+        z_chunk = max(self.chunks(0, self.policy)[2])
+        plane_nbytes = size_y * size_x * self.dtype.itemsize
+        if plane_nbytes * size_c * z_chunk > get_chunk_cache().max_bytes // 2:
+            return []
+        loc = [(t, t + 1), (0, size_c), (z, z + 1), (0, size_y), (0, size_x)]
+        return [
+            _PREFETCH_EXECUTOR.submit(self.read, 0, chunk)
+            for chunk in self._chunk_locations(0, loc)
+        ]
+
+    def _end_transfer(self, key: RegionKey) -> None:
+        with self._inflight_lock:
+            transfer = self._inflight.pop(key, None)
+        if transfer is not None:
+            transfer.set()
+
+    def resolve_policy(self, policy: PolicyLike = None) -> ChunkPolicy:
+        """Resolve `policy` (default: ``NAPARI_OMERO_CHUNKS``) to a concrete one."""
+        if policy is None:
+            policy = os.getenv(CHUNKS_ENV, "auto")
+        if isinstance(policy, str):
+            policy = ChunkPolicy.parse(policy)
+        if policy.kind == "zblock" and not policy.size:
+            policy = policy._replace(size=self.size_tcz[2])
+        if policy.kind == "auto":
+            size_y, size_x = self.levels[0]
+            _, size_c, size_z = self.size_tcz
+            plane_nbytes = size_y * size_x * self.dtype.itemsize
+            latency = measure_latency(self.conn)
+            policy = auto_chunk_policy(plane_nbytes, size_c, size_z, latency)
+        return policy
+
+    def chunks(
+        self, level: int = 0, policy: PolicyLike = None
+    ) -> tuple[tuple[int, ...], ...]:
+        """Chunking of `level`.
+
+        Pyramidal images are chunked by server tile.  Other images are chunked
+        according to `policy`, see `ChunkPolicy`.
+        """
+        size_y, size_x = self.levels[level]
+        size_t, size_c, size_z = self.size_tcz
+        tcz = [(1,) * size_t, (1,) * size_c, (1,) * size_z]
+        yx = ((size_y,), (size_x,))
+        if self.is_pyramid:
+            tile_w, tile_h = self.tile_size  # type: ignore [misc]
+            return (*tcz, _split(size_y, tile_h), _split(size_x, tile_w))
+
+        policy = self.resolve_policy(policy)
+        if policy.kind == "zblock":
+            tcz[2] = _split(size_z, policy.size)
+        elif policy.kind == "channels":
+            tcz[1] = (size_c,)
+        elif policy.kind == "tiles":
+            yx = (_split(size_y, policy.size), _split(size_x, policy.size))
+        return (*tcz, *yx)
+
+    def lazy_level(self, level: int = 0, chunks: PolicyLike = None) -> da.Array:
+        """Dask array for `level` whose task graph does not grow with its size.
+
+        All chunks come from a single blockwise layer, so building the array
+        costs the same for a small stack and for a whole-slide image.
+        `chunks` is the chunk policy for non-pyramidal images; it becomes the
+        policy of the reader, which reads and prefetches align to.
+        """
+        if not self.is_pyramid:
+            self.policy = self.resolve_policy(chunks)
+        return lazy_array(
+            partial(self.read, level), self.chunks(level, self.policy), self.dtype
+        )
+
+    def lazy_pyramid(self, chunks: PolicyLike = None) -> list[da.Array]:
+        # resolved once, e.g. "auto" measures the latency of the server
+        if not self.is_pyramid:
+            self.policy = self.resolve_policy(chunks)
+        return [
+            self.lazy_level(level, self.policy) for level in range(len(self.levels))
+        ]
@@ -0,0 +1,256 @@
+import os
+import threading
+from functools import partial
+from typing import NamedTuple, Optional
+
+import dask.array as da
+import numpy as np
+
+from napari_omero.metrics import track
+from napari_omero.utils import PIXEL_TYPES
+from omero.gateway import BlitzGateway, ImageWrapper
+from omero.model import IObject
+from omero.sys import ParametersI
+
+from .pixels import (
+    DEFAULT_PREVIEW_SIZE,
+    PREVIEW_SIZE_ENV,
+    Location,
+    PixelsReader,
+    lazy_array,
+    pyramid_layout,
+)
+
+# all wells of a plate, with their fields and the pixels of their images
+WELLS_QUERY = """
+    select w from Well w
+    join fetch w.plate
+    left outer join fetch w.wellSamples ws
+    left outer join fetch ws.image i
+    left outer join fetch i.pixels p
+    left outer join fetch p.pixelsType
+    where w.plate.id = :id
+"""
+
+
+class FieldImage(NamedTuple):
+    """The image of one field of a well, as far as the mosaic needs it."""
+
+    image_id: int
+    pixels_id: int
+    pixels_type: str
+    size_tcz: tuple[int, int, int]
+    size_yx: tuple[int, int]
+    # the loaded image, to look up its pyramid if it has one
+    image: Optional[IObject] = None
+
+
+class PlateReader:
+    """Read regions of the well-grid mosaic of an OMERO plate.
+
+    The mosaic is a (field, t, c, z, y, x) array in which each well is a tile
+    of `tile_size` pixels, at its row and column in the plate.  Chunks are
+    whole tiles, and the `PixelsReader` of a field is only created when one
+    of its chunks is read, so nothing but the plate layout is loaded up
+    front: napari only fetches the wells in view.
+
+    The coarser levels are the synthetic levels of the field images (see
+    `PixelsReader.add_synthetic_levels`), down to a plate overview of about
+    ``NAPARI_OMERO_PREVIEW_SIZE`` pixels made of one subsampled transfer per
+    well.  Empty wells and missing fields are black.  Fields of different
+    pixel types are promoted to a common one, and fields with fewer planes
+    than others are padded.  Channel metadata is taken from the image
+    `metadata_image_id`, a field with the most channels.
+
+    Parameters
+    ----------
+    conn : BlitzGateway
+        Connection used to read the pixels.
+    plate : IObject
+        The plate.
+    fields : dict[tuple[int, int, int], FieldImage]
+        Images by (field, row, column).
+    """
+
+    def __init__(
+        self,
+        conn: BlitzGateway,
+        plate: IObject,
+        fields: dict[tuple[int, int, int], FieldImage],
+    ):
+        if not fields:
+            raise NameError(f"Plate {plate.id.val} has no images")
+        self.conn = conn
+        self.plate = plate
+        self.plate_id = plate.id.val
+        self.fields = fields
+        # channel names and display settings come from the first field with
+        # all channels, so that none of the mosaic's channels lacks them
+        size_c = max(f.size_tcz[1] for f in fields.values())
+        self.metadata_image_id = next(
+            fields[key].image_id
+            for key in sorted(fields)
+            if fields[key].size_tcz[1] == size_c
+        )
+        pixels_types = {f.pixels_type for f in fields.values()}
+        self.dtype = np.result_type(*(PIXEL_TYPES[t] for t in pixels_types))
+        self.size_tcz = tuple(
+            max(f.size_tcz[i] for f in fields.values()) for i in range(3)
+        )
+        self.grid = tuple(max(key[i] for key in fields) + 1 for i in range(3))
+        self.tile_size = tuple(
+            max(f.size_yx[i] for f in fields.values()) for i in (0, 1)
+        )
+        self.factors = self._factors()
+        self._readers: dict[tuple[int, int, int], PixelsReader] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_plate(cls, conn: BlitzGateway, plate_id: int) -> "PlateReader":
+        """Load the layout of plate `plate_id` in one query."""
+        params = ParametersI()
+        params.addId(plate_id)
+        with track("metadata"):
+            wells = conn.getQueryService().findAllByQuery(
+                WELLS_QUERY, params, {"omero.group": "-1"}
+            )
+        if not wells:
+            raise NameError(f"No such Plate: {plate_id}")
+        fields = {}
+        for well in wells:
+            row, column = well.getRow().val, well.getColumn().val
+            # the server does not keep the order of the samples of a well
+            samples = sorted(well.copyWellSamples(), key=lambda ws: ws.id.val)
+            for field, sample in enumerate(samples):
+                image = sample.getImage()
+                if image is None:
+                    continue
+                pixels = image.getPrimaryPixels()
+                fields[(field, row, column)] = FieldImage(
+                    image_id=image.id.val,
+                    pixels_id=pixels.id.val,
+                    pixels_type=pixels.getPixelsType().getValue().getValue(),
+                    size_tcz=(
+                        pixels.getSizeT().val,
+                        pixels.getSizeC().val,
+                        pixels.getSizeZ().val,
+                    ),
+                    size_yx=(pixels.getSizeY().val, pixels.getSizeX().val),
+                    image=image,
+                )
+        return cls(conn, wells[0].getPlate(), fields)
+
+    def _factors(self) -> list[int]:
+        """Downsampling factors of the levels, coarsest about the preview size."""
+        min_size = int(os.getenv(PREVIEW_SIZE_ENV, DEFAULT_PREVIEW_SIZE))
+        _, rows, columns = self.grid
+        tile_h, tile_w = self.tile_size
+        longest = max(rows * tile_h, columns * tile_w)
+        factors = [1]
+        while (
+            min_size > 0
+            and longest // (factors[-1] * 2) >= min_size
+            and factors[-1] * 2 <= min(tile_h, tile_w)
+        ):
+            factors.append(factors[-1] * 2)
+        return factors
+
+    @property
+    def name(self) -> str:
+        name = self.plate.getName()
+        return name.val if name is not None else f"Plate:{self.plate_id}"
+
+    @property
+    def image_ids(self) -> list[int]:
+        return [f.image_id for f in self.fields.values()]
+
+    def tile_shape(self, level: int = 0) -> tuple[int, int]:
+        factor = self.factors[level]
+        return tuple(-(-size // factor) for size in self.tile_size)
+
+    def chunks(self, level: int = 0) -> tuple[tuple[int, ...], ...]:
+        """One chunk per plane of each field of each well."""
+        n_fields, rows, columns = self.grid
+        tile_h, tile_w = self.tile_shape(level)
+        tcz = tuple((1,) * size for size in self.size_tcz)
+        return ((1,) * n_fields, *tcz, (tile_h,) * rows, (tile_w,) * columns)
+
+    def reader(self, field: int, row: int, column: int) -> Optional[PixelsReader]:
+        """Reader of the image of a field, created on first use."""
+        key = (field, row, column)
+        image = self.fields.get(key)
+        if image is None:
+            return None
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is None:
+                levels, tile_size = [image.size_yx], None
+                if image.image is not None:
+                    wrapper = ImageWrapper(self.conn, image.image)
+                    levels, tile_size = pyramid_layout(wrapper)
+                reader = self._readers[key] = PixelsReader(
+                    self.conn,
+                    image.image_id,
+                    image.pixels_id,
+                    PIXEL_TYPES[image.pixels_type],
+                    image.size_tcz,
+                    levels,
+                    tile_size,
+                )
+                reader.add_synthetic_levels(factors=self.factors[1:])
+            return reader
+
+    def _field_level(self, reader: PixelsReader, level: int) -> tuple[int, int]:
+        """Level of a field to read mosaic `level` from, and the step to take.
+
+        Pyramidal fields are read from the coarsest server level that is not
+        coarser than `level`, subsampled by `step` if it is finer.
+        """
+        if not reader.is_pyramid:
+            return level, 1
+        factor = self.factors[level]
+        full_x = reader.levels[0][1]
+        best = (0, factor)
+        for i, (_, size_x) in enumerate(reader.levels):
+            level_factor = max(1, round(full_x / size_x))
+            if factor % level_factor == 0 and factor // level_factor < best[1]:
+                best = (i, factor // level_factor)
+        return best
+
+    def read(self, level: int, loc: Location) -> np.ndarray:
+        """Read one chunk (see `chunks`) of the mosaic at `level`."""
+        (field, _), *tcz, (y0, y1), (x0, x1) = loc
+        out = np.zeros([stop - start for start, stop in loc], self.dtype)
+        tile_h, tile_w = self.tile_shape(level)
+        reader = self.reader(field, y0 // tile_h, x0 // tile_w)
+        if reader is None:
+            return out
+        # fields smaller than the tile (or with fewer planes) are padded
+        field_level, step = self._field_level(reader, level)
+        size_y, size_x = (-(-n // step) for n in reader.levels[field_level])
+        region = [
+            *(
+                (start, min(stop, size))
+                for (start, stop), size in zip(tcz, reader.size_tcz)
+            ),
+            (0, min(size_y, y1 - y0)),
+            (0, min(size_x, x1 - x0)),
+        ]
+        if all(start < stop for start, stop in region):
+            yx = [
+                (0, min(stop * step, n))
+                for (_, stop), n in zip(region[3:], reader.levels[field_level])
+            ]
+            data = reader.read(field_level, [*region[:3], *yx])
+            data = data[..., ::step, ::step]
+            block = tuple(slice(0, n) for n in data.shape)
+            out[(0, *block)] = data
+        return out
+
+    def lazy_pyramid(self) -> list[da.Array]:
+        return [
+            lazy_array(
+                partial(self.read, level), self.chunks(level), self.dtype, "omero-plate"
+            )
+            for level in range(len(self.factors))
+        ]
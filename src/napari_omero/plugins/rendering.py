@@ -0,0 +1,154 @@
+from functools import partial
+from io import BytesIO
+from itertools import product
+from typing import TYPE_CHECKING, Optional
+
+import dask.array as da
+import numpy as np
+from PIL import Image
+
+from napari_omero.metrics import track
+from napari_omero.utils import server_id
+from omero.gateway import BlitzGateway
+from omero.romio import PlaneDef, RegionDef
+
+from .cache import get_chunk_cache
+from .pixels import DEFAULT_TILE_SIZE, MAX_PLANE_BYTES, Location, _split, lazy_array
+from .stores import get_rendering_pool, read_connection
+
+if TYPE_CHECKING:
+    from .metadata import ImageInfo
+
+# "1" to show images as rendered by the server (8-bit RGB) instead of raw pixels
+RENDER_ENV = "NAPARI_OMERO_RENDER"
+# JPEG quality of rendered planes, between 0 and 1
+DEFAULT_QUALITY = 0.9
+# chunk cache entries of rendered planes use this channel index
+RENDERED_C = -1
+
+
+class RenderedReader:
+    """Read planes of an OMERO image rendered by the server, as 8-bit RGB.
+
+    The rendering engine applies the current rendering settings of the image
+    (active channels, colors, windows) and sends JPEG compressed planes or
+    tiles, which are several times smaller than the raw pixels of all
+    channels.  This is meant for visual review over slow links; the data is
+    not suitable for quantitative work.
+
+    Regions are (t, z, y, x, rgb).  Decoded planes are kept in the chunk
+    cache, next to (and distinct from) raw planes of the same image.
+
+    Parameters
+    ----------
+    conn : BlitzGateway
+        Connection used to create the rendering engines.
+    image_id : int
+        ID of the image.
+    pixels_id : int
+        ID of the primary pixels of the image.
+    size_tz : tuple[int, int]
+        Number of timepoints and Z-sections.
+    levels : list[tuple[int, int]]
+        (size_y, size_x) of each resolution level, full resolution first.
+    tile_size : tuple[int, int], optional
+        (width, height) of the server-side tiles, for pyramidal images.
+    """
+
+    def __init__(
+        self,
+        conn: BlitzGateway,
+        image_id: int,
+        pixels_id: int,
+        size_tz: tuple[int, int],
+        levels: list[tuple[int, int]],
+        tile_size: Optional[tuple[int, int]] = None,
+    ):
+        self.conn = conn
+        self.image_id = image_id
+        self.pixels_id = pixels_id
+        self.size_tz = size_tz
+        self.levels = list(levels)
+        self.tile_size = tile_size
+        self.server = server_id(conn)
+
+    @classmethod
+    def from_info(cls, conn: BlitzGateway, info: "ImageInfo") -> "RenderedReader":
+        size_t, _, size_z = info.size_tcz
+        return cls(
+            conn,
+            info.image_id,
+            info.pixels_id,
+            (size_t, size_z),
+            info.levels,
+            info.tile_size,
+        )
+
+    @property
+    def is_pyramid(self) -> bool:
+        return self.tile_size is not None
+
+    def rendering_engine(self, level: int = 0):
+        """Borrow a rendering engine set up for this image and `level`."""
+        # as for stores, the engine numbers levels from the smallest one up
+        engine_level = len(self.levels) - level - 1 if self.is_pyramid else None
+        conn = read_connection(self.conn)
+        return get_rendering_pool(conn).store(self.pixels_id, engine_level)
+
+    def read(self, level: int, loc: Location) -> np.ndarray:
+        """Render the region `loc` of resolution `level`."""
+        (t0, t1), (z0, z1), (y0, y1), (x0, x1), _ = loc
+        h, w = y1 - y0, x1 - x0
+        out = np.empty((t1 - t0, z1 - z0, h, w, 3), np.uint8)
+        cache = get_chunk_cache()
+        missing = []
+        for t, z in product(range(t0, t1), range(z0, z1)):
+            key = (level, z, RENDERED_C, t, x0, y0, w, h)
+            cached = cache.get(self.server, self.image_id, key)
+            if cached is None:
+                missing.append((t, z))
+            else:
+                out[t - t0, z - z0] = cached
+        if not missing:
+            return out
+
+        full_plane = (h, w) == self.levels[level]
+        with self.rendering_engine(level) as engine:
+            for t, z in missing:
+                plane_def = PlaneDef(slice=PlaneDef.XY, z=z, t=t)
+                if not full_plane:
+                    plane_def.region = RegionDef(x0, y0, w, h)
+                with track("rendered") as call:
+                    jpeg = engine.renderCompressed(plane_def, {"omero.group": "-1"})
+                    call.add_bytes(len(jpeg))
+                plane = out[t - t0, z - z0]
+                plane[:] = np.asarray(Image.open(BytesIO(jpeg)).convert("RGB"))
+                key = (level, z, RENDERED_C, t, x0, y0, w, h)
+                cache.put(self.server, self.image_id, key, plane)
+        return out
+
+    def chunks(self, level: int = 0) -> tuple[tuple[int, ...], ...]:
+        """One chunk per plane, or per tile for pyramids and huge planes."""
+        size_y, size_x = self.levels[level]
+        size_t, size_z = self.size_tz
+        if self.is_pyramid:
+            tile_w, tile_h = self.tile_size  # type: ignore [misc]
+        elif size_y * size_x * 3 > MAX_PLANE_BYTES:
+            tile_w = tile_h = DEFAULT_TILE_SIZE
+        else:
+            tile_w, tile_h = size_x, size_y
+        return (
+            (1,) * size_t,
+            (1,) * size_z,
+            _split(size_y, tile_h),
+            _split(size_x, tile_w),
+            (3,),
+        )
+
+    def lazy_pyramid(self) -> list[da.Array]:
+        return [
+            lazy_array(
+                partial(self.read, level), self.chunks(level), np.uint8, "omero-rgb"
+            )
+            for level in range(len(self.levels))
+        ]
@@ -0,0 +1,384 @@
+from collections.abc import Iterator
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from napari.layers import Layer, Shapes
+from napari.types import LayerData
+
+from napari_omero.metrics import track
+from omero.gateway import BlitzGateway, ImageWrapper
+from omero.sys import ParametersI
+
+# the shape types napari can show, with the fields they are drawn from
+SHAPE_FIELDS = {
+    "rectangle": ("Rectangle", "s.x, s.y, s.width, s.height"),
+    "ellipse": ("Ellipse", "s.x, s.y, s.radiusX, s.radiusY"),
+    "polygon": ("Polygon", "s.points"),
+    "point": ("Point", "s.x, s.y"),
+}
+# only the columns napari needs, rather than whole ROI and shape graphs
+SHAPE_QUERY = """
+    select s.id, s.roi.id, s.theZ, s.theT, s.strokeColor, s.fillColor,
+           s.textValue, {fields}
+    from {table} s
+    where s.roi.image.id = :id
+    order by s.id
+"""
+COUNT_QUERY = "select count(s) from {table} s where s.roi.image.id = :id"
+# shapes per query when loading ROIs in pages, see `iter_roi_layers`
+ROI_PAGE_SIZE = 10_000
+_ALL_GROUPS = {"omero.group": "-1"}
+
+
+class ShapeTable(NamedTuple):
+    """Shapes of an image as columns, one row per OMERO shape.
+
+    Vertices of all shapes are concatenated in `vertices`, (y, x) in pixels;
+    shape ``i`` has ``n_vertices[i]`` of them.  Unset Z, T and colors are -1
+    and False in `has_stroke`/`has_fill`.
+    """
+
+    kind: np.ndarray
+    shape_id: np.ndarray
+    roi_id: np.ndarray
+    z: np.ndarray
+    t: np.ndarray
+    stroke: np.ndarray
+    has_stroke: np.ndarray
+    fill: np.ndarray
+    has_fill: np.ndarray
+    comment: np.ndarray
+    n_vertices: np.ndarray
+    vertices: np.ndarray
+
+    @classmethod
+    def concat(cls, tables: list["ShapeTable"]) -> "ShapeTable":
+        tables = [_decode("point", []), *tables]
+        return cls(*(np.concatenate(columns) for columns in zip(*tables)))
+
+    def select(self, mask: np.ndarray) -> "ShapeTable":
+        """The rows where `mask` is True."""
+        vertex_mask = np.repeat(mask, self.n_vertices)
+        columns = [column[mask] for column in self[:-1]]
+        return ShapeTable(*columns, self.vertices[vertex_mask])
+
+
+def _val(rtype, default=None):
+    return rtype.val if rtype is not None else default
+
+
+def _column(rows: list, i: int, dtype, default) -> np.ndarray:
+    return np.array([_val(row[i], default) for row in rows], dtype=dtype)
+
+
+def _decode(kind: str, rows: list) -> ShapeTable:
+    """Decode the rows of the `SHAPE_QUERY` of `kind` into a `ShapeTable`."""
+    n = len(rows)
+    stroke = [_val(row[4]) for row in rows]
+    fill = [_val(row[5]) for row in rows]
+    if kind == "polygon":
+        # "x,y x,y ..." (or "x,y, x,y, ..."): flatten to x, y, x, y, ...
+        vertices = [
+            np.array(_val(row[7], "").replace(",", " ").split(), float).reshape(-1, 2)
+            for row in rows
+        ]
+        n_vertices = np.array([len(v) for v in vertices], dtype=np.int64)
+        xy = np.concatenate(vertices) if vertices else np.empty((0, 2))
+    else:
+        x, y = _column(rows, 7, float, np.nan), _column(rows, 8, float, np.nan)
+        if kind == "point":
+            xy = np.stack([x, y], axis=-1)
+        else:
+            a, b = _column(rows, 9, float, np.nan), _column(rows, 10, float, np.nan)
+            if kind == "ellipse":
+                # the bounding box of the ellipse, centered on (x, y)
+                x, y, a, b = x - a, y - b, 2 * a, 2 * b
+            # corners in napari's order (down first from the top-left), which
+            # `create_omero_shape` saves back as an unrotated shape
+            xs = np.stack([x, x, x + a, x + a], axis=-1)
+            ys = np.stack([y, y + b, y + b, y], axis=-1)
+            xy = np.stack([xs, ys], axis=-1).reshape(-1, 2)
+        n_vertices = np.full(n, len(xy) // n if n else 0, dtype=np.int64)
+    return ShapeTable(
+        kind=np.full(n, kind, dtype=object),
+        shape_id=_column(rows, 0, np.int64, -1),
+        roi_id=_column(rows, 1, np.int64, -1),
+        z=_column(rows, 2, np.int64, -1),
+        t=_column(rows, 3, np.int64, -1),
+        stroke=np.array([c or 0 for c in stroke], dtype=np.int64),
+        has_stroke=np.array([c is not None for c in stroke], dtype=bool),
+        fill=np.array([c or 0 for c in fill], dtype=np.int64),
+        has_fill=np.array([c is not None for c in fill], dtype=bool),
+        comment=_column(rows, 6, object, ""),
+        n_vertices=n_vertices,
+        vertices=xy[:, ::-1].reshape(-1, 2),
+    )
+
+
+def iter_shape_tables(
+    conn: BlitzGateway, image_id: int, page_size: Optional[int] = None
+) -> Iterator[ShapeTable]:
+    """Load the shapes of an image napari can show, by type and in pages.
+
+    Each page holds up to `page_size` shapes of one type (all of them if
+    `page_size` is None), in the order of their ids.
+    """
+    qs = conn.getQueryService()
+    for kind, (table, fields) in SHAPE_FIELDS.items():
+        query = SHAPE_QUERY.format(table=table, fields=fields)
+        offset = 0
+        while True:
+            params = ParametersI()
+            params.addId(image_id)
+            if page_size is not None:
+                params.page(offset, page_size)
+            with track("roi"):
+                rows = qs.projection(query, params, _ALL_GROUPS)
+            if rows:
+                yield _decode(kind, rows)
+            if page_size is None or len(rows) < page_size:
+                break
+            offset += page_size
+
+
+def load_shape_table(conn: BlitzGateway, image_id: int) -> ShapeTable:
+    """Load the shapes of an image napari can show, one query per shape type."""
+    return ShapeTable.concat(list(iter_shape_tables(conn, image_id)))
+
+
+def count_shapes(conn: BlitzGateway, image_id: int) -> int:
+    """Number of shapes of an image napari can show."""
+    qs = conn.getQueryService()
+    params = ParametersI()
+    params.addId(image_id)
+    total = 0
+    for table, _ in SHAPE_FIELDS.values():
+        with track("roi"):
+            rows = qs.projection(COUNT_QUERY.format(table=table), params, _ALL_GROUPS)
+        total += rows[0][0].val if rows else 0
+    return total
+
+
+def colors_to_rgba(colors: np.ndarray, has_color: np.ndarray) -> np.ndarray:
+    """OMERO colors (signed RGBA ints) as opaque RGBA floats; unset is white."""
+    val = colors & 0xFFFFFFFF
+    rgb = np.stack([(val >> 24) & 0xFF, (val >> 16) & 0xFF, (val >> 8) & 0xFF], -1)
+    rgba = np.ones((len(colors), 4))
+    rgba[:, :3] = np.where(has_color[:, None], rgb / 255, 1.0)
+    return rgba
+
+
+def rgba_to_color(rgba: np.ndarray) -> Optional[int]:
+    """An RGBA float color as an OMERO color; opaque white is unset."""
+    r, g, b, a = (np.clip(rgba, 0, 1) * 255).round().astype(int)
+    if (r, g, b, a) == (255, 255, 255, 255):
+        return None
+    val = int((r << 24) | (g << 16) | (b << 8) | a)
+    return val - (1 << 32) if val >= 1 << 31 else val
+
+
+def _expand_planes(
+    table: ShapeTable, size_t: int, size_z: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Shape indices, T and Z of each (shape, plane) a shape is shown on.
+
+    Shapes without Z (or T) are shown on every Z-section (or timepoint),
+    T-major as in ``np.meshgrid(t, z, indexing="ij")``.
+    """
+    n_t = np.where(table.t < 0, size_t, 1)
+    n_z = np.where(table.z < 0, size_z, 1)
+    counts = n_t * n_z
+    index = np.repeat(np.arange(len(counts)), counts)
+    # position of each copy among the copies of its shape
+    k = np.arange(len(index)) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = np.where(table.t[index] < 0, k // n_z[index], table.t[index])
+    z = np.where(table.z[index] < 0, k % n_z[index], table.z[index])
+    return index, t, z
+
+
+def _gather_vertices(table: ShapeTable, index: np.ndarray) -> np.ndarray:
+    """Rows of `table.vertices` of the shapes `index`, in order."""
+    starts = np.cumsum(table.n_vertices) - table.n_vertices
+    counts = table.n_vertices[index]
+    offsets = np.repeat(starts[index] - (np.cumsum(counts) - counts), counts)
+    return offsets + np.arange(counts.sum())
+
+
+def roi_layer_data(
+    table: ShapeTable, image: ImageWrapper, points: bool
+) -> list[LayerData]:
+    """Points (or other shapes) of `table` as napari layer data.
+
+    Shapes are only copied where napari cannot broadcast them.  napari
+    shows a layer with fewer dimensions than the viewer on every index of
+    the missing leading axes, so:
+
+    - shapes with a timepoint go to a (t, z, y, x) layer; those without a
+      Z-section are copied to each Z-section of their timepoint,
+    - shapes with a Z-section only go to a (z, y, x) layer, shown at every
+      timepoint,
+    - shapes with neither go to a (y, x) layer, shown on every plane.
+
+    Each layer is left out if it would be empty.
+    """
+    table = table.select((table.kind == "point") == points)
+    groups = [
+        ("", 2, table.t >= 0),
+        (" (all timepoints)", 1, (table.t < 0) & (table.z >= 0)),
+        (" (all planes)", 0, (table.t < 0) & (table.z < 0)),
+    ]
+    layers = []
+    for suffix, n_leading, mask in groups:
+        if mask.any():
+            layers.append(
+                _layer_data(table.select(mask), image, points, n_leading, suffix)
+            )
+    return layers
+
+
+def _layer_data(
+    table: ShapeTable, image: ImageWrapper, points: bool, n_leading: int, suffix: str
+) -> LayerData:
+    """Layer data of `table`, with the last `n_leading` of the T, Z axes."""
+    image_id = image.getId()
+    # only shapes without Z in (t, z, y, x) layers are copied
+    size_z = image.getSizeZ() if n_leading == 2 else 1
+    index, t, z = _expand_planes(table, 1, size_z)
+    counts = table.n_vertices[index]
+    vertices = table.vertices[_gather_vertices(table, index)]
+    leading = np.stack([t, z], axis=-1)[:, 2 - n_leading :]
+    coords = np.hstack([np.repeat(leading, counts, axis=0), vertices])
+    scale = (
+        1,
+        image.getPixelSizeZ() or 1,
+        image.getPixelSizeY() or 1,
+        image.getPixelSizeX() or 1,
+    )
+    meta = {
+        "face_color": colors_to_rgba(table.fill[index], table.has_fill[index]),
+        "scale": scale[2 - n_leading :],
+        "text": {"string": "{comment}", "size": 7},
+        "features": {
+            "comment": table.comment[index],
+            "roi_id": table.roi_id[index],
+            "shape_id": table.shape_id[index],
+            "image_id": np.full(len(index), image_id, dtype=np.int64),
+        },
+    }
+    edge_color = colors_to_rgba(table.stroke[index], table.has_stroke[index])
+    if points:
+        meta["name"] = f"OMERO Points {image_id}{suffix}"
+        meta["symbol"] = "o"
+        meta["border_color"] = edge_color
+        meta["size"] = 5
+        return coords, meta, "points"
+    meta["name"] = f"OMERO ROIs {image_id}{suffix}"
+    meta["shape_type"] = list(table.kind[index])
+    meta["edge_width"] = 1
+    meta["edge_color"] = edge_color
+    return np.split(coords, np.cumsum(counts)[:-1]), meta, "shapes"
+
+
+def load_roi_layers(conn: BlitzGateway, image: ImageWrapper) -> list[LayerData]:
+    """Load the ROIs of an image as shapes and points layers.
+
+    Only the shape fields napari needs are loaded, with one projection query
+    per shape type, and decoded into columns in bulk, which is much faster
+    than loading and walking ROI objects for images with many annotations.
+    Shapes napari cannot show (lines, polylines, labels, masks) are skipped.
+    See `roi_layer_data` for the layers made.
+    """
+    table = load_shape_table(conn, image.getId())
+    return [
+        layer
+        for points in (False, True)
+        for layer in roi_layer_data(table, image, points)
+    ]
+
+
+def iter_roi_layers(
+    conn: BlitzGateway, image: ImageWrapper, page_size: int = ROI_PAGE_SIZE
+) -> Iterator[tuple[int, list[LayerData]]]:
+    """Load the ROIs of an image in pages, see `load_roi_layers`.
+
+    Yields the number of OMERO shapes of each page with the layer data of
+    that page.  Adding the first data of each layer (by name) to a viewer,
+    then appending the following pages with `extend_layer`, gives the same
+    layers as `load_roi_layers`.
+    """
+    for table in iter_shape_tables(conn, image.getId(), page_size):
+        layers = [
+            layer
+            for points in (False, True)
+            for layer in roi_layer_data(table, image, points)
+        ]
+        yield len(table.kind), layers
+
+
+def extend_layer(layer: Layer, data, meta: dict) -> None:
+    """Append shapes or points (from `roi_layer_data`) to an existing layer."""
+    n_old = len(layer.data)
+    features = pd.concat(
+        [layer.features.iloc[:n_old], pd.DataFrame(meta["features"])],
+        ignore_index=True,
+    )
+    if meta.get("shape_type") is not None:
+        layer.add(
+            data,
+            shape_type=meta["shape_type"],
+            edge_width=meta["edge_width"],
+            edge_color=meta["edge_color"],
+            face_color=meta["face_color"],
+        )
+        layer.features = features
+    else:
+        border_color = np.concatenate(
+            [layer.border_color[:n_old], meta["border_color"]]
+        )
+        face_color = np.concatenate([layer.face_color[:n_old], meta["face_color"]])
+        size = np.concatenate([layer.size[:n_old], np.full(len(data), meta["size"])])
+        layer.add(data)
+        layer.features = features
+        layer.size = size
+        layer.border_color = border_color
+        layer.face_color = face_color
+
+
+def shape_ids(layer: Layer, column: str = "shape_id") -> np.ndarray:
+    """OMERO shape (or ROI) ID of each shape of `layer`, -1 if not saved."""
+    if column not in layer.features:
+        return np.full(len(layer.data), -1, dtype=np.int64)
+    return layer.features[column].fillna(-1).to_numpy(np.int64, copy=True)
+
+
+def row_hashes(layer: Layer) -> list[int]:
+    """A hash of the geometry, colors and comment of each shape of `layer`."""
+    if "comment" in layer.features:
+        comments = layer.features["comment"].fillna("").astype(str)
+    else:
+        comments = [""] * len(layer.data)
+    if isinstance(layer, Shapes):
+        kinds = layer.shape_type
+        colors = np.hstack([layer.edge_color, layer.face_color])
+    else:
+        kinds = ["point"] * len(layer.data)
+        colors = np.hstack([layer.border_color, layer.face_color])
+    return [
+        hash((kind, np.asarray(data).tobytes(), color.tobytes(), comment))
+        for kind, data, color, comment in zip(kinds, layer.data, colors, comments)
+    ]
+
+
+def remember_shapes(layer: Layer, image_id: int) -> None:
+    """Record the shapes of `layer` as they are in OMERO, for `sync_rois`.
+
+    Stored in ``layer.metadata["omero_rois"]``: the image and, by shape ID,
+    the `row_hashes` of the rows showing the shape (several for shapes
+    copied over Z-sections).
+    """
+    shapes: dict[int, tuple[int, ...]] = {}
+    for shape_id, row_hash in zip(shape_ids(layer), row_hashes(layer)):
+        if shape_id >= 0:
+            shapes[shape_id] = (*shapes.get(shape_id, ()), row_hash)
+    layer.metadata["omero_rois"] = {"image_id": image_id, "shapes": shapes}
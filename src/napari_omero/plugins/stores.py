@@ -0,0 +1,266 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from napari_omero.metrics import track
+from omero.gateway import BlitzGateway
+
+logger = logging.getLogger(__name__)
+
+# (pixels id, resolution level); level is None for non-pyramidal images
+StoreKey = tuple[int, Optional[int]]
+
+DEFAULT_POOL_SIZE = max(4, os.cpu_count() or 4)
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+
+class RawPixelsStorePool:
+    """Thread-safe pool of RawPixelsStores for one connection.
+
+    Creating a store costs several round trips (``createRawPixelsStore``,
+    ``setPixelsId``, ``setResolutionLevel``), so stores are kept open after
+    use and handed to the next reader asking for the same pixels id and
+    resolution level.  At most `max_size` stores exist at once; readers wait
+    for a free store when the pool is exhausted.  Stores idle for longer than
+    `idle_timeout` seconds are closed the next time a store is checked out
+    or in, and all idle stores are closed by `close`.
+
+    Parameters
+    ----------
+    conn : BlitzGateway
+        Connection on which the stores are created.
+    max_size : int
+        Maximum number of open stores, in use or idle.
+    idle_timeout : float
+        Seconds after which an idle store is closed.
+    """
+
+    def __init__(
+        self,
+        conn: BlitzGateway,
+        max_size: int = DEFAULT_POOL_SIZE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.conn = conn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        # idle stores, with the time they were returned, oldest first
+        self._idle: list[tuple[StoreKey, Any, float]] = []
+        self._n_open = 0
+        self._closed = False
+
+    def _create(self, key: StoreKey):
+        pixels_id, level = key
+        with track("store_open"):
+            store = self.conn.c.sf.createRawPixelsStore()
+            try:
+                store.setPixelsId(pixels_id, False, {"omero.group": "-1"})
+                if level is not None:
+                    store.setResolutionLevel(level)
+            except Exception:
+                _close_quietly(store)
+                raise
+        return store
+
+    def checkout(self, pixels_id: int, level: Optional[int] = None):
+        """Take a store set up for `pixels_id` and `level` out of the pool."""
+        key = (pixels_id, level)
+        expired, to_close = [], []
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("RawPixelsStorePool has been closed")
+                    expired += self._pop_expired(time.monotonic())
+                    for i, (k, store, _) in enumerate(reversed(self._idle)):
+                        if k == key:
+                            del self._idle[len(self._idle) - 1 - i]
+                            return store
+                    if self._n_open < self.max_size:
+                        break
+                    if self._idle:
+                        # make room by dropping the least recently used store
+                        to_close.append(self._idle.pop(0)[1])
+                        break
+                    self._cond.wait()
+                self._n_open += 1
+        finally:
+            for store in expired + to_close:
+                _close_quietly(store)
+            if to_close:
+                with self._cond:
+                    self._n_open -= len(to_close)
+
+        try:
+            return self._create(key)
+        except Exception:
+            self._discard()
+            raise
+
+    def checkin(self, pixels_id: int, level: Optional[int], store) -> None:
+        """Return a store obtained from `checkout` to the pool."""
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                self._n_open -= 1
+                expired = [store]
+            else:
+                self._idle.append(((pixels_id, level), store, now))
+                expired = self._pop_expired(now)
+            self._cond.notify()
+        for s in expired:
+            _close_quietly(s)
+
+    def _discard(self, store=None) -> None:
+        """Forget a store that failed, closing it if given."""
+        if store is not None:
+            _close_quietly(store)
+        with self._cond:
+            self._n_open -= 1
+            self._cond.notify()
+
+    def _pop_expired(self, now: float) -> list:
+        cutoff = now - self.idle_timeout
+        n = 0
+        while n < len(self._idle) and self._idle[n][2] < cutoff:
+            n += 1
+        expired = [store for _, store, _ in self._idle[:n]]
+        del self._idle[:n]
+        self._n_open -= n
+        return expired
+
+    @contextmanager
+    def store(self, pixels_id: int, level: Optional[int] = None) -> Generator:
+        """Context manager that borrows a store from the pool."""
+        store = self.checkout(pixels_id, level)
+        try:
+            yield store
+        except Exception:
+            # the store may be in an unknown state (or the session gone)
+            self._discard(store)
+            raise
+        else:
+            self.checkin(pixels_id, level, store)
+
+    def close(self) -> None:
+        """Close all idle stores; stores in use are closed when returned."""
+        with self._cond:
+            self._closed = True
+            idle = [store for _, store, _ in self._idle]
+            self._n_open -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for store in idle:
+            _close_quietly(store)
+
+
+class RenderingEnginePool(RawPixelsStorePool):
+    """Thread-safe pool of RenderingEngines for one connection.
+
+    Like `RawPixelsStorePool`, but for engines that render planes with the
+    current rendering settings of the image, compressed with `quality`.
+    Loading an engine costs even more round trips than a store.
+    """
+
+    def __init__(self, conn: BlitzGateway, quality: float = 0.9, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.quality = quality
+
+    def _create(self, key: StoreKey):
+        pixels_id, level = key
+        ctx = {"omero.group": "-1"}
+        with track("engine_open"):
+            engine = self.conn.c.sf.createRenderingEngine()
+            try:
+                engine.lookupPixels(pixels_id, ctx)
+                if not engine.lookupRenderingDef(pixels_id, ctx):
+                    # never rendered before: create default settings
+                    engine.resetDefaultSettings(True, ctx)
+                    engine.lookupRenderingDef(pixels_id, ctx)
+                engine.load(ctx)
+                engine.setCompressionLevel(self.quality)
+                if level is not None:
+                    engine.setResolutionLevel(level)
+            except Exception:
+                _close_quietly(engine)
+                raise
+        return engine
+
+
+def _close_quietly(store) -> None:
+    try:
+        store.close()
+    except Exception as e:
+        logger.debug(f"Failed to close {type(store).__name__}: {e}")
+
+
+_POOLS: "weakref.WeakKeyDictionary[BlitzGateway, RawPixelsStorePool]" = (
+    weakref.WeakKeyDictionary()
+)
+_RENDERING_POOLS: "weakref.WeakKeyDictionary[BlitzGateway, RenderingEnginePool]" = (
+    weakref.WeakKeyDictionary()
+)
+_POOLS_LOCK = threading.Lock()
+
+
+def get_store_pool(conn: BlitzGateway) -> RawPixelsStorePool:
+    """Return the store pool of `conn`, creating it if needed."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(conn)
+        if pool is None or pool._closed:
+            pool = _POOLS[conn] = RawPixelsStorePool(conn)
+        return pool
+
+
+def get_rendering_pool(conn: BlitzGateway) -> RenderingEnginePool:
+    """Return the rendering engine pool of `conn`, creating it if needed."""
+    with _POOLS_LOCK:
+        pool = _RENDERING_POOLS.get(conn)
+        if pool is None or pool._closed:
+            pool = _RENDERING_POOLS[conn] = RenderingEnginePool(conn)
+        return pool
+
+
+def close_store_pool(conn: Optional[BlitzGateway]) -> None:
+    """Close the store pools of `conn`, e.g. before its session is closed."""
+    if conn is None:
+        return
+    with _POOLS_LOCK:
+        pools = [_POOLS.pop(conn, None), _RENDERING_POOLS.pop(conn, None)]
+    for pool in pools:
+        if pool is not None:
+            pool.close()
+
+
+ConnectionProvider = Callable[[], BlitzGateway]
+_READ_CONNECTIONS: "weakref.WeakKeyDictionary[BlitzGateway, ConnectionProvider]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def register_read_connections(
+    conn: BlitzGateway, next_conn: Optional[ConnectionProvider]
+) -> None:
+    """Spread pixel reads of `conn` over the connections given by `next_conn`.
+
+    `next_conn` is called for every read and returns the connection to use,
+    e.g. from a pool of sessions joined to the session of `conn`.  Passing
+    None unregisters it.
+    """
+    with _POOLS_LOCK:
+        if next_conn is None:
+            _READ_CONNECTIONS.pop(conn, None)
+        else:
+            _READ_CONNECTIONS[conn] = next_conn
+
+
+def read_connection(conn: BlitzGateway) -> BlitzGateway:
+    """Connection to use for the next pixel read on behalf of `conn`."""
+    next_conn = _READ_CONNECTIONS.get(conn)
+    return next_conn() if next_conn is not None else conn
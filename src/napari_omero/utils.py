@@ -1,6 +1,5 @@
 import functools
 import logging
-import re
 import time
 from typing import Optional
 
@@ -11,6 +10,13 @@ from omero.gateway import BlitzGateway, BlitzObjectWrapper
 from omero.model import IObject
 from omero.model import enums as omero_enums
 
+from ._urls import (  # noqa: F401
+    omero_object_pattern,
+    omero_url_pattern,
+    parse_omero_object,
+    parse_omero_url,
+)
+
 logger = logging.getLogger(__name__)
 
 PIXEL_TYPES = {
@@ -28,6 +34,7 @@ PROXIES = (
     ProxyStringType("Image"),
     ProxyStringType("Dataset"),
     ProxyStringType("Project"),
+    ProxyStringType("Plate"),
 )
 
 
@@ -58,30 +65,20 @@ def lookup_obj(conn: BlitzGateway, iobj: IObject) -> BlitzObjectWrapper:
     return obj
 
 
-omero_url_pattern = re.compile(
-    r"https?://(?P<host>[^/]+).*/webclient" r"/\?show=(?P<type>[a-z]+)-(?P<id>[0-9]+)"
-)
-
-omero_object_pattern = re.compile(
-    r"(?P<protocol>omero://)?(?P<type>(Image|Dataset|Project)):(?P<id>[0-9]+)"
-)
-
-
-def parse_omero_url(url: str) -> Optional[dict[str, str]]:
-    match = omero_url_pattern.search(url)
-    return match.groupdict() if match else None
+def server_id(conn: BlitzGateway) -> str:
+    """Return 'host:port' of the server `conn` is connected to."""
+    host = conn.c.getProperty("omero.host") or getattr(conn, "host", None) or ""
+    port = conn.c.getProperty("omero.port") or getattr(conn, "port", None) or 4064
+    return f"{host}:{port}"
 
 
 def get_proxy_obj(path: str) -> Optional[IObject]:
     """If path ends with e.g. Image:ID return proxy obj."""
-    if path.startswith("omero://"):
-        path = path[8:]
-    match = omero_object_pattern.search(path)
-    if match is None:
+    parsed = parse_omero_object(path)
+    if parsed is None:
         return None
-    d = match.groupdict()
-    _path = f"{d['type']}:{d['id']}"
-    return ProxyStringType(d["type"])(_path)
+    type_, id_ = parsed
+    return ProxyStringType(type_)(f"{type_}:{id_}")
 
 
 def obj_to_proxy_string(iobj: IObject) -> str:
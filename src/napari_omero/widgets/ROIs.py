@@ -3,10 +3,17 @@ import warnings
 import napari.viewer
 from magicgui.widgets import Container, PushButton, create_widget
 from napari.layers import Image, Labels
+from napari.qt.threading import create_worker
+from napari.utils import progress
 from napari.utils.notifications import show_info
 
-from napari_omero.plugins.loaders import load_rois
-from napari_omero.plugins.omero import save_rois
+from napari_omero.plugins.omero import sync_rois
+from napari_omero.plugins.rois import (
+    count_shapes,
+    extend_layer,
+    iter_roi_layers,
+    remember_shapes,
+)
 from napari_omero.utils import lookup_obj
 from napari_omero.widgets.gateway import QGateWay
 from omero.cli import ProxyStringType
@@ -16,11 +23,14 @@ def omero_roi_manager() -> Container:
     """A widget to manage ROIs between napari and OMERO.
 
     This widget handles both loading ROI from OMERO, as well as saving
-    napari annotations to OMERO as ROI.
+    napari annotations to OMERO as ROI.  Only the changes made since
+    loading (or the last upload) are uploaded, see `sync_rois`.
     """
     omero_image_combobox = create_widget(label="OMERO Image", annotation=Image)
     load_button = PushButton(text="Load Annotations from OMERO")
+    cancel_button = PushButton(text="Cancel Loading", enabled=False)
     save_button = PushButton(text="Upload Annotations to OMERO")
+    worker = None
 
     @load_button.clicked.connect
     def _load_rois_from_omero() -> None:
@@ -36,20 +46,53 @@ def omero_roi_manager() -> Container:
         img_id = int(layer_name.split(":")[0])
 
         image_wrapper = gateway.conn.getObject("Image", img_id)
-        points_coords, points_meta, _ = load_rois(
-            gateway.conn, image_wrapper, load_points=True
-        )[0]
-        shapes_coords, shapes_meta, _ = load_rois(
-            gateway.conn, image_wrapper, load_points=False
-        )[0]
-
-        if points_meta is None and shapes_meta is None:
-            show_info(f"No ROIs or points found for OMERO image id {img_id}.")
-            return
-        if shapes_meta:
-            viewer.add_shapes(shapes_coords, **shapes_meta)
-        if points_meta:
-            viewer.add_points(points_coords, **points_meta)
+        _start_loading(viewer, gateway.conn, image_wrapper)
+
+    def _load_pages(conn, image):
+        yield count_shapes(conn, image.getId())
+        yield from iter_roi_layers(conn, image)
+
+    def _start_loading(viewer, conn, image) -> None:
+        """Load ROIs in pages on a worker, adding each page to the layers."""
+        nonlocal worker
+        layers = {}
+        pbar = progress(desc=f"Loading ROIs of image {image.getId()}")
+
+        def _on_page(page) -> None:
+            if isinstance(page, int):
+                pbar.total = page
+                return
+            n_shapes, page_layers = page
+            for data, meta, layer_type in page_layers:
+                if meta["name"] in layers:
+                    extend_layer(layers[meta["name"]], data, meta)
+                else:
+                    add_layer = getattr(viewer, f"add_{layer_type}")
+                    layers[meta["name"]] = add_layer(data, **meta)
+            pbar.update(n_shapes)
+
+        def _on_finished() -> None:
+            nonlocal worker
+            pbar.close()
+            worker = None
+            for layer in layers.values():
+                remember_shapes(layer, image.getId())
+            load_button.enabled, cancel_button.enabled = True, False
+            if not layers:
+                show_info(
+                    f"No ROIs or points found for OMERO image id {image.getId()}."
+                )
+
+        worker = create_worker(_load_pages, conn, image, _start_thread=False)
+        worker.yielded.connect(_on_page)
+        worker.finished.connect(_on_finished)
+        load_button.enabled, cancel_button.enabled = False, True
+        worker.start()
+
+    @cancel_button.clicked.connect
+    def _cancel_loading() -> None:
+        if worker is not None:
+            worker.quit()
 
     @save_button.clicked.connect
     def _save_rois_to_omero() -> None:
@@ -73,10 +116,12 @@ def omero_roi_manager() -> Container:
         )
 
         viewer = napari.viewer.current_viewer()
-        save_rois(viewer=viewer, image=image_wrapper)
+        summary = sync_rois(viewer=viewer, image=image_wrapper)
 
         trg = image_wrapper.getName()
-        show_info(f"All annotation layers uploaded to OMERO image id {image_id}: {trg}")
+        show_info(f"{summary} to OMERO image id {image_id}: {trg}")
 
-    container = Container(widgets=[omero_image_combobox, load_button, save_button])
+    container = Container(
+        widgets=[omero_image_combobox, load_button, cancel_button, save_button]
+    )
     return container
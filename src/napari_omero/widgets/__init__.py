@@ -1,6 +1,7 @@
 from .gateway import QGateWay
 from .login import LoginForm
 from .main import OMEROWidget
+from .metrics import omero_metrics
 from .ROIs import omero_roi_manager
 
-__all__ = ["LoginForm", "OMEROWidget", "QGateWay", "omero_roi_manager"]
+__all__ = ["LoginForm", "OMEROWidget", "QGateWay", "omero_metrics", "omero_roi_manager"]
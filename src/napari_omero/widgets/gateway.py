@@ -1,16 +1,26 @@
 import atexit
+import logging
+import os
+import threading
+import time
 from collections.abc import Generator
 from typing import TYPE_CHECKING, Callable, Optional
 
 from qtpy.QtCore import QObject, Signal
 
 import omero.gateway
+from napari_omero.plugins.stores import close_store_pool, register_read_connections
 from omero.clients import BaseClient
 from omero.gateway import BlitzGateway, BlitzObjectWrapper, PixelsWrapper
 from omero.util.sessions import SessionsStore
 
 SessionStats = tuple[BaseClient, str, int, int]
 
+logger = logging.getLogger(__name__)
+
+# number of extra sessions used for pixel reads (0 disables the pool)
+READ_SESSIONS_ENV = "NAPARI_OMERO_READ_SESSIONS"
+
 
 if TYPE_CHECKING:
     from napari.qt.threading import WorkerBase
@@ -27,6 +37,7 @@ class QGateWay(QObject):
     _host: Optional[str] = None
     _port: Optional[str] = None
     _user: Optional[str] = None
+    _read_pool: Optional["ReadSessionPool"] = None
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -42,7 +53,11 @@ class QGateWay(QObject):
 
     @conn.setter
     def conn(self, val):
-        QGateWay._conn = val
+        old, QGateWay._conn = QGateWay._conn, val
+        if old is not None and old is not val:
+            # e.g. on reconnect: stores pooled on the old session stay open
+            # on the server until it ends, unless closed
+            close_store_pool(old)
 
     @property
     def host(self):
@@ -72,6 +87,9 @@ class QGateWay(QObject):
         return self.conn and self.conn.isConnected()
 
     def close(self, hard=False):
+        self.set_read_sessions(0)
+        # stores pooled on this session become invalid once it is closed
+        close_store_pool(self.conn)
         if self.isConnected():
             self.conn.close(hard=hard)
             try:
@@ -160,10 +178,24 @@ class QGateWay(QObject):
         self.port = client.getProperty("omero.port")
         self.user = client.getProperty("omero.user")
 
+        self.set_read_sessions(int(os.getenv(READ_SESSIONS_ENV) or 0))
         self.connected.emit(self.conn)
         self.status.emit("")
         return self.conn
 
+    def set_read_sessions(self, size: int) -> None:
+        """Use `size` extra sessions for pixel reads (0 to stop using them).
+
+        The sessions join the session of the current connection, each with
+        its own Ice connection, so that concurrent plane and tile reads are
+        not serialized on one connection.
+        """
+        if QGateWay._read_pool is not None:
+            QGateWay._read_pool.close()
+            QGateWay._read_pool = None
+        if size > 0 and self.isConnected():
+            QGateWay._read_pool = ReadSessionPool(self.conn, size)
+
     def getObjects(
         self, name: str, **kwargs
     ) -> Generator[BlitzObjectWrapper, None, None]:
@@ -172,6 +204,101 @@ class QGateWay(QObject):
         yield from self.conn.getObjects(name, **kwargs)
 
 
+class ReadSessionPool:
+    """Connections joined to the session of `conn`, used round-robin for reads.
+
+    Connections are opened lazily and checked with ``keepAlive`` at most
+    every `health_interval` seconds; a connection that fails the check is
+    replaced.  If no connection can be opened, reads fall back to `conn`.
+
+    Parameters
+    ----------
+    conn : BlitzGateway
+        The logged-in connection whose session is joined.
+    size : int
+        Number of extra connections.
+    health_interval : float
+        Minimum number of seconds between health checks.
+    """
+
+    def __init__(self, conn: BlitzGateway, size: int, health_interval=30.0):
+        self.conn = conn
+        self.size = size
+        self.health_interval = health_interval
+        self._conns: list[Optional[BlitzGateway]] = [None] * size
+        self._checked = [0.0] * size
+        self._next = 0
+        self._lock = threading.Lock()
+        self._slot_locks = [threading.Lock() for _ in range(size)]
+        self._closed = False
+        register_read_connections(conn, self.next_conn)
+
+    def _join(self) -> BlitzGateway:
+        client = BaseClient(
+            host=self.conn.c.getProperty("omero.host"),
+            port=int(self.conn.c.getProperty("omero.port") or 4064),
+        )
+        client.joinSession(self.conn.c.getSessionId())
+        client.enableKeepAlive(60)
+        return BlitzGateway(client_obj=client)
+
+    def next_conn(self) -> BlitzGateway:
+        with self._lock:
+            if self._closed:
+                return self.conn
+            i = self._next
+            self._next = (i + 1) % self.size
+        # joining and keepAlive are round trips: only hold the lock of slot i,
+        # so that reads rotated to the other slots go ahead meanwhile
+        with self._slot_locks[i]:
+            conn = self._conns[i]
+            now = time.monotonic()
+            if conn is not None and now - self._checked[i] > self.health_interval:
+                try:
+                    conn.keepAlive()
+                    self._checked[i] = now
+                except Exception as e:
+                    logger.debug(f"Replacing unhealthy read session: {e}")
+                    with self._lock:
+                        if self._conns[i] is conn:
+                            self._conns[i] = None
+                    _close_read_conn(conn)
+                    conn = None
+            if conn is None:
+                try:
+                    conn = self._join()
+                except Exception as e:
+                    logger.warning(f"Could not open read session: {e}")
+                    return self.conn
+                with self._lock:
+                    closed = self._closed
+                    if not closed:
+                        self._conns[i] = conn
+                        self._checked[i] = now
+                if closed:
+                    _close_read_conn(conn)
+                    return self.conn
+            return conn
+
+    def close(self) -> None:
+        register_read_connections(self.conn, None)
+        with self._lock:
+            self._closed = True
+            conns = [c for c in self._conns if c is not None]
+            self._conns = [None] * self.size
+        for conn in conns:
+            _close_read_conn(conn)
+
+
+def _close_read_conn(conn: BlitzGateway) -> None:
+    close_store_pool(conn)
+    try:
+        # hard=False detaches from the shared session instead of killing it
+        conn.close(hard=False)
+    except Exception as e:
+        logger.debug(f"Failed to close read session: {e}")
+
+
 class NonCachedPixelsWrapper(PixelsWrapper):
     """Extend gateway.PixelWrapper to override _prepareRawPixelsStore."""
 
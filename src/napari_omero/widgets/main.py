@@ -189,7 +189,7 @@ class OMEROWidget(QWidget):
         item = self.model.itemFromIndex(indices[0])
         self.thumb_grid.set_item(item)
 
-        if item.isImage():
+        if item.isImage() or item.isPlate():
             QCoreApplication.processEvents()
             self.load_image(item.wrapper)
 
@@ -0,0 +1,47 @@
+from magicgui.widgets import Container, Label, PushButton, Table
+from qtpy.QtCore import QTimer
+
+from napari_omero.metrics import get_metrics
+
+# refresh period of the metrics widget, in milliseconds
+REFRESH_INTERVAL = 1000
+COLUMNS = ["count", "errors", "p50_ms", "p90_ms", "p99_ms", "MB_per_s", "in_flight"]
+
+
+def omero_metrics() -> Container:
+    """A widget showing the calls made to the OMERO server, live.
+
+    One row per kind of call (see `napari_omero.metrics`), with the cache
+    hit rates below.  The same numbers are available in the napari console
+    as ``omero_metrics``.
+    """
+    table = Table(value={"data": [], "columns": COLUMNS})
+    caches = Label()
+    reset_button = PushButton(text="Reset")
+    container = Container(widgets=[table, caches, reset_button])
+
+    def _refresh() -> None:
+        summary = get_metrics().summary()
+        calls = {k: v for k, v in summary.items() if "count" in v}
+        table.value = {
+            "data": [[round(stats[c], 1) for c in COLUMNS] for stats in calls.values()],
+            "index": list(calls),
+            "columns": COLUMNS,
+        }
+        caches.value = "\n".join(
+            f"{name}: {stats['hit_rate']:.0%} hits ({stats['hits']}/"
+            f"{stats['hits'] + stats['misses']})"
+            for name, stats in summary.items()
+            if "hit_rate" in stats
+        )
+
+    @reset_button.clicked.connect
+    def _reset() -> None:
+        get_metrics().reset()
+        _refresh()
+
+    timer = QTimer(container.native)
+    timer.timeout.connect(_refresh)
+    timer.start(REFRESH_INTERVAL)
+    _refresh()
+    return container
@@ -4,6 +4,8 @@ from qtpy.QtCore import QSize, Qt
 from qtpy.QtGui import QIcon, QImage, QPixmap
 from qtpy.QtWidgets import QListWidget, QListWidgetItem
 
+from napari_omero.metrics import track
+
 from .gateway import QGateWay
 from .tree_model import OMEROTreeItem
 
@@ -64,7 +66,10 @@ class ThumbGrid(QListWidget):
             self.clear()
             self._item_map.clear()
             for img in item.wrapper.listChildren():
-                for byte in conn.getThumbnailSet([img.getId()], THUMBSIZE).values():
+                with track("thumbnail") as call:
+                    thumbs = conn.getThumbnailSet([img.getId()], THUMBSIZE)
+                    call.add_bytes(sum(len(b) for b in thumbs.values()))
+                for byte in thumbs.values():
                     yield byte, img
 
         return self.gateway._submit(
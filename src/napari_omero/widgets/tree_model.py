@@ -4,13 +4,20 @@ from typing import Any, Optional
 from qtpy.QtCore import QModelIndex, Qt
 from qtpy.QtGui import QStandardItem, QStandardItemModel
 
-from omero.gateway import BlitzObjectWrapper, _DatasetWrapper, _ImageWrapper
+from omero.gateway import (
+    BlitzObjectWrapper,
+    _DatasetWrapper,
+    _ImageWrapper,
+    _PlateWrapper,
+)
 
 from .gateway import QGateWay
 
 _ICON_MAP = {
     "Project": "🗃",
     "Dataset": "📁",
+    "Screen": "🗄",
+    "Plate": "🧫",
 }
 
 
@@ -73,6 +80,9 @@ class OMEROTreeItem(QStandardItem):
     def isImage(self) -> bool:
         return isinstance(self.wrapper, _ImageWrapper)
 
+    def isPlate(self) -> bool:
+        return isinstance(self.wrapper, _PlateWrapper)
+
 
 class OMEROTreeModel(QStandardItemModel):
     def __init__(self, gateway: QGateWay, parent=None):
@@ -102,6 +112,8 @@ class OMEROTreeModel(QStandardItemModel):
         return itertools.chain(
             self.gateway.getObjects("Project", opts=opts),
             self.gateway.getObjects("Dataset", opts={**opts, "orphaned": True}),
+            self.gateway.getObjects("Screen", opts=opts),
+            self.gateway.getObjects("Plate", opts={**opts, "orphaned": True}),
         )
 
     def _add_projects(self, projects):
@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from napari_omero.plugins import cache
+from napari_omero.plugins.metadata import ChannelInfo, ImageInfo
+from napari_omero.plugins.pixels import PixelsReader
+
+
+class FakeStore:
+    """A RawPixelsStore serving a TCZYX array, recording the calls made."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.calls: list[tuple] = []
+
+    def _send(self, data: np.ndarray) -> bytes:
+        return data.astype(data.dtype.newbyteorder(">")).tobytes()
+
+    def getPlane(self, z, c, t):
+        self.calls.append(("getPlane", z, c, t))
+        return self._send(self.data[t, c, z])
+
+    def getTile(self, z, c, t, x, y, w, h):
+        self.calls.append(("getTile", z, c, t, x, y, w, h))
+        return self._send(self.data[t, c, z, y : y + h, x : x + w])
+
+    def getHypercube(self, offset, size, step):
+        self.calls.append(("getHypercube", offset, size, step))
+        # XYZCT order
+        region = tuple(
+            slice(o, o + s, st) for o, s, st in reversed(list(zip(offset, size, step)))
+        )
+        return self._send(self.data[region])
+
+
+def _image_info(data: np.ndarray, image_id: int = 1) -> ImageInfo:
+    """Metadata of a (t, c, z, y, x) array, served by `fake_reader`."""
+    size_t, size_c, size_z, size_y, size_x = data.shape
+    return ImageInfo(
+        image_id=image_id,
+        pixels_id=image_id,
+        name="image",
+        pixels_type=data.dtype.name,
+        size_tcz=(size_t, size_c, size_z),
+        levels=[(size_y, size_x)],
+        tile_size=None,
+        pixel_sizes=(None, None, None),
+        channels=[ChannelInfo(str(c), "FFFFFF", (0, 255), True) for c in range(size_c)],
+        default_z=0,
+        default_t=0,
+        version="1",
+    )
+
+
+@pytest.fixture
+def image_info():
+    """Make the `ImageInfo` of an array, see `fake_reader`."""
+    return _image_info
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    """An empty chunk cache, and no disk cache."""
+    monkeypatch.setattr(cache, "_CHUNK_CACHE", cache.ChunkCache("1GB"))
+    monkeypatch.setattr(cache, "_DISK_CACHE", None)
+    monkeypatch.setattr(cache, "_DISK_CACHE_CONFIGURED", True)
+
+
+@pytest.fixture
+def fake_reader(monkeypatch, fresh_caches):
+    """Make `PixelsReader`s of arrays, with fresh caches and no server."""
+    stores: dict[int, FakeStore] = {}
+
+    @contextmanager
+    def raw_pixels_store(self, level=0):
+        yield stores[self.pixels_id]
+
+    monkeypatch.setattr(PixelsReader, "raw_pixels_store", raw_pixels_store)
+    conn = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+
+    def make(data: np.ndarray, image_id: int = 1) -> tuple[PixelsReader, FakeStore]:
+        stores[image_id] = store = FakeStore(data)
+        reader = PixelsReader(
+            conn, image_id, image_id, data.dtype, data.shape[:3], [data.shape[3:]]
+        )
+        return reader, store
+
+    return make
@@ -0,0 +1,45 @@
+import numpy as np
+
+from napari_omero.plugins.cache import ChunkCache, DiskCache
+
+
+def test_disk_cache_roundtrip_and_eviction(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=3000)
+    plane = np.arange(200, dtype=">u2").reshape(10, 20)
+    key = (0, 1, 0, 2, 0, 0, 20, 10)
+    assert cache.get("host:4064", 1, key) is None
+    cache.put("host:4064", 1, key, plane)
+    np.testing.assert_array_equal(cache.get("host:4064", 1, key), plane)
+    assert cache.get("other:4064", 1, key) is None
+
+    for z in range(10):
+        cache.put("host:4064", 2, (0, z, 0, 0, 0, 0, 20, 10), plane)
+    assert sum(f.stat().st_size for f in cache._files()) <= 3000
+
+
+def test_chunk_cache_budget_and_drop():
+    cache = ChunkCache(max_bytes=1000)
+    plane = np.zeros((10, 20), dtype=np.uint16)  # 400 bytes
+    cache.put("host:4064", 1, (0, 0, 0, 0, 0, 0, 20, 10), plane)
+    cache.put("host:4064", 2, (0, 0, 0, 0, 0, 0, 20, 10), plane)
+    assert cache.get("host:4064", 1, (0, 0, 0, 0, 0, 0, 20, 10)) is not None
+    # exceeding the budget evicts the least recently used entry (image 2)
+    cache.put("host:4064", 1, (0, 1, 0, 0, 0, 0, 20, 10), plane)
+    assert cache.get("host:4064", 2, (0, 0, 0, 0, 0, 0, 20, 10)) is None
+    assert cache.image_nbytes() == {("host:4064", 1): 800}
+    assert cache.stats()["hits"] == 1
+
+    cache.drop_image(1)
+    assert cache.nbytes == 0
+    assert cache.image_nbytes() == {}
+
+
+def test_disk_cache_overwrite_is_counted_once(tmp_path):
+    cache = DiskCache(tmp_path, max_bytes=10_000)
+    plane = np.zeros((10, 20), dtype=np.uint16)
+    key = (0, 0, 0, 0, 0, 0, 20, 10)
+    cache.put("host:4064", 1, key, plane)
+    nbytes = cache._nbytes
+    for _ in range(3):
+        cache.put("host:4064", 1, key, plane)
+    assert cache._nbytes == nbytes == sum(f.stat().st_size for f in cache._files())
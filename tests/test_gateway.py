@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+from napari_omero.widgets.gateway import ReadSessionPool
+
+
+class _Conn:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.closed = False
+
+    def keepAlive(self):
+        if not self.healthy:
+            raise ConnectionError("session gone")
+        return True
+
+    def close(self, hard=True):
+        self.closed = True
+
+
+@pytest.fixture
+def joined(monkeypatch):
+    """Connections made by `ReadSessionPool._join`, in order."""
+    conns = []
+
+    def _join(self):
+        conns.append(_Conn())
+        return conns[-1]
+
+    monkeypatch.setattr(ReadSessionPool, "_join", _join)
+    return conns
+
+
+def test_read_session_pool_rotation(joined):
+    pool = ReadSessionPool(_Conn(), 2)
+    used = [pool.next_conn() for _ in range(4)]
+    assert used == [joined[0], joined[1], joined[0], joined[1]]
+    pool.close()
+    assert all(conn.closed for conn in joined)
+    assert pool.next_conn() is pool.conn
+
+
+def test_read_session_pool_failed_join(monkeypatch, joined):
+    pool = ReadSessionPool(_Conn(), 1)
+    join = ReadSessionPool._join
+
+    def _fail(self):
+        raise ConnectionError("server unreachable")
+
+    monkeypatch.setattr(ReadSessionPool, "_join", _fail)
+    # reads fall back to the main connection...
+    assert pool.next_conn() is pool.conn
+    # ...and joining is tried again on the next read
+    monkeypatch.setattr(ReadSessionPool, "_join", join)
+    assert pool.next_conn() is joined[0]
+
+
+def test_read_session_pool_replaces_unhealthy(joined):
+    pool = ReadSessionPool(_Conn(), 1, health_interval=0)
+    first = pool.next_conn()
+    first.healthy = False
+    assert pool.next_conn() is joined[1]
+    assert first.closed
+
+
+def test_read_session_pool_join_does_not_block_other_slots(monkeypatch, joined):
+    pool = ReadSessionPool(_Conn(), 2)
+    join = ReadSessionPool._join
+    started, release = threading.Event(), threading.Event()
+
+    def _slow_join(self):
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        return join(self)
+
+    monkeypatch.setattr(ReadSessionPool, "_join", _slow_join)
+    slow = threading.Thread(target=pool.next_conn)
+    slow.start()
+    started.wait(5)
+    # slot 1 is joined while slot 0 is still joining
+    assert pool.next_conn() is joined[0]
+    release.set()
+    slow.join(5)
+    assert len(joined) == 2
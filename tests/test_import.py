@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+import pytest
+
+# napari asks the reader plugin about every path it opens
+IMPORT_BUDGET = 0.5  # seconds
+
+CODE = """
+import sys, time
+start = time.perf_counter()
+from napari_omero.plugins._napari import napari_get_reader
+napari_get_reader("/data/image.tif")
+napari_get_reader("omero://Image:1")
+print(time.perf_counter() - start)
+print(sorted({"omero", "Ice", "omero_marshal", "qtpy", "napari"} & set(sys.modules)))
+"""
+
+
+def test_reader_import_is_light():
+    result = subprocess.run(
+        [sys.executable, "-c", CODE], capture_output=True, text=True, check=True
+    )
+    seconds, heavy = result.stdout.splitlines()
+    assert heavy == "[]"
+    assert float(seconds) < IMPORT_BUDGET
+
+
+READER_CODE = """
+from unittest import mock
+from napari_omero.plugins._napari import napari_get_reader
+# patching imports the loaders, first thing, as reading a path would
+with mock.patch(
+    "napari_omero.plugins.loaders.omero_proxy_reader", return_value=["layer"]
+) as proxy_reader:
+    reader = napari_get_reader("omero://Image:1")
+    assert reader("omero://Image:1") == ["layer"]
+    assert proxy_reader.call_args.kwargs["proxy_obj"].id.val == 1
+"""
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import napari_omero.plugins.loaders",
+        "import napari_omero.plugins.omero",
+        "import napari_omero.widgets",
+        READER_CODE,
+    ],
+    ids=["loaders", "omero_cli", "widgets", "reader"],
+)
+def test_import_first(code):
+    """Each entry point imports on its own, in a fresh interpreter."""
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import dask.array as da
+import numpy as np
+
+from napari_omero.plugins import loaders
+from napari_omero.plugins.cache import get_chunk_cache
+from napari_omero.plugins.pixels import _bin2
+
+CONN = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+
+
+def test_read_eager(fake_reader):
+    data = np.arange(2 * 3 * 4 * 16 * 16, dtype=np.uint16).reshape(2, 3, 4, 16, 16)
+    reader, store = fake_reader(data)
+    eager = loaders._read_eager(reader, max_bytes=data.nbytes)
+    np.testing.assert_array_equal(eager, data)
+    # one transfer per Z-stack, kept out of the chunk cache
+    assert [call[0] for call in store.calls] == ["getHypercube"] * 6
+    assert get_chunk_cache().nbytes == 0
+
+
+def test_read_eager_memory_guard(monkeypatch, tmp_path, fake_reader, image_info):
+    warnings = []
+    monkeypatch.setattr(loaders, "show_warning", warnings.append)
+    monkeypatch.setenv(loaders.EAGER_MAX_BYTES_ENV, "1kB")
+    monkeypatch.setenv("NAPARI_OMERO_MIRROR_DIR", str(tmp_path))
+    data = np.zeros((1, 1, 2, 32, 32), np.uint8)
+    _, store = fake_reader(data)
+    assert loaders.eager_max_bytes() == 1000
+
+    # too large for the budget: loaded lazily, without reading anything
+    layer, _, _ = loaders._image_layer(CONN, image_info(data), "plane", eager=True)
+    assert isinstance(layer, da.Array)
+    assert "loading it lazily" in warnings[0]
+    assert store.calls == []
+
+    monkeypatch.setenv(loaders.EAGER_MAX_BYTES_ENV, "1MB")
+    layer, _, _ = loaders._image_layer(CONN, image_info(data), "plane", eager=True)
+    assert isinstance(layer, np.ndarray)
+    assert len(warnings) == 1
+
+
+def test_large_image_opens_with_preview_levels(
+    monkeypatch, tmp_path, fake_reader, image_info
+):
+    monkeypatch.setenv("NAPARI_OMERO_PREVIEW_SIZE", "16")
+    monkeypatch.setenv("NAPARI_OMERO_MIRROR_DIR", str(tmp_path))
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 255, (1, 2, 3, 64, 64), dtype=np.uint8)
+    _, store = fake_reader(data)
+    pyramid, _, _ = loaders._image_layer(CONN, image_info(data), "plane", eager=False)
+    assert [level.shape[-2:] for level in pyramid] == [(64, 64), (32, 32), (16, 16)]
+
+    # the preview is subsampled by the server, one small transfer per plane
+    preview = pyramid[2][0, :, 0].compute()
+    np.testing.assert_array_equal(preview, data[0, :, 0, ::4, ::4])
+    strided = [call for call in store.calls if call[0] == "getHypercube"]
+    assert [call[3] for call in strided] == [[4, 4, 1, 1, 1]] * 2
+
+    # intermediate levels are binned from the full resolution
+    binned = _bin2(data[:1, :1, :1])
+    np.testing.assert_array_equal(pyramid[1][:1, :1, :1].compute(), binned)
+    assert all(call[3][0] != 2 for call in store.calls if call[0] == "getHypercube")
@@ -0,0 +1,77 @@
+import sqlite3
+
+from napari_omero.plugins.metadata import (
+    ChannelInfo,
+    ImageInfo,
+    LazyJSON,
+    MetadataCache,
+)
+from omero.model import ImageI
+from omero.rtypes import rstring
+
+
+def test_lazy_json_encodes_on_demand():
+    image = ImageI(1)
+    image.setName(rstring("test"))
+    loads = []
+    lazy = LazyJSON(1, lambda: loads.append(1) or image)
+    assert lazy["@id"] == 1
+    assert not loads
+    assert lazy["Name"] == "test"
+    assert dict(lazy)["@id"] == 1
+    assert len(loads) == 1
+
+
+def test_metadata_cache_roundtrip(tmp_path):
+    info = ImageInfo(
+        image_id=1,
+        pixels_id=2,
+        name="test",
+        pixels_type="uint16",
+        size_tcz=(1, 2, 3),
+        levels=[(512, 256)],
+        tile_size=None,
+        pixel_sizes=(0.5, 0.5, None),
+        channels=[ChannelInfo("DAPI", "0000FF", (0.0, 100.0), True)] * 2,
+        default_z=1,
+        default_t=0,
+        version="10,12",
+        obj=ImageI(1),
+    )
+    cache = MetadataCache(tmp_path / "metadata.sqlite")
+    assert cache.get("host:4064", 5, 1) is None
+    cache.put("host:4064", 5, info)
+    assert cache.get("host:4064", 5, 1) == info._replace(obj=None)
+    assert cache.get("host:4064", 6, 1) is None
+
+
+def test_metadata_cache_many(monkeypatch, tmp_path):
+    info = ImageInfo(
+        image_id=0,
+        pixels_id=0,
+        name="test",
+        pixels_type="uint8",
+        size_tcz=(1, 1, 1),
+        levels=[(64, 64)],
+        tile_size=None,
+        pixel_sizes=(None, None, None),
+        channels=[ChannelInfo("0", "FFFFFF", (0.0, 255.0), True)],
+        default_z=0,
+        default_t=0,
+        version="1",
+    )
+    # more images than fit in one SQLite query
+    infos = [info._replace(image_id=i, pixels_id=i) for i in range(1, 1201)]
+    cache = MetadataCache(tmp_path / "metadata.sqlite")
+    connects = []
+    connect = sqlite3.connect
+    monkeypatch.setattr(
+        sqlite3,
+        "connect",
+        lambda *args, **kw: connects.append(1) or connect(*args, **kw),
+    )
+    cache.put_many("host:4064", 5, infos)
+    found = cache.get_many("host:4064", 5, [i.image_id for i in infos] + [5000])
+    assert found == {i.image_id: i for i in infos}
+    # one connection (and transaction) each
+    assert len(connects) == 2
@@ -0,0 +1,24 @@
+import pytest
+
+from napari_omero.metrics import MetricsRegistry
+
+
+def test_metrics_track_calls():
+    metrics = MetricsRegistry()
+    with metrics.track("plane") as call:
+        call.add_bytes(100)
+    with pytest.raises(ValueError), metrics.track("plane"):
+        raise ValueError
+    metrics.register_stats("cache", lambda: {"hits": 1})
+
+    stats = metrics.summary()
+    assert stats["plane"]["count"] == 2
+    assert stats["plane"]["errors"] == 1
+    assert stats["plane"]["bytes"] == 100
+    assert stats["plane"]["max_in_flight"] == 1
+    assert stats["plane"]["in_flight"] == 0
+    assert stats["cache"] == {"hits": 1}
+    assert "plane" in metrics.report()
+
+    metrics.reset()
+    assert "plane" not in metrics.summary()
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from napari_omero.plugins import mirror
+from napari_omero.plugins.pixels import _bin2
+
+pytest.importorskip("zarr")
+
+CONN = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+
+
+@pytest.fixture
+def image(monkeypatch, fake_reader, image_info):
+    """A (1, 2, 3, 16, 16) image served by a fake store, and the store."""
+    data = np.arange(2 * 3 * 16 * 16, dtype=np.uint16).reshape(1, 2, 3, 16, 16)
+    _, store = fake_reader(data)
+    monkeypatch.setattr(
+        mirror, "get_image_info", lambda conn, image_id: image_info(data)
+    )
+    # a downsampled level for 16 x 16 planes
+    monkeypatch.setattr(mirror, "MIN_LEVEL_SIZE", 8)
+    return data, store
+
+
+def test_mirror_image(tmp_path, image, image_info):
+    data, store = image
+    mirror.mirror_image(CONN, 1, tmp_path, max_workers=1)
+    assert len(store.calls) == 6  # one plane per chunk
+
+    levels = mirror.open_mirror(CONN, image_info(data), tmp_path)
+    np.testing.assert_array_equal(levels[0].compute(), data)
+    # coarser levels are binned locally, not fetched
+    np.testing.assert_array_equal(levels[1].compute(), _bin2(data))
+
+    # complete mirrors are not fetched again
+    mirror.mirror_image(CONN, 1, tmp_path)
+    assert len(store.calls) == 6
+    # mirrors of other pixels are ignored
+    assert (
+        mirror.open_mirror(CONN, image_info(data)._replace(pixels_id=2), tmp_path)
+        is None
+    )
+
+
+def test_mirror_image_resumes(monkeypatch, tmp_path, image, image_info):
+    data, store = image
+    get_plane = store.getPlane
+
+    def flaky_get_plane(z, c, t):
+        if len(store.calls) == 4:
+            raise ConnectionError("connection lost")
+        return get_plane(z, c, t)
+
+    monkeypatch.setattr(store, "getPlane", flaky_get_plane)
+    with pytest.raises(ConnectionError):
+        mirror.mirror_image(CONN, 1, tmp_path, max_workers=1)
+    assert mirror.open_mirror(CONN, image_info(data), tmp_path) is None
+
+    monkeypatch.setattr(store, "getPlane", get_plane)
+    mirror.mirror_image(CONN, 1, tmp_path, max_workers=1)
+    # the 4 planes written before the failure are not fetched again
+    assert len(store.calls) == 6
+    levels = mirror.open_mirror(CONN, image_info(data), tmp_path)
+    np.testing.assert_array_equal(levels[0].compute(), data)
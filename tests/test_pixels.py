@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from napari_omero.plugins import pixels
+from napari_omero.plugins.pixels import (
+    NO_PYRAMID_SIZE_ENV,
+    ChunkPolicy,
+    _bin2,
+    auto_chunk_policy,
+    lazy_array,
+    pyramid_layout,
+)
+
+
+def test_lazy_array_locations():
+    def read(loc):
+        return np.full([b - a for a, b in loc], loc[0][0], dtype=np.uint16)
+
+    arr = lazy_array(read, ((1,) * 3, (4, 4, 2)), np.uint16)
+    assert arr.shape == (3, 10)
+    np.testing.assert_array_equal(arr[2].compute(), 2)
+
+
+def test_bin2_odd_shape():
+    data = np.arange(0, 30, 2, dtype=np.uint8).reshape(1, 3, 5)
+    binned = _bin2(data)
+    assert binned.shape == (1, 2, 3)
+    assert binned.dtype == np.uint8
+    # the last row/column is repeated to pad odd sizes
+    np.testing.assert_array_equal(binned, [[[6, 10, 13], [21, 25, 28]]])
+
+
+def test_chunk_policy_parse():
+    assert ChunkPolicy.parse("zblock:8") == ChunkPolicy("zblock", 8)
+    assert ChunkPolicy.parse("tiles").size > 0
+    assert ChunkPolicy.parse("zblock") == ChunkPolicy("zblock", 0)
+    with pytest.raises(ValueError):
+        ChunkPolicy.parse("cubes")
+
+
+@pytest.mark.parametrize("spec", ["tiles:0", "zblock:0", "zblock:-1", "zblock:x"])
+def test_chunk_policy_parse_invalid_size(spec):
+    with pytest.raises(ValueError, match="Invalid chunk policy"):
+        ChunkPolicy.parse(spec)
+
+
+@pytest.mark.parametrize(
+    "plane_nbytes, size_c, size_z, latency, kind",
+    [
+        (512 * 512 * 2, 3, 100, 0.05, "zblock"),  # small planes over a WAN
+        (512 * 512 * 2, 3, 100, 0.0005, "plane"),  # small planes on a LAN
+        (512 * 512 * 2, 3, 1, 0.01, "channels"),
+        (20000 * 20000 * 2, 1, 1, 0.01, "tiles"),
+    ],
+)
+def test_auto_chunk_policy(plane_nbytes, size_c, size_z, latency, kind):
+    assert auto_chunk_policy(plane_nbytes, size_c, size_z, latency).kind == kind
+
+
+def test_prefetch_stack_reads_the_preview_level(fake_reader):
+    data = np.arange(2 * 3 * 16 * 16, dtype=np.uint16).reshape(1, 2, 3, 16, 16)
+    reader, store = fake_reader(data)
+    reader.add_synthetic_levels(factors=[2, 4])
+    # intermediate levels are binned from level 0, not prefetched
+    assert reader.prefetch_stack(0, level=1) is None
+
+    reader.prefetch_stack(0, level=2).result()
+    # one strided transfer per channel, not the full resolution stack
+    assert [call[0] for call in store.calls] == ["getHypercube"] * 2
+    assert all(call[3] == [4, 4, 1, 1, 1] for call in store.calls)
+    preview = reader.lazy_level(2, "plane")[0].compute()
+    np.testing.assert_array_equal(preview, data[0, :, :, ::4, ::4])
+    assert len(store.calls) == 2
+
+
+class _Image:
+    def __init__(self, size_yx, pyramid):
+        self.size_yx = size_yx
+        self.pyramid = pyramid
+        self.asked = 0
+
+    def getSizeY(self):
+        return self.size_yx[0]
+
+    def getSizeX(self):
+        return self.size_yx[1]
+
+    def requiresPixelsPyramid(self):
+        self.asked += 1
+        return self.pyramid
+
+    def _prepareRenderingEngine(self):
+        desc = [
+            SimpleNamespace(sizeY=y, sizeX=x) for y, x in [(4096, 4096), (2048, 2048)]
+        ]
+        self._re = SimpleNamespace(
+            getTileSize=lambda: [256, 256], getResolutionDescriptions=lambda: desc
+        )
+
+
+def test_pyramid_layout(monkeypatch):
+    monkeypatch.delenv(NO_PYRAMID_SIZE_ENV, raising=False)
+    small = _Image((1024, 1024), pyramid=False)
+    assert pyramid_layout(small) == ([(1024, 1024)], None)
+    assert small.asked == 0  # assumed flat without a round trip
+    assert pyramid_layout(small, no_pyramid_size=0) == ([(1024, 1024)], None)
+    monkeypatch.setenv(NO_PYRAMID_SIZE_ENV, "512")
+    assert pyramid_layout(small) == ([(1024, 1024)], None)
+    assert small.asked == 2
+
+    large = _Image((4096, 4096), pyramid=True)
+    levels, tile_size = pyramid_layout(large)
+    assert levels == [(4096, 4096), (2048, 2048)]
+    assert tile_size == (256, 256)
+
+
+def test_chunks_does_not_change_the_policy(monkeypatch, fake_reader):
+    reader, _ = fake_reader(np.zeros((1, 2, 6, 8, 8), np.uint8))
+    assert reader.chunks(0, "zblock:4")[2] == (4, 2)
+    assert reader.policy == ChunkPolicy("plane")
+
+    latencies = []
+    monkeypatch.setattr(
+        pixels, "measure_latency", lambda conn: latencies.append(0.05) or 0.05
+    )
+    reader.add_synthetic_levels(factors=[2])
+    pyramid = reader.lazy_pyramid("auto")
+    # "auto" is resolved once, and reads align to the resolved chunks
+    assert latencies == [0.05]
+    assert reader.policy.kind == "zblock"
+    assert pyramid[1].chunks == reader.chunks(1, reader.policy)
@@ -0,0 +1,122 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from napari_omero.plugins.pixels import PixelsReader
+from napari_omero.plugins.plates import FieldImage, PlateReader
+
+
+def test_plate_mosaic_reads_wells_in_view(monkeypatch):
+    reads = []
+
+    def read(self, level, loc):
+        reads.append(self.image_id)
+        return np.full([b - a for a, b in loc], self.image_id, self.dtype)
+
+    monkeypatch.setattr(PixelsReader, "read", read)
+    conn = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+    plate = SimpleNamespace(id=SimpleNamespace(val=1), getName=lambda: None)
+    fields = {
+        (0, 0, 0): FieldImage(1, 11, "uint8", (1, 1, 1), (40, 40)),
+        (0, 1, 2): FieldImage(2, 12, "uint8", (1, 1, 1), (40, 30)),
+    }
+    data = PlateReader(conn, plate, fields).lazy_pyramid()[0]
+    assert data.shape == (1, 1, 1, 1, 80, 120)
+
+    # only the well in view is read
+    np.testing.assert_array_equal(data[0, 0, 0, 0, 40:, 80:110].compute(), 2)
+    assert reads == [2]
+    # smaller fields are padded, empty wells are black
+    assert data[0, 0, 0, 0, 40:, 110:].max().compute() == 0
+    assert data[0, 0, 0, 0, :40, 40:80].max().compute() == 0
+
+
+def _val(value):
+    return SimpleNamespace(val=value)
+
+
+def _well(row, column, image_ids):
+    def sample(image_id):
+        pixels = SimpleNamespace(
+            id=_val(image_id + 10),
+            getPixelsType=lambda: SimpleNamespace(
+                getValue=lambda: SimpleNamespace(getValue=lambda: "uint8")
+            ),
+            getSizeT=lambda: _val(1),
+            getSizeC=lambda: _val(1),
+            getSizeZ=lambda: _val(1),
+            getSizeY=lambda: _val(40),
+            getSizeX=lambda: _val(40),
+        )
+        image = SimpleNamespace(id=_val(image_id), getPrimaryPixels=lambda: pixels)
+        return SimpleNamespace(id=_val(image_id + 100), getImage=lambda: image)
+
+    samples = [sample(image_id) for image_id in image_ids]
+    plate = SimpleNamespace(id=_val(1), getName=lambda: None)
+    return SimpleNamespace(
+        getRow=lambda: _val(row),
+        getColumn=lambda: _val(column),
+        copyWellSamples=lambda: samples,
+        getPlate=lambda: plate,
+    )
+
+
+def test_plate_fields_ordered_by_sample_id():
+    wells = [_well(0, 0, [3, 1, 2])]
+    query = SimpleNamespace(findAllByQuery=lambda *args: wells)
+    conn = SimpleNamespace(
+        c=SimpleNamespace(getProperty=lambda key: None),
+        getQueryService=lambda: query,
+    )
+    reader = PlateReader.from_plate(conn, 1)
+    assert [reader.fields[(f, 0, 0)].image_id for f in range(3)] == [1, 2, 3]
+
+
+def test_plate_mixed_fields_are_promoted(monkeypatch):
+    def read(self, level, loc):
+        return np.full([b - a for a, b in loc], 200, self.dtype)
+
+    monkeypatch.setattr(PixelsReader, "read", read)
+    conn = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+    plate = SimpleNamespace(id=SimpleNamespace(val=1), getName=lambda: None)
+    fields = {
+        (0, 0, 0): FieldImage(1, 11, "uint8", (1, 1, 1), (10, 10)),
+        (0, 0, 1): FieldImage(2, 12, "uint16", (1, 2, 1), (10, 10)),
+    }
+    reader = PlateReader(conn, plate, fields)
+    assert reader.dtype == np.uint16
+    assert reader.size_tcz == (1, 2, 1)
+    data = reader.lazy_pyramid()[0]
+    assert data.shape == (1, 1, 2, 1, 10, 20)
+    # the single-channel field is black in the second channel
+    np.testing.assert_array_equal(data[0, 0, 1, 0, :, :10].compute(), 0)
+    np.testing.assert_array_equal(data[0, 0, 1, 0, :, 10:].compute(), 200)
+
+
+def test_plate_channel_metadata_from_field_with_most_channels():
+    conn = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+    plate = SimpleNamespace(id=SimpleNamespace(val=1), getName=lambda: None)
+    fields = {
+        (0, 0, 0): FieldImage(1, 11, "uint8", (1, 1, 1), (10, 10)),
+        (0, 0, 1): FieldImage(2, 12, "uint8", (1, 3, 1), (10, 10)),
+        (0, 1, 0): FieldImage(3, 13, "uint8", (1, 3, 1), (10, 10)),
+        (1, 0, 0): FieldImage(4, 14, "uint8", (1, 2, 1), (10, 10)),
+    }
+    reader = PlateReader(conn, plate, fields)
+    assert reader.size_tcz == (1, 3, 1)
+    # the first field has a single channel, names of the others would be lost
+    assert reader.metadata_image_id == 2
+
+
+def test_plate_pyramidal_field_levels():
+    conn = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+    plate = SimpleNamespace(id=SimpleNamespace(val=1), getName=lambda: None)
+    fields = {(0, 0, 0): FieldImage(1, 11, "uint8", (1, 1, 1), (4096, 4096))}
+    reader = PlateReader(conn, plate, fields)
+    reader.factors = [1, 2, 4, 8]
+    field = PixelsReader(
+        conn, 1, 11, "uint8", (1, 1, 1), [(4096, 4096), (2048, 2048)], (256, 256)
+    )
+    levels = [reader._field_level(field, level) for level in range(4)]
+    # read from the server pyramid, subsampled below its coarsest level
+    assert levels == [(0, 1), (1, 1), (1, 2), (1, 4)]
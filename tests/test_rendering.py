@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from io import BytesIO
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from napari_omero.plugins.rendering import RenderedReader
+
+
+class _Engine:
+    """A rendering engine drawing planes of one color per (z, t)."""
+
+    def __init__(self, size_yx):
+        self.size_yx = size_yx
+        self.planes = []
+
+    def renderCompressed(self, plane_def, ctx):
+        self.planes.append(plane_def)
+        h, w = self.size_yx
+        if plane_def.region is not None:
+            w, h = plane_def.region.width, plane_def.region.height
+        color = (10 * plane_def.z, 20 * plane_def.t, 200)
+        buf = BytesIO()
+        # lossless, so that colors can be compared exactly
+        Image.new("RGB", (w, h), color).save(buf, "PNG")
+        return buf.getvalue()
+
+
+def _reader(monkeypatch, levels, tile_size=None):
+    engine = _Engine(levels[0])
+
+    @contextmanager
+    def rendering_engine(self, level=0):
+        yield engine
+
+    monkeypatch.setattr(RenderedReader, "rendering_engine", rendering_engine)
+    conn = SimpleNamespace(c=SimpleNamespace(getProperty=lambda key: None))
+    return RenderedReader(conn, 1, 1, (1, 2), levels, tile_size), engine
+
+
+def test_rendered_planes_are_cached(monkeypatch, fresh_caches):
+    reader, engine = _reader(monkeypatch, [(6, 8)])
+    data = reader.lazy_pyramid()[0]
+    assert data.shape == (1, 2, 6, 8, 3)
+    assert data.dtype == np.uint8
+    np.testing.assert_array_equal(
+        data[0, 1].compute(), np.full((6, 8, 3), [10, 0, 200])
+    )
+    assert len(engine.planes) == 1
+    assert engine.planes[0].region is None
+
+    data.compute()
+    data.compute()
+    # each plane is rendered once, then read from the chunk cache
+    assert sorted(p.z for p in engine.planes) == [0, 1]
+
+
+def test_rendered_pyramid_is_read_by_tile(monkeypatch, fresh_caches):
+    reader, engine = _reader(monkeypatch, [(6, 12), (3, 6)], tile_size=(8, 4))
+    pyramid = reader.lazy_pyramid()
+    assert pyramid[0].chunks[2:4] == ((4, 2), (8, 4))
+    pyramid[0][0, 0].compute()
+    regions = sorted(
+        (p.region.x, p.region.y, p.region.width, p.region.height) for p in engine.planes
+    )
+    assert regions == [(0, 0, 8, 4), (0, 4, 8, 2), (8, 0, 4, 4), (8, 4, 4, 2)]
@@ -0,0 +1,348 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from napari_omero.plugins.rois import ShapeTable, _decode, roi_layer_data
+from omero.model import ImageI, RectangleI, RoiI
+from omero.rtypes import rbool, rdouble, rint, rlong, rstring
+
+
+def _row(*values):
+    return [None if v is None else SimpleNamespace(val=v) for v in values]
+
+
+def test_roi_layer_data_from_columns():
+    table = ShapeTable.concat(
+        [
+            # id, roi, z, t, stroke, fill, text, fields
+            _decode("rectangle", [_row(1, 10, 0, 0, -16776961, None, "a", 5, 6, 4, 2)]),
+            _decode(
+                "polygon", [_row(2, 11, None, 1, None, None, None, "1,2, 3,4 5,6")]
+            ),
+            _decode("ellipse", [_row(3, 12, None, None, None, None, "e", 5, 5, 2, 1)]),
+            _decode("point", [_row(4, 13, 1, None, None, 255, "p", 7, 8)]),
+        ]
+    )
+    image = SimpleNamespace(
+        getId=lambda: 1,
+        getSizeT=lambda: 50,
+        getSizeZ=lambda: 3,
+        getPixelSizeX=lambda: None,
+        getPixelSizeY=lambda: None,
+        getPixelSizeZ=lambda: None,
+    )
+
+    (shapes, meta, layer_type), (unbound, unbound_meta, _) = roi_layer_data(
+        table, image, points=False
+    )
+    assert layer_type == "shapes"
+    # the polygon has no Z: it is shown on all 3 Z-sections of its timepoint
+    assert meta["shape_type"] == ["rectangle"] + ["polygon"] * 3
+    np.testing.assert_array_equal(
+        shapes[0], [[0, 0, 6, 5], [0, 0, 8, 5], [0, 0, 8, 9], [0, 0, 6, 9]]
+    )
+    np.testing.assert_array_equal(shapes[3], [[1, 2, 2, 1], [1, 2, 4, 3], [1, 2, 6, 5]])
+    np.testing.assert_array_equal(meta["features"]["roi_id"], [10, 11, 11, 11])
+    np.testing.assert_array_equal(meta["edge_color"][0], [1, 0, 0, 1])
+    np.testing.assert_array_equal(meta["edge_color"][1], [1, 1, 1, 1])
+    # the ellipse is on no plane in particular: stored once, in 2D
+    assert unbound_meta["name"] == "OMERO ROIs 1 (all planes)"
+    assert len(unbound) == 1
+    np.testing.assert_array_equal(unbound[0], [[4, 3], [6, 3], [6, 7], [4, 7]])
+
+    ((points, meta, layer_type),) = roi_layer_data(table, image, points=True)
+    assert layer_type == "points"
+    # the point has no T: stored once in (z, y, x), shown at all timepoints
+    assert meta["name"] == "OMERO Points 1 (all timepoints)"
+    np.testing.assert_array_equal(points, [[1, 8, 7]])
+    assert list(meta["features"]["comment"]) == ["p"]
+
+
+class _Rows:
+    """Query service answering shape projections from canned rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def projection(self, query, params, ctx=None):
+        if "from Rectangle" in query:
+            rows = self.rows
+        elif "from Point" in query:
+            rows = [_row(100 + i, 50, 0, 0, None, None, "p", i, i) for i in range(3)]
+        else:
+            rows = []
+        page = params.theFilter
+        if page is not None and page.limit is not None:
+            return rows[page.offset.val : page.offset.val + page.limit.val]
+        return rows
+
+
+def test_paged_roi_layers_equal_one_shot():
+    from napari.layers import Points, Shapes
+
+    from napari_omero.plugins.rois import extend_layer, iter_roi_layers, load_roi_layers
+
+    rows = [_row(i, i, 0, 0, i, None, str(i), i, i, 2, 3) for i in range(5)]
+    conn = SimpleNamespace(getQueryService=lambda: _Rows(rows))
+    image = SimpleNamespace(
+        getId=lambda: 1,
+        getSizeT=lambda: 1,
+        getSizeZ=lambda: 1,
+        getPixelSizeX=lambda: None,
+        getPixelSizeY=lambda: None,
+        getPixelSizeZ=lambda: None,
+    )
+    expected = {
+        kind: cls(data, **meta)
+        for (data, meta, kind), cls in zip(
+            load_roi_layers(conn, image), (Shapes, Points)
+        )
+    }
+
+    layers = {}
+    for _, page in iter_roi_layers(conn, image, page_size=2):
+        for data, meta, kind in page:
+            if kind in layers:
+                extend_layer(layers[kind], data, meta)
+            else:
+                layers[kind] = (Shapes if kind == "shapes" else Points)(data, **meta)
+
+    for kind, layer in expected.items():
+        for a, b in zip(layers[kind].data, layer.data):
+            np.testing.assert_array_equal(a, b)
+        assert layers[kind].features.equals(layer.features)
+    np.testing.assert_array_equal(
+        layers["shapes"].edge_color, expected["shapes"].edge_color
+    )
+    np.testing.assert_array_equal(
+        layers["points"].border_color, expected["points"].border_color
+    )
+
+
+def test_save_rois_in_batches_grouped_by_roi_id():
+    from napari.layers import Shapes
+
+    from napari_omero.plugins.omero import save_rois
+
+    batches = []
+
+    def save(rois, ctx):
+        batches.append(len(rois))
+        return rois
+
+    conn = SimpleNamespace(
+        SERVICE_OPTS=SimpleNamespace(setOmeroGroup=lambda group_id: None),
+        getUpdateService=lambda: SimpleNamespace(saveAndReturnArray=save),
+    )
+    image = SimpleNamespace(
+        _conn=conn,
+        id=1,
+        getDetails=lambda: SimpleNamespace(
+            getGroup=lambda: SimpleNamespace(getId=lambda: 3)
+        ),
+    )
+    squares = [
+        np.array([[0, y, 0], [0, y, 2], [0, y + 2, 2], [0, y + 2, 0]]) for y in range(5)
+    ]
+    layer = Shapes(
+        squares,
+        shape_type="polygon",
+        features={"roi_id": [10, 10, 11, np.nan, 11]},
+    )
+    viewer = SimpleNamespace(layers=[layer])
+
+    summary = save_rois(viewer, image, batch_size=2)
+    assert (summary.rois, summary.shapes, summary.skipped) == (5, 5, 0)
+    assert batches == [2, 2, 1]
+
+    batches.clear()
+    summary = save_rois(viewer, image, batch_size=2, group_by_roi=True)
+    assert (summary.rois, summary.shapes) == (3, 5)
+    assert batches == [2, 1]
+
+
+class _Server:
+    """A connection to an OMERO server keeping saved shapes in memory."""
+
+    def __init__(self, shapes=()):
+        self.shapes = {shape.id.val: shape for shape in shapes}
+        self.calls = []
+        self.new_ids = iter(range(100, 200))
+        self.delete_error = None
+        self.SERVICE_OPTS = SimpleNamespace(setOmeroGroup=lambda group_id: None)
+
+    def getQueryService(self):
+        return self
+
+    def getUpdateService(self):
+        return self
+
+    def findAllByQuery(self, query, params, ctx):
+        ids = [i.val for i in params.map["ids"].val]
+        return [self.shapes[i] for i in ids if i in self.shapes]
+
+    def saveAndReturnArray(self, objs, ctx):
+        self.calls.append(("create", len(objs)))
+        for obj in objs:
+            obj.setId(rlong(next(self.new_ids)))
+            for shape in obj.copyShapes() if isinstance(obj, RoiI) else []:
+                shape.setId(rlong(next(self.new_ids)))
+        return objs
+
+    def saveArray(self, objs, ctx):
+        self.calls.append(("update", [obj.id.val for obj in objs]))
+
+    def deleteObjects(self, kind, ids, wait):
+        if self.delete_error is not None:
+            raise self.delete_error
+        self.calls.append(("delete", kind, ids))
+
+
+def _image(conn):
+    return SimpleNamespace(
+        _conn=conn,
+        _obj=ImageI(1, False),
+        id=1,
+        getDetails=lambda: SimpleNamespace(
+            getGroup=lambda: SimpleNamespace(getId=lambda: 3)
+        ),
+    )
+
+
+def _square(shape_id, roi_id, y):
+    """A 2x2 square on Z-section 0, as loaded from OMERO."""
+    shape = RectangleI(shape_id, True)
+    shape.roi = RoiI(roi_id, False)
+    shape.x, shape.y = rdouble(0), rdouble(y)
+    shape.width = shape.height = rdouble(2)
+    shape.theZ = rint(0)
+    # green, half transparent
+    shape.strokeColor = rint(0x00FF0080)
+    shape.textValue = rstring(f"shape {shape_id}")
+    shape.locked = rbool(True)
+    return shape
+
+
+def _squares_layer(server):
+    from napari.layers import Shapes
+
+    from napari_omero.plugins.rois import remember_shapes
+
+    shapes = list(server.shapes.values())
+    layer = Shapes(
+        [
+            np.array([[0, y, 0], [0, y + 2, 0], [0, y + 2, 2], [0, y, 2]])
+            for y in (shape.y.val for shape in shapes)
+        ],
+        shape_type="rectangle",
+        features={
+            "shape_id": [shape.id.val for shape in shapes],
+            "roi_id": [shape.roi.id.val for shape in shapes],
+            "comment": [shape.textValue.val for shape in shapes],
+        },
+    )
+    remember_shapes(layer, image_id=1)
+    return layer
+
+
+def test_sync_rois_sends_only_changes():
+    from napari_omero.plugins.omero import sync_rois
+
+    server = _Server(_square(i, 10 + i, 5 * i) for i in (1, 2, 3))
+    image = _image(server)
+    layer = _squares_layer(server)
+    viewer = SimpleNamespace(layers=[layer])
+    assert sync_rois(viewer, image)[:3] == (0, 0, 0)
+    assert server.calls == []
+
+    layer.selected_data = {0}
+    layer.current_edge_color = "red"
+    layer.selected_data = {2}
+    layer.remove_selected()
+    # a new shape drawn with a shape selected may copy its features
+    layer.selected_data = {1}
+    layer.add_rectangles([[0, 20, 0], [0, 22, 2]])
+    assert sync_rois(viewer, image)[:3] == (1, 1, 1)
+    assert server.calls == [("create", 1), ("update", [1]), ("delete", "Shape", [3])]
+    assert list(layer.features["shape_id"]) == [1, 2, 101]
+    # the loaded shape is updated: what napari does not show is kept
+    updated = server.shapes[1]
+    assert updated.locked.val
+    assert updated.textValue.val == "shape 1"
+    assert updated.strokeColor.val == 0xFF000080 - (1 << 32)
+
+    server.calls.clear()
+    assert sync_rois(viewer, image)[:3] == (0, 0, 0)
+    assert server.calls == []
+
+
+def test_sync_rois_failed_delete_does_not_duplicate():
+    from napari_omero.plugins.omero import sync_rois
+
+    server = _Server(_square(i, 10 + i, 5 * i) for i in (1, 2))
+    server.delete_error = RuntimeError("shape 2 was deleted already")
+    image = _image(server)
+    layer = _squares_layer(server)
+    viewer = SimpleNamespace(layers=[layer])
+
+    layer.selected_data = {1}
+    layer.remove_selected()
+    layer.add_rectangles([[0, 20, 0], [0, 22, 2]])
+    with pytest.raises(RuntimeError):
+        sync_rois(viewer, image)
+    assert server.calls == [("create", 1)]
+    assert list(layer.features["shape_id"]) == [1, 101]
+
+    # only the deletion is left to do
+    server.delete_error = None
+    server.calls.clear()
+    assert sync_rois(viewer, image)[:3] == (0, 0, 1)
+    assert server.calls == [("delete", "Shape", [2])]
+
+
+def test_sync_labels_sends_only_changed_labels():
+    from napari.layers import Labels
+
+    from napari_omero.plugins.masks import sync_labels
+
+    server = _Server()
+    image = _image(server)
+    data = np.zeros((1, 2, 20, 20), np.uint16)
+    data[0, 0, 2:5, 2:5] = 1
+    data[0, 1, 10:15, 10:12] = 2
+    layer = Labels(data)
+    assert sync_labels(layer, image) == (2, 0, 0)
+    assert sync_labels(layer, image) == (0, 0, 0)
+    assert server.calls == [("create", 2)]
+
+    server.calls.clear()
+    first_rois = {
+        value: roi
+        for value, (_, roi) in layer.metadata["omero_labels"]["labels"].items()
+    }
+    data[0, 0, 2:5, 2:5] = 0
+    data[0, 1, 16, 16] = 2
+    layer.data = data
+    assert sync_labels(layer, image) == (0, 1, 1)
+    assert server.calls == [
+        ("create", 1),
+        ("delete", "Roi", [first_rois[2], first_rois[1]]),
+    ]
+
+
+def test_label_boxes_and_masks():
+    from napari_omero.plugins.masks import label_boxes, label_masks
+
+    data = np.zeros((2, 3, 40, 50), np.uint32)
+    data[0, 1, 10:20, 30:35] = 5
+    data[1, 2, 5:7, 6:16] = 5
+    data[0, 0, 1:30, 2] = 9
+    for labels in (data, np.where(data == 9, 2**40, data).astype(np.uint64)):
+        boxes = label_boxes(labels)
+        assert [value for value, _ in boxes] == [5, labels.max()]
+        value, box = boxes[0]
+        masks = label_masks(labels[box] == value, box, rgba=(255, 0, 0, 255))
+        placed = [(m.theT.val, m.theZ.val, m.x.val, m.y.val) for m in masks]
+        assert placed == [(0, 1, 30, 10), (1, 2, 6, 5)]
+        assert [(m.width.val, m.height.val) for m in masks] == [(5, 10), (10, 2)]
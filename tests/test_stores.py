@@ -0,0 +1,102 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from napari_omero.plugins.stores import RawPixelsStorePool, get_store_pool
+from napari_omero.widgets.gateway import QGateWay
+
+
+class _Store:
+    def __init__(self):
+        self.pixels_id = None
+        self.closed = False
+
+    def setPixelsId(self, pixels_id, bypass, ctx=None):
+        self.pixels_id = pixels_id
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(**kwargs) -> tuple[RawPixelsStorePool, list[_Store]]:
+    created: list[_Store] = []
+
+    def create():
+        created.append(_Store())
+        return created[-1]
+
+    conn = SimpleNamespace(
+        c=SimpleNamespace(sf=SimpleNamespace(createRawPixelsStore=create))
+    )
+    return RawPixelsStorePool(conn, **kwargs), created
+
+
+def test_store_pool_reuses_and_evicts_least_recently_used():
+    pool, created = _pool(max_size=2)
+    for pixels_id in (1, 2):
+        with pool.store(pixels_id):
+            pass
+    with pool.store(1) as store:
+        assert store is created[0]
+    # the pool is full: the store of pixels 2, idle the longest, makes room
+    with pool.store(3):
+        pass
+    assert [s.closed for s in created] == [False, True, False]
+    pool.close()
+    assert all(s.closed for s in created)
+
+
+def test_store_pool_checkout_waits_for_a_free_store():
+    pool, created = _pool(max_size=1)
+    first = pool.checkout(1)
+    waiter = threading.Thread(target=pool.checkout, args=(2,))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+    pool.checkin(1, None, first)
+    waiter.join(5)
+    assert not waiter.is_alive()
+    assert len(created) == 2
+    assert first.closed
+
+
+def test_store_pool_discards_store_on_error():
+    pool, created = _pool(max_size=1)
+    with pytest.raises(ValueError), pool.store(1):
+        raise ValueError("read failed")
+    assert created[0].closed
+    # the failed store does not count against the pool
+    with pool.store(1) as store:
+        assert store is created[1]
+
+
+def test_store_pool_expires_idle_stores_on_checkout():
+    pool, created = _pool(idle_timeout=0.05)
+    with pool.store(1):
+        pass
+    time.sleep(0.1)
+    with pool.store(2):
+        pass
+    assert created[0].closed
+    assert pool._n_open == 1
+
+
+class _Conn:
+    def __init__(self):
+        self.c = SimpleNamespace(sf=SimpleNamespace(createRawPixelsStore=_Store))
+
+
+def test_reconnecting_closes_the_old_store_pool(monkeypatch):
+    old = _Conn()
+    monkeypatch.setattr(QGateWay, "_conn", old)
+    pool = get_store_pool(old)
+    with pool.store(1) as store:
+        pass
+    # the setter does not touch Qt, so no QGateWay needs to be set up
+    gateway = QGateWay.__new__(QGateWay)
+    gateway.conn = _Conn()
+    assert store.closed
+    assert pool._closed
+    assert get_store_pool(old) is not pool